@@ -0,0 +1,68 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from mysql.connector import Error
+
+from api_formats import negotiate_format
+
+
+def normalized_params(args) -> tuple:
+    """Query parameters as sorted (name, values) pairs, leaving out empty values"""
+    params = []
+    for name in args:
+        values = sorted(value for value in args.getlist(name) if value != '')
+        if values:
+            params.append((name, tuple(values)))
+    return tuple(sorted(params))
+
+
+def cached_response(params=normalized_params):
+    """Cache a JSON route's 200 responses in app.config['result_cache'] and answer revalidations.
+
+    Responses are keyed by route, params(request.args) and the negotiated response format,
+    and tied to the database's data version, which every ingest bumps. The ETag is derived from the key and the version,
+    so a matching If-None-Match (or an If-Modified-Since after the last ingest) gets a 304
+    without running the view at all.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_app.config['result_cache']
+            try:
+                version, modified = cache.data_version(g.db.get_data_version)
+            except Error:
+                # No data_version table yet (database created before it existed)
+                return view(*args, **kwargs)
+
+            key = repr((request.path, params(request.args), negotiate_format()))
+            etag = f"{version:x}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+            if modified is not None:
+                modified = modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (modified is not None and request.if_modified_since is not None
+                                and request.if_modified_since >= modified)
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                entry = cache.get(key, version)
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.put(key, version, response.get_data(), response.mimetype)
+                else:
+                    response = Response(entry[0], mimetype=entry[1])
+
+            response.set_etag(etag)
+            response.last_modified = modified
+            response.cache_control.no_cache = True
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
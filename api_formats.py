@@ -0,0 +1,103 @@
+import json
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request
+
+from api_metrics import phase_timer
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow is optional; without it Arrow responses are not offered
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; without it MessagePack responses are not offered
+    msgpack = None
+
+
+# Response formats by name, with the media type they are sent as and the ones that select them
+FORMATS = {
+    'json': ('application/json', ['application/json']),
+    'columns': ('application/vnd.nyc-taxi.columns+json', ['application/vnd.nyc-taxi.columns+json']),
+    'msgpack': ('application/vnd.msgpack', ['application/vnd.msgpack', 'application/msgpack',
+                                            'application/x-msgpack']),
+    'arrow': ('application/vnd.apache.arrow.stream', ['application/vnd.apache.arrow.stream'])
+}
+
+
+def available_formats() -> list:
+    return [name for name in FORMATS
+            if not (name == 'arrow' and pa is None) and not (name == 'msgpack' and msgpack is None)]
+
+
+def negotiate_format() -> str:
+    """Response format of the current request: ?format= if given, else the best Accept match.
+
+    JSON rows stay the default, also for clients that accept anything. Returns None for an
+    unknown or unavailable ?format=.
+    """
+    requested = request.args.get('format')
+    if requested:
+        return requested if requested in available_formats() else None
+
+    offers = {media_type: name for name in available_formats() for media_type in FORMATS[name][1]}
+    best = request.accept_mimetypes.best_match(list(offers), default='application/json')
+    return offers.get(best, 'json')
+
+
+def unsupported_format_response():
+    return jsonify({"error": f"format must be one of {available_formats()}"}), 406
+
+
+def _column_json(series: pd.Series) -> str:
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and series.dtype.kind in 'iu':
+        if series.hasnans:  # nullable integers would otherwise be written as floats
+            return json.dumps(series.to_numpy(dtype=object, na_value=None).tolist())
+        series = series.astype(series.dtype.numpy_dtype)
+    return series.to_json(orient='values', date_format='iso', date_unit='s')
+
+
+def _column_values(series: pd.Series) -> list:
+    """One column as a list for MessagePack; numeric columns are converted by NumPy in one call"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = np.datetime_as_string(series.to_numpy(dtype='datetime64[s]'), unit='s').astype(object)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) or (series.dtype.kind == 'f' and series.hasnans):
+        return series.to_numpy(dtype=object, na_value=None).tolist()
+    return series.to_numpy().tolist()
+
+
+def encode_frame(frame: pd.DataFrame, fmt: str, meta: dict = None) -> Response:
+    """Encode a result frame column by column as columnar JSON, MessagePack or an Arrow IPC stream.
+
+    Columnar bodies are {"columns": [...], "data": {column: [values]}} plus the meta keys;
+    Arrow streams carry meta as JSON in the schema metadata under b"meta".
+    """
+    with phase_timer('encode'):
+        return _encode_frame(frame, fmt, meta or {})
+
+
+def _encode_frame(frame: pd.DataFrame, fmt: str, meta: dict) -> Response:
+    media_type = FORMATS[fmt][0]
+    columns = [str(column) for column in frame.columns]
+
+    if fmt == 'arrow':
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'meta': json.dumps(meta)})
+        sink = pa.BufferOutputStream()
+        with ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue().to_pybytes(), mimetype=media_type)
+
+    if fmt == 'msgpack':
+        body = {'columns': columns, 'data': {column: _column_values(frame[column]) for column in frame.columns}}
+        return Response(msgpack.packb({**body, **meta}), mimetype=media_type)
+
+    # Column arrays are serialized by pandas' C JSON writer and spliced into the document
+    data = ', '.join(f"{json.dumps(column)}: {_column_json(frame[column])}" for column in frame.columns)
+    meta_json = ''.join(f", {json.dumps(key)}: {json.dumps(value)}" for key, value in meta.items())
+    return Response(f'{{"columns": {json.dumps(columns)}, "data": {{{data}}}{meta_json}}}', mimetype=media_type)
@@ -0,0 +1,73 @@
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+
+@contextmanager
+def phase_timer(phase: str):
+    """Add the time spent in the block to the current request's timing of phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and 'timings' in g:
+            g.timings[phase] = g.timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with serialization counted as the request's encode phase"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with phase_timer('encode'):
+            return super().dumps(obj, **kwargs)
+
+
+def init_request_metrics(app, metrics):
+    """Time every request of app by phase, send a Server-Timing header and record it in metrics.
+
+    Phases: db_connect (connection checkout in get_db), sql (executing and fetching the
+    request's read queries), decode (building typed columns from fetched rows), encode
+    (JSON and columnar serialization) and processing (the rest of the view, mostly pandas
+    work). Register before any other before_request hook so that total covers them all.
+    Streamed bodies (CSV export) are timed up to the first byte and have no size.
+    """
+    app.json = TimedJSONProvider(app)
+    app.config['request_metrics'] = metrics
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.timings = {}
+
+    @app.after_request
+    def record_request_timings(response):
+        if 'request_start' not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+
+        db = g.get('db')
+        stats = db.query_stats if db is not None else {'queries': 0, 'sql_time': 0.0, 'decode_time': 0.0,
+                                                       'rows': 0}
+        timings = {
+            'db_connect': g.timings.get('db_connect', 0.0),
+            'sql': stats['sql_time'],
+            'decode': stats['decode_time'],
+            'encode': g.timings.get('encode', 0.0)
+        }
+        timings['processing'] = max(total - sum(timings.values()), 0.0)
+        timings['total'] = total
+
+        timings_ms = {phase: seconds * 1000 for phase, seconds in timings.items()}
+        response.headers['Server-Timing'] = ', '.join(
+            f'{phase};dur={duration:.2f}' + (f';desc="{stats["queries"]} queries, {stats["rows"]} rows"'
+                                              if phase == 'sql' else '')
+            for phase, duration in timings_ms.items())
+
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        size = None if response.is_streamed else response.calculate_content_length()
+        metrics.record(route, timings_ms, rows=stats['rows'] if db is not None else None, size=size)
+        if db is not None and db.slow_queries:
+            metrics.record_slow_queries(route, db.slow_queries)
+        return response
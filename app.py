@@ -1,10 +1,19 @@
 import os
-import io
-from flask import Flask, g, jsonify, request, send_file
+import zlib
+import click
+from flask import Flask, Response, g, jsonify, request
 from dotenv import load_dotenv
 from data_processing.data_processor import NYCTaxiDataProcessor
 from data_processing.taxi_trip_db import TaxiTripDatabase
-from trip_api import trip_api
+from data_processing.connection_pool import PoolTimeoutError
+from data_processing.result_cache import ResultCache
+from data_processing.request_metrics import RequestMetrics
+from data_processing.tile_pyramid import TilePyramid
+from data_processing.od_matrix import ODMatrix
+from trip_api import trip_api, trip_filters
+from api_cache import cached_response, normalized_params
+from api_formats import encode_frame, negotiate_format, unsupported_format_response
+from api_metrics import init_request_metrics, phase_timer
 import pandas as pd
 from flask_cors import CORS
 
@@ -19,18 +28,44 @@ def create_app():
         'user': os.getenv('DB_USER'),
         'password': os.getenv('DB_PASSWORD'),
         'database': os.getenv('DB_NAME'),
-        'schema_file': os.getenv('SCHEMA_FILE')
+        'schema_file': os.getenv('SCHEMA_FILE'),
+        # Read queries slower than this are logged with their parameters and EXPLAIN plan
+        'slow_query_threshold': float(os.getenv('SLOW_QUERY_MS', 500)) / 1000
     }
 
     app.config['data_file'] = os.getenv('DATA_FILE', 'train.csv')
 
+    # Requests borrow connections from one bounded pool instead of connecting every time
+    app.config['db_pool'] = TaxiTripDatabase(**app.config['db_config']).create_pool(
+        pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+        checkout_timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+        health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+    )
+
+    # Query results are reused until the next ingest bumps the data version
+    app.config['result_cache'] = ResultCache(
+        max_entries=int(os.getenv('RESULT_CACHE_SIZE', 256)),
+        shared_dir=os.getenv('RESULT_CACHE_DIR') or None,
+        shared_max_entries=int(os.getenv('RESULT_CACHE_DIR_SIZE', 4096)),
+        version_check_interval=float(os.getenv('DATA_VERSION_CHECK_INTERVAL', 5))
+    )
+
     app.register_blueprint(trip_api)
 
+    # Per-phase timings of every request, as Server-Timing headers and rolling percentiles
+    init_request_metrics(app, RequestMetrics(window=int(os.getenv('REQUEST_METRICS_WINDOW', 1024))))
+
     @app.before_request
     def get_db():
         if 'db' not in g:
-            g.db = TaxiTripDatabase(**app.config['db_config'])
-            g.db.connect()
+            g.db = TaxiTripDatabase(**app.config['db_config'], pool=app.config['db_pool'])
+            with phase_timer('db_connect'):
+                g.db.connect()
+
+    @app.errorhandler(PoolTimeoutError)
+    def pool_exhausted(error):
+        return jsonify({"error": "Database is busy, try again shortly"}), 503
 
     @app.teardown_appcontext
     def close_db_connection(exception=None):
@@ -39,106 +74,226 @@ def create_app():
             db.close()
 
     @app.route('/api/metrics')
+    @cached_response()
     def metrics():
-        """Return key performances indicators for dashboard."""
+        """Return key performances indicators for dashboard, aggregated by the database."""
         args = request.args
-        db = g.db
-
-        query = "SELECT * FROM trips"
-        df = db.query_to_df(query)
-
-        #filtering
-        if args.get("start"):
-            df = df[df["pickup_datetime"] >= args.get("start")]
-        if args.get("end"):
-            df = df[df["pickup_datetime"] <= args.get("end")]
-        if args.get("vendor_id"):
-            df = df[df["vendorID"] == int(args.get("vendor_id"))]
-        
-        total_trips = len(df)
-        total_distance = round(df["trip_distance"].sum(), 2)
-        avg_fare = round(df["fare_amount"].mean(), 2)
-        avg_trip_time = 20
-
-        # Time
-        ts = (
-            df.groupby(df["pickup_datetime"].dt.date)["pickup_datetime"]
-            .count()
-            .reset_index(name="trips")
+        summary = g.db.get_dashboard_metrics(
+            start_date=args.get("start") or None,
+            end_date=args.get("end") or None,
+            vendor_id=args.get("vendor_id", type=int)
         )
-        time_series = [
-            {"date": str(row["pickup_datetime"]), "trips": int(row["trips"])}
-            for _, row in ts.iterrows()
-        ]
-
-        # Borough aggregate
-        by_borough = (
-            df.groupby("pickup_borough")["pickup_borough"]
-            .count()
-            .reset_index(name="trips")
-        ).to_dict(orient="records")
 
         return jsonify({
-            "totalTrips": total_trips,
-            "totalDistanceKm": total_distance,
-            "avgFare": avg_fare,
-            "avgTripTimeMin": avg_trip_time,
-            "timeSeries": time_series,
-            "byBorough": by_borough
+            "totalTrips": summary["total_trips"],
+            "totalDistanceKm": summary["total_distance_km"],
+            "avgFare": None,  # the trip records carry no fares
+            "avgTripTimeMin": summary["avg_duration_min"],
+            "timeSeries": [{"date": date, "trips": trips} for date, trips in summary["per_day"]],
+            "byBorough": [{"pickup_borough": borough, "trips": trips}
+                          for borough, trips in summary["per_borough"]]
         })
     
-    @app.route('/api/trips')
-    def trips():
-        """Paging trip table."""
-        db = g.db
-        offset = int(request.args.get('offset', 0))
-        limit = int(request.args.get('limit', 50))
-        query = f"SELECT * FROM trips ORDER BY pickup_datetime DESC LIMIT{limit} OFFSET {offset}"
-        df = db.query_to_df(query)
-        total = db.query_to_df("SELECT COUNT(*) AS total FROM trips")["total"][0]
-        return jsonify({"rows": df.to_dict(orient='records'), "total": int(total)})
-    
+    def heatmap_params(args) -> tuple:
+        """Cache key parameters of a heatmap request, with the bounding box replaced by its tile range"""
+        params = dict(normalized_params(args))
+        pyramid = TilePyramid(NYCTaxiDataProcessor.NYC_BOUNDS)
+        zoom = args.get('zoom', default=8, type=int)
+        bbox = [args.get(name, type=float) for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+        if all(value is not None for value in bbox) and 0 <= zoom <= pyramid.max_zoom:
+            for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon'):
+                params.pop(name)
+            # None for every box outside the pyramid: they all share one (empty) entry
+            params['tiles'] = pyramid.tile_range(zoom, *bbox)
+        return tuple(sorted(params.items()))
+
     @app.route('/api/geo/heatmap')
+    @cached_response(heatmap_params)
     def heatmap():
-        """Return pickup coordinates for leaflet."""
-        db = g.db
-        query = "SELECT pickup_latitude AS lat, pickup_longitude AS lng FROM trips LIMIT 8000"
-        df = db.query_to_df(query)
-        heat = [[row.lat, row.lng, 1] for row in df.itertuples()]
-        return jsonify(heat)
+        """Return pickup density as [lat, lng, trips] per tile of one zoom level, for leaflet.
+
+        Every matching trip is counted; the payload has one cell per non-empty tile in the
+        bounding box, so its size depends on the viewport and zoom, not on trip volume.
+        """
+        args = request.args
+        pyramid = TilePyramid(NYCTaxiDataProcessor.NYC_BOUNDS)
+        zoom = args.get('zoom', default=8, type=int)
+        if not 0 <= zoom <= pyramid.max_zoom:
+            return jsonify({"error": f"zoom must be between 0 and {pyramid.max_zoom}"}), 400
+        hour = args.get('hour', type=int)
+        if hour is not None and not 0 <= hour <= 23:
+            return jsonify({"error": "hour must be between 0 and 23"}), 400
+        fmt = negotiate_format()
+        if fmt is None:
+            return unsupported_format_response()
+
+        tile_range = None
+        bbox = [args.get(name, type=float) for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+        if all(value is not None for value in bbox):
+            tile_range = pyramid.tile_range(zoom, *bbox)
+            if tile_range is None:
+                # The bounding box lies outside the pyramid: no tile can have trips
+                cells = pd.DataFrame({'lat': pd.Series(dtype='float64'), 'lng': pd.Series(dtype='float64'),
+                                      'trips': pd.Series(dtype='int64')})
+                if fmt != 'json':
+                    return encode_frame(cells, fmt, {"zoom": zoom})
+                return jsonify([])
+        filters = {
+            'start_date': args.get('start') or None,
+            'end_date': args.get('end') or None,
+            'hour_of_day': hour,
+            'vendor_id': args.get('vendor_id', type=int)
+        }
+
+        cells = g.db.get_heatmap_cells(pyramid, zoom, tile_range, as_frame=fmt != 'json', **filters)
+        if fmt != 'json':
+            return encode_frame(cells, fmt, {"zoom": zoom})
+        return jsonify(cells)
     
+    @app.route('/api/geo/tiles')
+    def tiles():
+        """Return precomputed pickup tiles of one zoom level, optionally within a bounding box."""
+        args = request.args
+        pyramid = TilePyramid(NYCTaxiDataProcessor.NYC_BOUNDS)
+        zoom = args.get('zoom', default=8, type=int)
+        if not 0 <= zoom <= pyramid.max_zoom:
+            return jsonify({"error": f"zoom must be between 0 and {pyramid.max_zoom}"}), 400
+
+        tile_range = None
+        bbox = [args.get(name, type=float) for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+        if all(value is not None for value in bbox):
+            tile_range = pyramid.tile_range(zoom, *bbox)
+            if tile_range is None:
+                # The bounding box lies outside the pyramid: no tile can have trips
+                return jsonify({"zoom": zoom, "tiles": []})
+
+        rows = g.db.get_spatial_tiles(zoom, tile_range, limit=args.get('top', type=int))
+        return jsonify({"zoom": zoom, "tiles": rows})
+
+    @app.route('/api/geo/flows')
+    def flows():
+        """Return origin-destination flows from the precomputed od_flows table.
+
+        Pickup and dropoff are given as grid cells or coordinates; with both it is a single
+        OD lookup, with one of them the flows out of or into that cell, with neither the
+        busiest flows overall.
+        """
+        args = request.args
+        od_matrix = ODMatrix()
+
+        cells = {}
+        for side in ('pickup', 'dropoff'):
+            cell = (args.get(f'{side}_cell_x', type=int), args.get(f'{side}_cell_y', type=int))
+            lat, lon = args.get(f'{side}_lat', type=float), args.get(f'{side}_lon', type=float)
+            if None not in cell:
+                cells[side] = cell
+            elif lat is not None and lon is not None:
+                cell_x, cell_y = od_matrix.cell_keys(lat, lon)
+                cells[side] = (int(cell_x), int(cell_y))
+            else:
+                cells[side] = None
+
+        hour = args.get('hour', type=int)
+        if hour is not None and not 0 <= hour <= 23:
+            return jsonify({"error": "hour must be between 0 and 23"}), 400
+        top = args.get('top', default=10, type=int)
+
+        rows = g.db.get_od_flows(cells['pickup'], cells['dropoff'], hour=hour, limit=top)
+        return jsonify({"grid_size": od_matrix.grid_size, "hour": hour, "flows": rows})
+
     @app.route('/api/export.csv')
     def export_csv():
-        """Export all trips as CSV"""
-        db = g.db
-        query = "SELECT * FROM trips"
-        df = db.query_to_df(query)
-        buf = io.StringIO()
-        df.to_csv(buf, index=False)
-        buf.seek(0)
-        return send_file(
-            io.BytesIO(buf.getvalue().encode("utf-8")),
-            mimetype="text/csv",
-            as_attachment=True,
-            download_name="export.csv"
+        """Stream the trips matching the /api/trips filters as CSV, optionally gzip-compressed.
+
+        Chunks are encoded (and compressed) as they are read from the database, so the
+        first bytes go out immediately and memory stays flat for any export size.
+        """
+        filters = trip_filters(request.args)
+        compress = request.args.get('gzip', default='false').lower() in ('1', 'true', 'yes')
+
+        # The body is streamed after the request ends: take the request's pooled connection over
+        # (so teardown leaves it open) and give it back once the response is closed
+        db = g.pop('db')
+        chunks = db.iter_trips_csv(**filters)
+
+        def generate():
+            if not compress:
+                for chunk in chunks:
+                    yield chunk.encode('utf-8')
+                return
+            # wbits=31: gzip container, so the stream is a valid .gz file
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                data = compressor.compress(chunk.encode('utf-8'))
+                if data:
+                    yield data
+            yield compressor.flush()
+
+        filename = "export.csv.gz" if compress else "export.csv"
+        response = Response(
+            generate(),
+            mimetype="application/gzip" if compress else "text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
+        response.call_on_close(db.close)
+        return response
     
+    @app.route('/api/health/db-pool')
+    def db_pool_metrics():
+        """Connection pool occupancy and checkout waits, for capacity planning."""
+        return jsonify(app.config['db_pool'].metrics())
+
+    @app.route('/api/health/result-cache')
+    def result_cache_metrics():
+        """Result cache hits, misses and evictions, and the data version it serves."""
+        return jsonify(app.config['result_cache'].metrics())
+
+    @app.route('/api/health/request-metrics')
+    def request_metrics():
+        """p50/p95/p99 phase timings, rows and response bytes per route, and recent slow queries."""
+        return jsonify(app.config['request_metrics'].metrics())
+
     @app.route('/')
     def hello_world():
         return 'NYC Mobility Dashboard API is running'
 
     @app.cli.command('process-data')
-    def process_data_command():
+    @click.option('--chunksize', type=int, default=None,
+                  help='Stream the CSV in chunks of this many rows to bound memory usage.')
+    @click.option('--bulk-load', is_flag=True, default=False,
+                  help='Load trips with LOAD DATA LOCAL INFILE instead of batched INSERTs.')
+    @click.option('--workers', type=int, default=1,
+                  help='Clean and load CSV partitions in this many worker processes.')
+    @click.option('--incremental', is_flag=True, default=False,
+                  help='Append new trips to existing tables and resume from the last committed chunk.')
+    @click.option('--cache-dir', default=None,
+                  help='Reuse (or write) a columnar cache of the cleaned dataset in this directory.')
+    @click.option('--csv-engine', type=click.Choice(['c', 'pyarrow']), default='c',
+                  help='CSV parser (streaming always uses the C engine).')
+    @click.option('--zones-file', default=None,
+                  help='TLC taxi zones GeoJSON; pickups and dropoffs are also labelled with zone ids.')
+    def process_data_command(chunksize, bulk_load, workers, incremental, cache_dir, csv_engine, zones_file):
         print("Starting data processing pipeline...")
-        data_pipeline = NYCTaxiDataProcessor()
-        db = TaxiTripDatabase(**app.config['db_config'])
+        data_pipeline = NYCTaxiDataProcessor(zones_file=zones_file)
+        db = TaxiTripDatabase(**app.config['db_config'], local_infile=bulk_load)
         db.connect()
         try:
-            data_pipeline.process(db, app.config['data_file'])
+            data_pipeline.process(db, app.config['data_file'], chunksize=chunksize, bulk_load=bulk_load,
+                                  workers=workers, incremental=incremental,
+                                  cache_dir=cache_dir, csv_engine=csv_engine)
         finally:
             db.close()
         print("Data processing complete!")
 
+    @app.cli.command('csv-memory-report')
+    @click.option('--rows', type=int, default=1000000, help='Number of CSV rows to sample.')
+    @click.option('--csv-engine', type=click.Choice(['c', 'pyarrow']), default='c')
+    def csv_memory_report_command(rows, csv_engine):
+        report = NYCTaxiDataProcessor.compare_loader_memory(app.config['data_file'], rows, csv_engine)
+        print(f"Inferred dtypes: {report['inferred_mb_per_million_rows']} MB per million rows")
+        print(f"Explicit schema: {report['typed_mb_per_million_rows']} MB per million rows")
+        print(f"Saving: {report['saving_pct']}%")
+
     return app
 
 
@@ -0,0 +1,143 @@
+"""Time the vectorized clean/derive stages against the row-wise implementation they replaced.
+
+Usage: python benchmarks/clean_derive_benchmark.py train.csv --rows 200000
+
+The row-wise stages below are the previous clean_dataset/derived_features: per-row
+exclusion logging, df.apply for bounds checks and haversine distances, and iterrows
+for the spatial index. The current derived_features also builds the OD matrix, tile
+pyramid, rollup cube and sketches, so its time covers more work than the old stage.
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processing.data_processor import NYCTaxiDataProcessor  # noqa: E402
+from data_processing.quick_select import QuickSelect  # noqa: E402
+
+
+def rowwise_clean(processor: NYCTaxiDataProcessor, raw: pd.DataFrame) -> pd.DataFrame:
+    exclusions = []
+    df = raw.copy()
+
+    missing_mask = df.isnull().any(axis=1)
+    for idx in df[missing_mask].index:
+        exclusions.append((idx, "missing_values", {'missing_columns': df.loc[idx].isnull().sum()}))
+    df = df.dropna()
+
+    df = df.assign(pickup_datetime=pd.to_datetime(df['pickup_datetime'], errors='coerce'),
+                   dropoff_datetime=pd.to_datetime(df['dropoff_datetime'], errors='coerce'))
+    invalid_datetime_mask = df['pickup_datetime'].isnull() | df['dropoff_datetime'].isnull()
+    for idx in df[invalid_datetime_mask].index:
+        exclusions.append((idx, "invalid_datetime", {}))
+    df = df[~invalid_datetime_mask]
+    df = df.assign(calculated_duration=(df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds())
+
+    negative_duration_mask = df['trip_duration'] <= 0
+    for idx in df[negative_duration_mask].index:
+        exclusions.append((idx, "negative_duration", {'duration': float(df.loc[idx, 'trip_duration'])}))
+    df = df[~negative_duration_mask]
+
+    durations = df['trip_duration'].tolist()
+    p99 = QuickSelect.find_percentile(durations, 0.99)
+    p01 = QuickSelect.find_percentile(durations, 0.01)
+    duration_outlier_mask = (df['trip_duration'] < p01) | (df['trip_duration'] > p99)
+    for idx in df[duration_outlier_mask].index:
+        exclusions.append((idx, "duration_outlier", {'duration': float(df.loc[idx, 'trip_duration']),
+                                                     'p01': p01, 'p99': p99}))
+    df = df[~duration_outlier_mask]
+
+    coordinate_columns = ['pickup_latitude', 'pickup_longitude', 'dropoff_latitude', 'dropoff_longitude']
+    df = df.assign(**{col: pd.to_numeric(df[col], errors='coerce') for col in coordinate_columns})
+    invalid_coords_mask = df[coordinate_columns].isnull().any(axis=1)
+    for idx in df[invalid_coords_mask].index:
+        exclusions.append((idx, "invalid_coordinates", {}))
+    df = df[~invalid_coords_mask]
+
+    valid_pickup = df.apply(lambda row: processor._validate_coordinates(
+        row['pickup_latitude'], row['pickup_longitude']), axis=1)
+    valid_dropoff = df.apply(lambda row: processor._validate_coordinates(
+        row['dropoff_latitude'], row['dropoff_longitude']), axis=1)
+    out_of_bounds_mask = ~(valid_pickup & valid_dropoff)
+    for idx in df[out_of_bounds_mask].index:
+        exclusions.append((idx, "out_of_nyc_bounds", {'pickup_lat': float(df.loc[idx, 'pickup_latitude']),
+                                                      'pickup_lon': float(df.loc[idx, 'pickup_longitude'])}))
+    df = df[valid_pickup & valid_dropoff]
+
+    df = df.assign(passenger_count=pd.to_numeric(df['passenger_count'], errors='coerce'))
+    invalid_passengers_mask = (df['passenger_count'] < 1) | (df['passenger_count'] > 6)
+    for idx in df[invalid_passengers_mask].index:
+        exclusions.append((idx, "invalid_passenger_count", {'count': float(df.loc[idx, 'passenger_count'])}))
+    df = df[~invalid_passengers_mask]
+
+    duplicate_mask = df.duplicated(subset=processor.DUPLICATE_SUBSET)
+    for idx in df[duplicate_mask].index:
+        exclusions.append((idx, "duplicate_record", {}))
+    return df[~duplicate_mask].reset_index(drop=True)
+
+
+def rowwise_derive(processor: NYCTaxiDataProcessor, clean: pd.DataFrame) -> pd.DataFrame:
+    df = clean.copy()
+    df['trip_distance_km'] = df.apply(lambda row: processor._haversine_distance(
+        row['pickup_latitude'], row['pickup_longitude'],
+        row['dropoff_latitude'], row['dropoff_longitude']), axis=1)
+    df['trip_speed_kmh'] = (df['trip_distance_km'] / df['trip_duration']) * 3600
+
+    speed_outliers = (df['trip_speed_kmh'] > 120) | (df['trip_speed_kmh'] < 1)
+    exclusions = [(idx, "impossible_speed", {'speed_kmh': float(df.loc[idx, 'trip_speed_kmh'])})
+                  for idx in df[speed_outliers].index]
+    df = df[~speed_outliers].copy()
+
+    df['hour_of_day'] = df['pickup_datetime'].dt.hour
+    df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
+    df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
+    df['month'] = df['pickup_datetime'].dt.month
+    df['expected_duration_min'] = (df['trip_distance_km'] / 20) * 60
+    df['actual_duration_min'] = df['trip_duration'] / 60
+    df['efficiency_ratio'] = df['expected_duration_min'] / df['actual_duration_min']
+    df['distance_category'] = pd.cut(df['trip_distance_km'], bins=[0, 2, 5, 10, float('inf')],
+                                     labels=['short', 'medium', 'long', 'very_long'])
+
+    for idx, row in df.iterrows():
+        processor.spatial_index.insert(row['pickup_latitude'], row['pickup_longitude'],
+                                       {'id': row['id'], 'datetime': row['pickup_datetime'],
+                                        'passengers': row['passenger_count']})
+    return df
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('filepath', help='Trip CSV (e.g. train.csv)')
+    parser.add_argument('--rows', type=int, default=200000, help='Number of CSV rows to benchmark on')
+    args = parser.parse_args()
+
+    raw = pd.read_csv(args.filepath, nrows=args.rows)
+
+    old = NYCTaxiDataProcessor()
+    old_clean, old_clean_time = timed(rowwise_clean, old, raw)
+    _, old_derive_time = timed(rowwise_derive, old, old_clean)
+
+    new = NYCTaxiDataProcessor()
+    new.raw_data = raw
+    _, new_clean_time = timed(new.clean_dataset)
+    _, new_derive_time = timed(new.derived_features)
+
+    print(f"{len(raw)} rows from {args.filepath}")
+    print(f"{'stage':<8} {'row-wise (s)':>13} {'vectorized (s)':>15} {'speedup':>8}")
+    for stage, old_time, new_time in (('clean', old_clean_time, new_clean_time),
+                                      ('derive', old_derive_time, new_derive_time)):
+        print(f"{stage:<8} {old_time:>13.2f} {new_time:>15.2f} {old_time / new_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable
+
+from mysql.connector import Error
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Error):
+    """No pooled connection became free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections.
+    Connections are opened lazily up to pool_size and handed out most-recently-used
+    first. A connection that sat idle for longer than health_check_interval is pinged
+    before it is handed out and replaced if it is dead; connections idle for longer than
+    idle_timeout are closed. Callers wait up to checkout_timeout for a free connection.
+    """
+
+    def __init__(self, connect: Callable[[], Any], pool_size: int = 5, checkout_timeout: float = 5.0,
+                 idle_timeout: float = 300.0, health_check_interval: float = 30.0):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self._connect = connect
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, returned_at), most recently returned on the right
+        self._open = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_evicted': 0,
+            'health_check_failures': 0
+        }
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Error as e:
+            logger.warning(f"Error closing pooled connection: {e}")
+
+    def _evict_idle(self, now: float) -> list:
+        """Remove connections idle past idle_timeout (the oldest are on the left); caller closes them"""
+        expired = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.popleft()[0])
+            self._open -= 1
+        self._stats['connections_evicted'] += len(expired)
+        return expired
+
+    def acquire(self, timeout: float = None):
+        """Borrow a connection; raises PoolTimeoutError if none is free within the timeout"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        deadline = start + timeout
+        waited = False
+
+        with self._lock:
+            expired = self._evict_idle(time.monotonic())
+            while not self._idle and self._open >= self.pool_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"No database connection free after {timeout:.1f}s "
+                                           f"(pool_size={self.pool_size})")
+                waited = True
+                self._lock.wait(remaining)
+
+            if self._idle:
+                connection, returned_at = self._idle.pop()
+            else:
+                connection, returned_at = None, None
+                self._open += 1
+
+            wait_time = time.perf_counter() - start
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+
+        for stale in expired:
+            self._close(stale)
+
+        # Connecting and pinging happen outside the lock so they do not block other checkouts
+        try:
+            if connection is not None and time.monotonic() - returned_at > self.health_check_interval:
+                if not connection.is_connected():
+                    logger.warning("Pooled connection failed its health check; reconnecting")
+                    with self._lock:
+                        self._stats['health_check_failures'] += 1
+                    self._close(connection)
+                    connection = None
+            if connection is None:
+                connection = self._connect()
+                with self._lock:
+                    self._stats['connections_created'] += 1
+            return connection
+
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, connection, discard: bool = False):
+        """Return a borrowed connection; open transactions are rolled back first"""
+        if not discard:
+            try:
+                connection.rollback()
+            except Error as e:
+                logger.warning(f"Discarding pooled connection that failed to reset: {e}")
+                discard = True
+
+        with self._lock:
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+        if discard:
+            self._close(connection)
+
+    def close_all(self):
+        """Close every idle connection; borrowed ones are closed when released with discard"""
+        with self._lock:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+        for connection in idle:
+            self._close(connection)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Pool occupancy and wait statistics for capacity planning"""
+        with self._lock:
+            idle = len(self._idle)
+            stats = dict(self._stats)
+            stats.update(pool_size=self.pool_size, open=self._open, idle=idle, in_use=self._open - idle)
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        for key in ('wait_time_total', 'wait_time_max', 'wait_time_avg'):
+            stats[key] = round(stats[key], 6)
+        return stats
@@ -1,10 +1,19 @@
 import logging
+import glob
 import math
+import os
+import tempfile
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from data_processing.taxi_trip_db import TaxiTripDatabase
-from data_processing.spatial_index import SpatialGridIndex
+from data_processing.spatial_index import SpatialGridIndex, haversine_km
+from data_processing.tile_pyramid import TilePyramid
+from data_processing.od_matrix import ODMatrix
+from data_processing.trip_rollup import TripRollup
+from data_processing.polygon_index import PolygonIndex
 from data_processing.quick_select import QuickSelect
+from data_processing.quantile_sketch import KLLSketch
+import numpy as np
 import pandas as pd
 import json
 
@@ -27,46 +36,204 @@ class NYCTaxiDataProcessor:
         'lon_max': -73.687826
     }
 
-    def __init__(self):
+    DUPLICATE_SUBSET = ['pickup_datetime', 'pickup_latitude',
+                        'pickup_longitude', 'trip_duration']
+
+    # Number of on-disk hash partitions used to find duplicate keys in streaming mode
+    DUPLICATE_PARTITIONS = 64
+
+    # Lower and upper trip duration percentiles; trips outside them are outliers
+    DURATION_PERCENTILES = (0.01, 0.99)
+
+    # Trip metrics summarized by mergeable quantile sketches, and the sketch size
+    SKETCH_METRICS = ['trip_duration', 'trip_distance_km', 'trip_speed_kmh']
+    SKETCH_K = 200
+
+    # Width in hours of the time-of-day buckets of the origin-destination matrix
+    OD_HOUR_BUCKET = 3
+
+    # Bundled borough boundaries: NYC Department of City Planning shoreline-clipped boundaries
+    # (release 16A), simplified to 50 ft with islands under 200,000 sq ft dropped. Taxi zones are
+    # optional and read from a TLC taxi zones GeoJSON
+    BOROUGHS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nyc_boroughs.geojson')
+    # Finer than the default: detailed shorelines leave fewer points in cells that need ray casting
+    BOROUGH_CELL_SIZE = 0.005
+    ZONE_ID_PROPERTY = 'LocationID'
+    ZONE_NAME_PROPERTY = 'zone'
+
+    # Explicit train.csv schema. Coordinates stay float64: nyc_trip.sql stores six decimals,
+    # and float32 (about 7.6e-6 degrees of resolution at NYC longitudes) would change them.
+    CSV_DTYPES = {
+        'id': 'object',
+        'vendor_id': 'int8',
+        'passenger_count': 'int8',
+        'pickup_longitude': 'float64',
+        'pickup_latitude': 'float64',
+        'dropoff_longitude': 'float64',
+        'dropoff_latitude': 'float64',
+        'store_and_fwd_flag': 'category',
+        'trip_duration': 'int32'
+    }
+    CSV_DATETIME_COLUMNS = ['pickup_datetime', 'dropoff_datetime']
+    CSV_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+    def __init__(self, zones_file: str = None):
         self.raw_data = None
         self.clean_data = None
-        self.excluded_records = []
+        self.exclusions = []
         self.spatial_index = SpatialGridIndex()
+        self.dropoff_index = SpatialGridIndex()
+        self.od_matrix = ODMatrix(self.spatial_index.grid_size, self.OD_HOUR_BUCKET)
+        self.trip_rollup = TripRollup()
+        self.tile_pyramid = TilePyramid(self.NYC_BOUNDS)
+        self.borough_index = PolygonIndex.from_geojson(self.BOROUGHS_FILE, 'boro_code', 'boro_name',
+                                                       self.BOROUGH_CELL_SIZE)
+        self.zones_file = zones_file
+        self.zone_index = None
+        if zones_file:
+            self.zone_index = PolygonIndex.from_geojson(zones_file, self.ZONE_ID_PROPERTY, self.ZONE_NAME_PROPERTY,
+                                                        cell_size=0.005)
+        self.grid_stats = None
+        self.sketches = {}
         self.processing_stats = {
             'total_records': 0,
             'excluded_records': 0,
             'exclusion_reasons': {}
         }
 
-    def load_data(self, filepath: str) -> pd.DataFrame:
+    @classmethod
+    def csv_read_options(cls, engine: str = 'c', typed: bool = True) -> Dict[str, Any]:
+        """read_csv keyword arguments for train.csv.
+
+        Without typed, numeric columns are left to inference so that missing or malformed
+        values can still be loaded and excluded during cleaning.
+        """
+        if engine == 'pyarrow':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warning("pyarrow is not installed; falling back to the C CSV engine.")
+                engine = 'c'
+
+        options = {
+            'engine': engine,
+            'parse_dates': cls.CSV_DATETIME_COLUMNS,
+            'date_format': cls.CSV_DATETIME_FORMAT
+        }
+        options['dtype'] = {column: dtype for column, dtype in cls.CSV_DTYPES.items()
+                            if typed or dtype in ('object', 'category')}
+        return options
+
+    @staticmethod
+    def memory_per_million_rows(df: pd.DataFrame) -> float:
+        """Deep memory footprint of a frame in MB per million rows"""
+        if len(df) == 0:
+            return 0.0
+        return float(df.memory_usage(deep=True).sum()) / len(df) * 1e6 / 1024 ** 2
+
+    @classmethod
+    def _datetimes_to_ns(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """The pyarrow engine yields second resolution; keep nanoseconds like the C engine"""
+        for column in cls.CSV_DATETIME_COLUMNS:
+            if pd.api.types.is_datetime64_dtype(df[column]) and df[column].dtype != 'datetime64[ns]':
+                df[column] = df[column].astype('datetime64[ns]')
+        return df
+
+    @classmethod
+    def read_csv(cls, source, engine: str = 'c') -> pd.DataFrame:
+        """Read a whole trip CSV (path or file object) with the explicit schema"""
+        try:
+            df = pd.read_csv(source, **cls.csv_read_options(engine))
+        except (ValueError, TypeError) as e:
+            # Malformed numeric fields: fall back to inferred dtypes and let cleaning coerce them
+            logger.warning(f"Typed CSV read failed ({e}); reloading with inferred dtypes")
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            df = pd.read_csv(source, **cls.csv_read_options(engine, typed=False))
+        return cls._datetimes_to_ns(df)
+
+    def load_data(self, filepath: str, engine: str = 'c') -> pd.DataFrame:
         logger.info(f"Loading data from {filepath}")
         try:
-            self.raw_data = pd.read_csv(filepath)
+            self.raw_data = self.read_csv(filepath, engine)
             self.processing_stats['total_records'] = len(self.raw_data)
-            logger.info(f"Loaded {len(self.raw_data)} records")
+            logger.info(f"Loaded {len(self.raw_data)} records "
+                        f"({self.memory_per_million_rows(self.raw_data):.1f} MB per million rows)")
             return self.raw_data
         except Exception as e:
             logger.error(f"Error loading data: {e}")
             raise
 
-    def _log_exclusion(self, index: int, reason: str, details: Dict = None):
-        """Log excluded records for transparency"""
-        self.excluded_records.append({
-            'index': index,
+    @classmethod
+    def compare_loader_memory(cls, filepath: str, nrows: int = 1000000,
+                              engine: str = 'c') -> Dict[str, float]:
+        """Memory footprint of the first nrows with inferred dtypes versus the explicit schema"""
+        inferred = cls.memory_per_million_rows(pd.read_csv(filepath, nrows=nrows))
+        try:
+            sample = pd.read_csv(filepath, nrows=nrows, **cls.csv_read_options(engine))
+        except (ValueError, TypeError):
+            sample = pd.read_csv(filepath, nrows=nrows, **cls.csv_read_options(engine, typed=False))
+        typed = cls.memory_per_million_rows(sample)
+        report = {
+            'inferred_mb_per_million_rows': round(inferred, 2),
+            'typed_mb_per_million_rows': round(typed, 2),
+            'saving_pct': round((1 - typed / inferred) * 100, 1) if inferred else 0.0
+        }
+        logger.info(f"CSV loader memory report: {report}")
+        return report
+
+    def _log_exclusions(self, index, reason: str, details: Dict[str, Any] = None):
+        """Log a batch of excluded records for transparency.
+
+        Exclusions are kept columnar: one entry per reason and stage holding the row
+        index array and one array (or scalar shared by all rows) per detail field.
+        """
+        index = np.asarray(index)
+        if len(index) == 0:
+            return
+
+        self._merge_exclusions([{
             'reason': reason,
-            'details': details or {},
+            'index': index,
+            'details': {key: value if np.ndim(value) == 0 else np.asarray(value)
+                        for key, value in (details or {}).items()},
             'timestamp': datetime.now().isoformat()
-        })
+        }])
 
-        # Update statistics
-        if reason not in self.processing_stats['exclusion_reasons']:
-            self.processing_stats['exclusion_reasons'][reason] = 0
-        self.processing_stats['exclusion_reasons'][reason] += 1
-        self.processing_stats['excluded_records'] += 1
+    def _merge_exclusions(self, exclusions: list):
+        """Append exclusion batches, e.g. those logged by a worker process"""
+        for batch in exclusions:
+            self.exclusions.append(batch)
 
-    def _validate_coordinates(self, lat: float, lon: float) -> bool:
-        return (self.NYC_BOUNDS['lat_min'] <= lat <= self.NYC_BOUNDS['lat_max'] and
-                self.NYC_BOUNDS['lon_min'] <= lon <= self.NYC_BOUNDS['lon_max'])
+            # Update statistics
+            reason = batch['reason']
+            if reason not in self.processing_stats['exclusion_reasons']:
+                self.processing_stats['exclusion_reasons'][reason] = 0
+            self.processing_stats['exclusion_reasons'][reason] += len(batch['index'])
+            self.processing_stats['excluded_records'] += len(batch['index'])
+
+    @staticmethod
+    def _exclusion_rows(exclusions: list):
+        """Expand columnar exclusion batches into one dict per excluded record"""
+        for batch in exclusions:
+            details = {key: [value] * len(batch['index']) if np.ndim(value) == 0 else value.tolist()
+                       for key, value in batch['details'].items()}
+            for i, index in enumerate(batch['index'].tolist()):
+                yield {
+                    'index': index,
+                    'reason': batch['reason'],
+                    'details': {key: values[i] for key, values in details.items()},
+                    'timestamp': batch['timestamp']
+                }
+
+    @property
+    def excluded_records(self) -> list:
+        return list(self._exclusion_rows(self.exclusions))
+
+    def _validate_coordinates(self, lat, lon):
+        """Check NYC bounds for scalars or whole coordinate arrays"""
+        return ((lat >= self.NYC_BOUNDS['lat_min']) & (lat <= self.NYC_BOUNDS['lat_max']) &
+                (lon >= self.NYC_BOUNDS['lon_min']) & (lon <= self.NYC_BOUNDS['lon_max']))
 
     @staticmethod
     def _haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -85,111 +252,132 @@ class NYCTaxiDataProcessor:
 
         return R * c
 
-    def clean_dataset(self) -> pd.DataFrame:
-        """Comprehensive data cleaning pipeline"""
-        logger.info("Starting data cleaning process")
-
-        if self.raw_data is None:
-            raise ValueError("No data loaded. Call load_data() first.")
-
-        df = self.raw_data.copy()
-        initial_count = len(df)
+    @staticmethod
+    def _haversine_distance_batch(lat1: np.ndarray, lon1: np.ndarray,
+                                  lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+        """Array version of _haversine_distance over whole coordinate columns"""
+        return haversine_km(lat1, lon1, lat2, lon2)
 
+    def _drop_invalid_records(self, df: pd.DataFrame, log: bool = True) -> pd.DataFrame:
+        """Drop rows with missing values, invalid datetimes or non-positive durations"""
         # 1. Handle missing values
-        logger.info("Handling missing values...")
-        missing_mask = df.isnull().any(axis=1)
-        for idx in df[missing_mask].index:
-            self._log_exclusion(idx, "missing_values",
-                                {'missing_columns': df.loc[idx].isnull().sum()})
-        df = df.dropna()
-        logger.info(f"Removed {missing_mask.sum()} records with missing values")
+        missing_counts = df.isnull().sum(axis=1).to_numpy()
+        missing_mask = missing_counts > 0
+        if log:
+            self._log_exclusions(df.index[missing_mask], "missing_values",
+                                 {'missing_columns': missing_counts[missing_mask]})
+        df = df[~missing_mask]
 
         # 2. Convert datetime columns
-        logger.info("Processing datetime fields...")
-        df['pickup_datetime'] = pd.to_datetime(df['pickup_datetime'], errors='coerce')
-        df['dropoff_datetime'] = pd.to_datetime(df['dropoff_datetime'], errors='coerce')
+        df = df.assign(pickup_datetime=pd.to_datetime(df['pickup_datetime'], errors='coerce'),
+                       dropoff_datetime=pd.to_datetime(df['dropoff_datetime'], errors='coerce'))
 
-        invalid_datetime_mask = df['pickup_datetime'].isnull() | df['dropoff_datetime'].isnull()
-        for idx in df[invalid_datetime_mask].index:
-            self._log_exclusion(idx, "invalid_datetime")
+        invalid_datetime_mask = (df['pickup_datetime'].isnull() | df['dropoff_datetime'].isnull()).to_numpy()
+        if log:
+            self._log_exclusions(df.index[invalid_datetime_mask], "invalid_datetime")
         df = df[~invalid_datetime_mask]
 
         # 3. Validate trip duration
-        logger.info("Validating trip durations...")
-        df['calculated_duration'] = (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds()
+        df = df.assign(calculated_duration=(df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds())
 
         # Remove negative durations
-        negative_duration_mask = df['trip_duration'] <= 0
-        for idx in df[negative_duration_mask].index:
-            self._log_exclusion(idx, "negative_duration",
-                                {'duration': float(df.loc[idx, 'trip_duration'])})
-        df = df[~negative_duration_mask]
-
-        # Detect outliers using custom QuickSelect algorithm
-        durations = df['trip_duration'].tolist()
-        p99 = QuickSelect.find_percentile(durations, 0.99)
-        p01 = QuickSelect.find_percentile(durations, 0.01)
-
-        logger.info(f"Duration outlier thresholds: P1={p01:.2f}s, P99={p99:.2f}s")
-
-        duration_outlier_mask = (df['trip_duration'] < p01) | (df['trip_duration'] > p99)
-        for idx in df[duration_outlier_mask].index:
-            self._log_exclusion(idx, "duration_outlier",
-                                {'duration': float(df.loc[idx, 'trip_duration']),
-                                 'p01': p01, 'p99': p99})
+        durations = df['trip_duration'].to_numpy()
+        negative_duration_mask = durations <= 0
+        if log:
+            self._log_exclusions(df.index[negative_duration_mask], "negative_duration",
+                                 {'duration': durations[negative_duration_mask].astype(float)})
+        return df[~negative_duration_mask]
+
+    def _filter_records(self, df: pd.DataFrame, p01: float, p99: float) -> pd.DataFrame:
+        """Drop duration outliers, invalid or out-of-bounds coordinates and passenger counts"""
+        durations = df['trip_duration'].to_numpy()
+        duration_outlier_mask = (durations < p01) | (durations > p99)
+        self._log_exclusions(df.index[duration_outlier_mask], "duration_outlier",
+                             {'duration': durations[duration_outlier_mask].astype(float),
+                              'p01': p01, 'p99': p99})
         df = df[~duration_outlier_mask]
 
         # 4. Validate coordinates
-        logger.info("Validating geographical coordinates...")
         coordinate_columns = ['pickup_latitude', 'pickup_longitude',
                               'dropoff_latitude', 'dropoff_longitude']
 
-        for col in coordinate_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        df = df.assign(**{col: pd.to_numeric(df[col], errors='coerce') for col in coordinate_columns})
 
-        invalid_coords_mask = df[coordinate_columns].isnull().any(axis=1)
-        for idx in df[invalid_coords_mask].index:
-            self._log_exclusion(idx, "invalid_coordinates")
+        invalid_coords_mask = df[coordinate_columns].isnull().any(axis=1).to_numpy()
+        self._log_exclusions(df.index[invalid_coords_mask], "invalid_coordinates")
         df = df[~invalid_coords_mask]
 
         # Validate NYC boundaries
-        valid_pickup = df.apply(
-            lambda row: self._validate_coordinates(
-                row['pickup_latitude'], row['pickup_longitude']
-            ), axis=1
-        )
-        valid_dropoff = df.apply(
-            lambda row: self._validate_coordinates(
-                row['dropoff_latitude'], row['dropoff_longitude']
-            ), axis=1
-        )
+        pickup_lat = df['pickup_latitude'].to_numpy()
+        pickup_lon = df['pickup_longitude'].to_numpy()
+        valid_pickup = self._validate_coordinates(pickup_lat, pickup_lon)
+        valid_dropoff = self._validate_coordinates(df['dropoff_latitude'].to_numpy(),
+                                                   df['dropoff_longitude'].to_numpy())
 
         out_of_bounds_mask = ~(valid_pickup & valid_dropoff)
-        for idx in df[out_of_bounds_mask].index:
-            self._log_exclusion(idx, "out_of_nyc_bounds", {
-                'pickup_lat': float(df.loc[idx, 'pickup_latitude']),
-                'pickup_lon': float(df.loc[idx, 'pickup_longitude'])
-            })
-        df = df[valid_pickup & valid_dropoff]
+        self._log_exclusions(df.index[out_of_bounds_mask], "out_of_nyc_bounds", {
+            'pickup_lat': pickup_lat[out_of_bounds_mask].astype(float),
+            'pickup_lon': pickup_lon[out_of_bounds_mask].astype(float)
+        })
+        df = df[~out_of_bounds_mask]
 
         # 5. Validate passenger count
-        logger.info("Validating passenger counts...")
-        df['passenger_count'] = pd.to_numeric(df['passenger_count'], errors='coerce')
-        invalid_passengers_mask = (df['passenger_count'] < 1) | (df['passenger_count'] > 6)
-        for idx in df[invalid_passengers_mask].index:
-            self._log_exclusion(idx, "invalid_passenger_count",
-                                {'count': float(df.loc[idx, 'passenger_count'])})
-        df = df[~invalid_passengers_mask]
+        df = df.assign(passenger_count=pd.to_numeric(df['passenger_count'], errors='coerce'))
+        passengers = df['passenger_count'].to_numpy()
+        invalid_passengers_mask = (passengers < 1) | (passengers > 6)
+        self._log_exclusions(df.index[invalid_passengers_mask], "invalid_passenger_count",
+                             {'count': passengers[invalid_passengers_mask].astype(float)})
+        return df[~invalid_passengers_mask]
+
+    @classmethod
+    def _duplicate_keys(cls, df: pd.DataFrame) -> np.ndarray:
+        """Hash the duplicate-detection columns of every row into a uint64 key.
+
+        Numeric columns are normalized to float64 and datetimes to nanoseconds first, so
+        that keys agree between chunks or partitions read with the explicit schema and
+        those that fell back to inferred dtypes.
+        """
+        subset = pd.DataFrame({
+            column: pd.to_datetime(df[column], errors='coerce').astype('datetime64[ns]')
+            if column == 'pickup_datetime'
+            else pd.to_numeric(df[column], errors='coerce').astype(np.float64)
+            for column in cls.DUPLICATE_SUBSET
+        })
+        return pd.util.hash_pandas_object(subset, index=False).to_numpy()
+
+    def clean_dataset(self, use_sketch: bool = False) -> pd.DataFrame:
+        """Comprehensive data cleaning pipeline"""
+        logger.info("Starting data cleaning process")
+
+        if self.raw_data is None:
+            raise ValueError("No data loaded. Call load_data() first.")
+
+        df = self.raw_data.copy()
+        initial_count = len(df)
+
+        logger.info("Handling missing values, datetime fields and trip durations...")
+        df = self._drop_invalid_records(df)
+
+        # Detect outliers using custom QuickSelect algorithm, or approximately with a quantile sketch
+        if use_sketch:
+            p01, p99 = KLLSketch(self.SKETCH_K).update(df['trip_duration'].to_numpy()).quantiles(
+                self.DURATION_PERCENTILES)
+        else:
+            p01, p99 = QuickSelect.find_percentiles(df['trip_duration'].to_numpy(), self.DURATION_PERCENTILES)
+
+        logger.info(f"Duration outlier thresholds: P1={p01:.2f}s, P99={p99:.2f}s")
+
+        logger.info("Validating geographical coordinates and passenger counts...")
+        df = self._filter_records(df, p01, p99)
 
         # 6. Remove duplicates
         logger.info("Removing duplicate records...")
-        duplicate_mask = df.duplicated(subset=['pickup_datetime', 'pickup_latitude',
-                                               'pickup_longitude', 'trip_duration'])
-        for idx in df[duplicate_mask].index:
-            self._log_exclusion(idx, "duplicate_record")
+        duplicate_mask = df.duplicated(subset=self.DUPLICATE_SUBSET).to_numpy()
+        self._log_exclusions(df.index[duplicate_mask], "duplicate_record")
         df = df[~duplicate_mask]
 
-        self.clean_data = df.reset_index(drop=True)
+        # Keep the CSV row numbers until derived_features has logged impossible speeds by them
+        self.clean_data = df
 
         logger.info(f"Cleaning complete: {initial_count} -> {len(self.clean_data)} records")
         logger.info(f"Excluded: {self.processing_stats['excluded_records']} records")
@@ -197,71 +385,126 @@ class NYCTaxiDataProcessor:
 
         return self.clean_data
 
-    def derived_features(self) -> pd.DataFrame:
-        logger.info("derived features...")
-
-        if self.clean_data is None:
-            raise ValueError("No cleaned data. Call clean_data() first.")
+    def _derive_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add distance, speed, temporal, efficiency and grid cell features and drop impossible speeds.
 
-        df = self.clean_data.copy()
+        Every feature is computed over whole NumPy columns; thresholds are applied in float64
+        and the stored float features are downcast to float32, temporal fields to int8.
+        """
+        pickup_lat = df['pickup_latitude'].to_numpy(dtype=np.float64)
+        pickup_lon = df['pickup_longitude'].to_numpy(dtype=np.float64)
+        durations = df['trip_duration'].to_numpy(dtype=np.float64)
 
         # Feature 1: Trip Distance (using custom Haversine implementation)
-        logger.info("Calculating trip distances using Haversine formula...")
-        df['trip_distance_km'] = df.apply(
-            lambda row: self._haversine_distance(
-                row['pickup_latitude'], row['pickup_longitude'],
-                row['dropoff_latitude'], row['dropoff_longitude']
-            ), axis=1
-        )
+        distances = self._haversine_distance_batch(pickup_lat, pickup_lon,
+                                                   df['dropoff_latitude'].to_numpy(dtype=np.float64),
+                                                   df['dropoff_longitude'].to_numpy(dtype=np.float64))
 
         # Feature 2: Trip Speed (km/h)
-        logger.info("Calculating average trip speeds...")
-        df['trip_speed_kmh'] = (df['trip_distance_km'] / df['trip_duration']) * 3600
+        speeds = (distances / durations) * 3600
 
         # Remove impossible speeds (over 120 km/h in NYC traffic or under 1 km/h)
-        speed_outliers = (df['trip_speed_kmh'] > 120) | (df['trip_speed_kmh'] < 1)
-        for idx in df[speed_outliers].index:
-            self._log_exclusion(idx, "impossible_speed",
-                                {'speed_kmh': float(df.loc[idx, 'trip_speed_kmh'])})
-        df = df[~speed_outliers]
+        speed_outliers = (speeds > 120) | (speeds < 1)
+        self._log_exclusions(df.index[speed_outliers], "impossible_speed",
+                             {'speed_kmh': speeds[speed_outliers]})
+
+        keep = ~speed_outliers
+        df = df[keep]
+        distances, speeds, durations = distances[keep], speeds[keep], durations[keep]
 
         # Feature 3: Temporal Features
-        logger.info("Extracting temporal features...")
-        df['hour_of_day'] = df['pickup_datetime'].dt.hour
-        df['day_of_week'] = df['pickup_datetime'].dt.dayofweek
-        df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
-        df['month'] = df['pickup_datetime'].dt.month
+        pickup = df['pickup_datetime'].dt
+        day_of_week = pickup.dayofweek.to_numpy().astype(np.int8)
 
         # Feature 4: Distance Efficiency (actual duration vs expected from distance)
         # Assuming average city speed of 20 km/h
-        df['expected_duration_min'] = (df['trip_distance_km'] / 20) * 60
-        df['actual_duration_min'] = df['trip_duration'] / 60
-        df['efficiency_ratio'] = df['expected_duration_min'] / df['actual_duration_min']
-
-        # Feature 5: Trip distance categories
-        df['distance_category'] = pd.cut(
-            df['trip_distance_km'],
-            bins=[0, 2, 5, 10, float('inf')],
-            labels=['short', 'medium', 'long', 'very_long']
+        expected_duration_min = (distances / 20) * 60
+        actual_duration_min = durations / 60
+
+        # Grid cells of every pickup and dropoff, shared with the spatial indexes
+        pickup_lat, pickup_lon = pickup_lat[keep], pickup_lon[keep]
+        dropoff_lat = df['dropoff_latitude'].to_numpy(dtype=np.float64)
+        dropoff_lon = df['dropoff_longitude'].to_numpy(dtype=np.float64)
+        cell_x, cell_y = self.spatial_index.cell_keys(pickup_lat, pickup_lon)
+        dropoff_x, dropoff_y = self.dropoff_index.cell_keys(dropoff_lat, dropoff_lon)
+
+        # Borough (and taxi zone) of every pickup and dropoff; 0 where none applies
+        regions = self._assign_regions(pickup_lat, pickup_lon, dropoff_lat, dropoff_lon)
+
+        return df.assign(
+            trip_distance_km=distances.astype(np.float32),
+            trip_speed_kmh=speeds.astype(np.float32),
+            hour_of_day=pickup.hour.to_numpy().astype(np.int8),
+            day_of_week=day_of_week,
+            is_weekend=(day_of_week >= 5).astype(np.int8),
+            month=pickup.month.to_numpy().astype(np.int8),
+            expected_duration_min=expected_duration_min.astype(np.float32),
+            actual_duration_min=actual_duration_min.astype(np.float32),
+            efficiency_ratio=(expected_duration_min / actual_duration_min).astype(np.float32),
+            # Feature 5: Trip distance categories
+            distance_category=pd.cut(
+                distances,
+                bins=[0, 2, 5, 10, float('inf')],
+                labels=['short', 'medium', 'long', 'very_long']
+            ),
+            pickup_cell_x=cell_x.astype(np.int32),
+            pickup_cell_y=cell_y.astype(np.int32),
+            dropoff_cell_x=dropoff_x.astype(np.int32),
+            dropoff_cell_y=dropoff_y.astype(np.int32),
+            **regions
         )
 
+    def _assign_regions(self, pickup_lat: np.ndarray, pickup_lon: np.ndarray,
+                        dropoff_lat: np.ndarray, dropoff_lon: np.ndarray) -> Dict[str, np.ndarray]:
+        """Compact borough and taxi zone id columns for pickups and dropoffs"""
+        regions = {
+            'pickup_borough_id': self.borough_index.assign(pickup_lat, pickup_lon).astype(np.uint8),
+            'dropoff_borough_id': self.borough_index.assign(dropoff_lat, dropoff_lon).astype(np.uint8)
+        }
+        if self.zone_index is not None:
+            regions['pickup_zone_id'] = self.zone_index.assign(pickup_lat, pickup_lon).astype(np.int16)
+            regions['dropoff_zone_id'] = self.zone_index.assign(dropoff_lat, dropoff_lon).astype(np.int16)
+        else:
+            regions['pickup_zone_id'] = regions['dropoff_zone_id'] = np.zeros(len(pickup_lat), dtype=np.int16)
+        return regions
+
+    def region_names(self) -> list:
+        """(region_type, region_id, name) of every borough and taxi zone, for the regions table"""
+        rows = [('borough', region_id, name) for region_id, name in self.borough_index.names.items()]
+        if self.zone_index is not None:
+            rows.extend(('zone', region_id, name) for region_id, name in self.zone_index.names.items())
+        return rows
+
+    def derived_features(self) -> pd.DataFrame:
+        logger.info("derived features...")
+
+        if self.clean_data is None:
+            raise ValueError("No cleaned data. Call clean_data() first.")
+
+        logger.info("Calculating trip distances, speeds and temporal features...")
+        df = self._derive_frame(self.clean_data.copy())
+
         # Build spatial index for pickup locations
         logger.info("Building spatial index for pickup locations...")
-        for idx, row in df.iterrows():
-            self.spatial_index.insert(
-                row['pickup_latitude'],
-                row['pickup_longitude'],
-                {
-                    'id': row['id'],
-                    'datetime': row['pickup_datetime'],
-                    'passengers': row['passenger_count']
-                }
-            )
+        self.spatial_index.bulk_insert(df['pickup_latitude'].to_numpy(),
+                                       df['pickup_longitude'].to_numpy())
 
         spatial_stats = self.spatial_index.get_statistics()
         logger.info(f"Spatial index statistics: {spatial_stats}")
 
-        self.clean_data = df
+        logger.info("Building spatial index for dropoff locations and origin-destination flows...")
+        self._index_dropoffs(df)
+        self.od_matrix.add(df)
+        logger.info(f"OD matrix statistics: {self.od_matrix.get_statistics()}")
+
+        self.tile_pyramid.add(df)
+        logger.info(f"Tile pyramid statistics: {self.tile_pyramid.get_statistics()}")
+
+        self.trip_rollup.add(df)
+        logger.info(f"Trip rollup statistics: {self.trip_rollup.get_statistics()}")
+
+        self._update_sketches(df)
+        self.clean_data = df.reset_index(drop=True)
 
         logger.info(f"Feature engineering complete. Added columns: {df.columns.tolist()}")
 
@@ -297,6 +540,9 @@ class NYCTaxiDataProcessor:
             },
             'passenger_distribution': df['passenger_count'].value_counts().to_dict(),
             'spatial_index': self.spatial_index.get_statistics(),
+            'dropoff_index': self.dropoff_index.get_statistics(),
+            'od_matrix': self.od_matrix.get_statistics(),
+            'trip_rollup': self.trip_rollup.get_statistics(),
             'processing_stats': self.processing_stats
         }
 
@@ -311,31 +557,354 @@ class NYCTaxiDataProcessor:
                 'records': self.excluded_records
             }, f, indent=2)
 
-    def process(self, db: TaxiTripDatabase = None, filepath: str = 'train.csv'):
+    def _update_sketches(self, df: pd.DataFrame):
+        """Add the metrics of a derived frame to the running quantile sketches"""
+        for metric in self.SKETCH_METRICS:
+            self.sketches.setdefault(metric, KLLSketch(self.SKETCH_K)).update(df[metric].to_numpy())
+
+    def _merge_sketches(self, sketches: Dict[str, KLLSketch]):
+        for metric, sketch in sketches.items():
+            if metric in self.sketches:
+                self.sketches[metric].merge(sketch)
+            else:
+                self.sketches[metric] = sketch
+
+    def _index_dropoffs(self, df: pd.DataFrame):
+        self.dropoff_index.bulk_insert(df['dropoff_latitude'].to_numpy(), df['dropoff_longitude'].to_numpy())
+
+    def _grid_stats_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Per-cell pickup counts and sums of a frame, indexed by (cell_x, cell_y)"""
+        return self.spatial_index.cell_statistics(df)
+
+    def _accumulate_grid_stats(self, df: pd.DataFrame):
+        """Add per-cell pickup aggregates of a frame to the running grid statistics"""
+        stats = self._grid_stats_frame(df)
+        if self.grid_stats is None:
+            self.grid_stats = stats
+        else:
+            self.grid_stats = self.grid_stats.add(stats, fill_value=0)
+
+    def _spill_duplicate_keys(self, keys: np.ndarray, workdir: str, tag: str = 'main'):
+        """Append duplicate keys to on-disk hash partitions (one file per partition and writer)"""
+        partitions = keys % np.uint64(self.DUPLICATE_PARTITIONS)
+        order = np.argsort(partitions, kind='stable')
+        bounds = np.searchsorted(partitions[order], np.arange(self.DUPLICATE_PARTITIONS + 1))
+        for i in range(self.DUPLICATE_PARTITIONS):
+            if bounds[i] < bounds[i + 1]:
+                with open(os.path.join(workdir, f'keys_{i}_{tag}.bin'), 'ab') as f:
+                    keys[order[bounds[i]:bounds[i + 1]]].tofile(f)
+
+    def _collect_duplicate_candidates(self, workdir: str) -> np.ndarray:
+        """Keys that occur more than once across all spilled partitions, sorted"""
+        candidates = []
+        for i in range(self.DUPLICATE_PARTITIONS):
+            paths = glob.glob(os.path.join(workdir, f'keys_{i}_*.bin'))
+            if paths:
+                keys = np.concatenate([np.fromfile(path, dtype=np.uint64) for path in paths])
+                unique_keys, counts = np.unique(keys, return_counts=True)
+                candidates.append(unique_keys[counts > 1])
+
+        return np.sort(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.uint64)
+
+    def _scan_duplicate_candidates(self, filepath: str, chunksize: int, workdir: str,
+                                   engine: str = 'c') -> Tuple[pd.Series, np.ndarray, Dict[str, Any]]:
+        """First streaming pass: duration histogram and keys that occur more than once.
+
+        Keys are spilled to hash partitions on disk so that only one partition is held
+        in memory at a time, and only keys seen at least twice are kept. The file is read
+        with the explicit schema, or with inferred dtypes if any chunk does not fit it;
+        the read_csv options used are returned for the second pass.
+        """
+        for typed in (True, False):
+            options = self.csv_read_options(engine, typed=typed)
+            spill_dir = os.path.join(workdir, 'typed' if typed else 'inferred')
+            os.makedirs(spill_dir)
+            duration_counts = pd.Series(dtype='int64')
+            try:
+                with pd.read_csv(filepath, chunksize=chunksize, **options) as reader:
+                    for chunk in reader:
+                        df = self._drop_invalid_records(self._datetimes_to_ns(chunk), log=False)
+                        duration_counts = duration_counts.add(df['trip_duration'].value_counts(), fill_value=0)
+                        self._spill_duplicate_keys(self._duplicate_keys(df), spill_dir)
+            except (ValueError, TypeError) as e:
+                if not typed:
+                    raise
+                # Malformed numeric fields: stream with inferred dtypes and let cleaning coerce them
+                logger.warning(f"Typed CSV read failed ({e}); streaming with inferred dtypes")
+                continue
+            return duration_counts, self._collect_duplicate_candidates(spill_dir), options
+
+    @classmethod
+    def _write_excluded_records(cls, log_file, exclusions: list, first: bool) -> bool:
+        for record in cls._exclusion_rows(exclusions):
+            log_file.write(('\n    ' if first else ',\n    ') + json.dumps(record))
+            first = False
+        return first
+
+    def process_streaming(self, db: TaxiTripDatabase, filepath: str = 'train.csv',
+                          chunksize: int = 100000, excluded_filepath: str = 'excluded_records.json',
+                          bulk_load: bool = False, incremental: bool = False, csv_engine: str = 'c'):
+        """Run the pipeline over fixed-size CSV chunks with bounded memory.
+
+        A first pass collects the trip duration histogram for the exact P1/P99 cut-offs
+        and the keys that appear more than once; the second pass cleans, derives features
+        and inserts each chunk, keeping only the first occurrence of each duplicate key.
+        With bulk_load, chunks go through LOAD DATA and the trips secondary indexes are
+        rebuilt once after the last chunk.
+
+        With incremental, the tables may already hold data: trips whose id exists are
+        skipped, grid aggregates are added to the existing cells, and every chunk is
+        committed together with its ingest_checkpoints row so an interrupted run resumes
+        after the last committed chunk.
+        """
+        db.create_schema(db.schema_file)
+        db.save_regions(self.region_names())
+
+        checkpoint = None
+        if incremental:
+            checkpoint = db.get_checkpoint(filepath, chunksize)
+            if checkpoint['status'] == 'complete':
+                logger.info(f"{filepath} was already ingested ({checkpoint['trips_inserted']} trips). Skipping.")
+                return 0
+            if checkpoint['chunks_committed']:
+                logger.info(f"Resuming {filepath} after chunk {checkpoint['chunks_committed']} "
+                            f"({checkpoint['rows_committed']} rows)")
+            if bulk_load:
+                logger.warning("Incremental ingest appends with INSERT; ignoring bulk_load.")
+                bulk_load = False
+            chunksize = checkpoint['chunksize']
+            # Stored sketches already cover every committed chunk
+            self._merge_sketches(db.get_quantile_sketches(self.SKETCH_METRICS))
+            load_trips = load_excluded = True
+            load_grid = False
+        else:
+            stats = db.get_stats()
+            load_trips = not stats.get('total_trips')
+            load_excluded = not stats.get('total_excluded')
+            load_grid = not stats.get('total_grid_cells')
+            if not load_trips:
+                logger.warning("Trips table is not empty. Skipping trip insertion to avoid duplicates.")
+            if not load_excluded:
+                logger.warning("Excluded records table is not empty. Skipping excluded records insertion to avoid duplicates.")
+
+        if csv_engine == 'pyarrow':
+            logger.warning("The pyarrow CSV engine cannot read in chunks; streaming with the C engine.")
+            csv_engine = 'c'
+        logger.info(f"Streaming {filepath} in chunks of {chunksize} rows")
+
+        with tempfile.TemporaryDirectory(prefix='nyc_taxi_keys_') as workdir:
+            duration_counts, candidates, read_options = self._scan_duplicate_candidates(filepath, chunksize,
+                                                                                        workdir, csv_engine)
+
+        values = duration_counts.index.to_numpy()
+        counts = duration_counts.to_numpy()
+        p01, p99 = QuickSelect.find_percentiles_from_counts(values, counts, self.DURATION_PERCENTILES)
+        logger.info(f"Duration outlier thresholds: P1={p01:.2f}s, P99={p99:.2f}s")
+        logger.info(f"Found {len(candidates)} candidate duplicate keys")
+
+        seen_keys = set()
+        total_clean = 0
+        dropped_indexes = db.disable_trip_indexes() if bulk_load and load_trips else []
+
+        try:
+            with open(excluded_filepath, 'w') as log_file, \
+                    pd.read_csv(filepath, chunksize=chunksize, **read_options) as reader:
+                log_file.write('{\n  "records": [')
+                first_record = True
+
+                for chunk_number, chunk in enumerate(reader):
+                    self.processing_stats['total_records'] += len(chunk)
+
+                    df = self._drop_invalid_records(self._datetimes_to_ns(chunk))
+                    df = self._filter_records(df, p01, p99)
+
+                    keys = self._duplicate_keys(df)
+                    duplicate_mask = np.zeros(len(df), dtype=bool)
+                    for pos in np.flatnonzero(np.isin(keys, candidates)):
+                        if keys[pos] in seen_keys:
+                            duplicate_mask[pos] = True
+                        else:
+                            seen_keys.add(keys[pos])
+                    self._log_exclusions(df.index[duplicate_mask], "duplicate_record")
+
+                    if checkpoint is not None and chunk_number < checkpoint['chunks_committed']:
+                        # Already committed by an earlier run; cleaned only to replay duplicate detection
+                        self.exclusions = []
+                        continue
+
+                    df = self._derive_frame(df[~duplicate_mask])
+
+                    if checkpoint is not None:
+                        existing_ids = db.existing_trip_ids(df['id'])
+                        if existing_ids:
+                            logger.info(f"Skipping {len(existing_ids)} trips already in the database")
+                            df = df[~df['id'].isin(existing_ids)]
+
+                        self._update_sketches(df)
+                        checkpoint.update(chunks_committed=chunk_number + 1,
+                                          rows_committed=self.processing_stats['total_records'],
+                                          trips_inserted=checkpoint['trips_inserted'] + len(df))
+                        chunk_tiles = TilePyramid(self.NYC_BOUNDS, self.tile_pyramid.max_zoom).add(df).to_frame()
+                        chunk_od_matrix = ODMatrix(self.od_matrix.grid_size, self.od_matrix.hour_bucket).add(df)
+                        chunk_rollup = TripRollup().add(df).to_frame()
+                        db.append_chunk(df, self._grid_stats_frame(df) if len(df) else None,
+                                        self.spatial_index, self.exclusions, checkpoint, sketches=self.sketches,
+                                        tiles=chunk_tiles, od_matrix=chunk_od_matrix, rollup=chunk_rollup)
+                    else:
+                        self._accumulate_grid_stats(df)
+                        self.od_matrix.add(df)
+                        self.trip_rollup.add(df)
+                        self.tile_pyramid.add(df)
+                        self._update_sketches(df)
+
+                        if load_trips and len(df):
+                            if bulk_load:
+                                db.insert_trips_bulk(df, check_existing=False, manage_indexes=False)
+                            else:
+                                db.insert_trips_batch(df, check_existing=False)
+                        if load_excluded:
+                            db.insert_excluded_records(self.exclusions, check_existing=False)
+
+                    total_clean += len(df)
+                    first_record = self._write_excluded_records(log_file, self.exclusions, first_record)
+                    self.exclusions = []
+
+                    logger.info(f"Processed {self.processing_stats['total_records']} rows, "
+                                f"{total_clean} clean records so far")
+
+                log_file.write('\n  ],\n  "summary": ' + json.dumps(self.processing_stats, indent=2) + '\n}\n')
+        finally:
+            # Also on failure: a rerun finds trips non-empty and would never restore them
+            db.rebuild_trip_indexes(dropped_indexes)
+
+        if checkpoint is not None:
+            db.complete_checkpoint(checkpoint)
+        else:
+            if load_grid and self.grid_stats is not None:
+                db.insert_spatial_grid_stats(self.grid_stats, self.spatial_index, check_existing=False)
+            elif not load_grid:
+                logger.warning("Spatial grid cells table is not empty. Skipping spatial grid insertion to avoid duplicates.")
+            db.insert_spatial_tiles(self.tile_pyramid)
+            db.insert_od_flows(self.od_matrix)
+            db.insert_trip_rollup(self.trip_rollup)
+            db.save_quantile_sketches(self.sketches)
+            db.bump_data_version()
+
+        logger.info(f"Streaming complete: {self.processing_stats['total_records']} -> {total_clean} records")
+        logger.info(f"Exclusion breakdown: {self.processing_stats['exclusion_reasons']}")
+        return total_clean
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Processing parameters that the cleaned dataset depends on, part of the cache key"""
+        # Imported here: dataset_cache is only needed when caching is requested
+        from data_processing.dataset_cache import CleanDatasetCache
+
+        return {
+            'nyc_bounds': self.NYC_BOUNDS,
+            'duplicate_subset': self.DUPLICATE_SUBSET,
+            'duration_percentiles': list(self.DURATION_PERCENTILES),
+            'grid_size': self.spatial_index.grid_size,
+            'od_hour_bucket': self.OD_HOUR_BUCKET,
+            'boroughs': CleanDatasetCache.file_digest(self.BOROUGHS_FILE),
+            'zones': CleanDatasetCache.file_digest(self.zones_file) if self.zones_file else None
+        }
+
+    def load_cached(self, cache, key: str) -> pd.DataFrame:
+        """Restore clean data, exclusions and statistics from a CleanDatasetCache entry"""
+        self.clean_data, exclusions, processing_stats = cache.load(key)
+        self.exclusions = exclusions
+        self.processing_stats = processing_stats
+
+        self.spatial_index.bulk_insert(self.clean_data['pickup_latitude'].to_numpy(),
+                                       self.clean_data['pickup_longitude'].to_numpy())
+        self._index_dropoffs(self.clean_data)
+        self.od_matrix.add(self.clean_data)
+        self.trip_rollup.add(self.clean_data)
+        self.tile_pyramid.add(self.clean_data)
+        self._update_sketches(self.clean_data)
+        return self.clean_data
+
+    def process(self, db: TaxiTripDatabase = None, filepath: str = 'train.csv', chunksize: int = None,
+                bulk_load: bool = False, workers: int = 1, incremental: bool = False, cache_dir: str = None,
+                csv_engine: str = 'c'):
         print("=" * 80)
         print("NYC TAXI TRIP DATA PROCESSING PIPELINE")
         print("=" * 80)
 
-        print("\n[1/5] Loading raw data...")
-        try:
-            self.load_data(filepath)
-        except FileNotFoundError:
-            print(f"ERROR: {filepath} not found. Please place the dataset in the same directory.")
-            print("Download from: NYC Taxi Trip Dataset")
+        if incremental:
+            if workers > 1:
+                logger.warning("Incremental ingest runs in a single process; ignoring workers.")
+                workers = 1
+            chunksize = chunksize or 100000
+
+        if workers > 1 or chunksize:
+            if cache_dir:
+                logger.warning("The cleaned dataset cache needs the full frame; ignoring cache_dir "
+                               "in streaming and parallel modes.")
+            try:
+                if workers > 1:
+                    # Imported here: parallel_ingest builds on this module
+                    from data_processing.parallel_ingest import ParallelIngest
+
+                    print(f"\nProcessing {filepath} with {workers} worker processes...")
+                    total_clean = ParallelIngest(self, db, workers, bulk_load=bulk_load,
+                                                 csv_engine=csv_engine).run(filepath)
+                else:
+                    print(f"\nStreaming {filepath} in chunks of {chunksize} rows...")
+                    total_clean = self.process_streaming(db, filepath, chunksize, bulk_load=bulk_load,
+                                                         incremental=incremental, csv_engine=csv_engine)
+            except FileNotFoundError:
+                print(f"ERROR: {filepath} not found. Please place the dataset in the same directory.")
+                return
+
+            print("\n" + "=" * 80)
+            print("PROCESSING COMPLETE!")
+            print("=" * 80)
+            print(f"✓ Cleaned data: {total_clean} records")
+            print(f"✓ Excluded records log: excluded_records.json")
+            print(f"✓ Processing log: data_processing.log")
             return
 
-        print("\n[2/5] Cleaning data...")
-        self.clean_dataset()
-
-        print("\n[3/5] Derived features...")
-        self.derived_features()
+        cache = cache_key = None
+        if cache_dir:
+            # Imported here: pyarrow is only needed when caching is requested
+            from data_processing.dataset_cache import CleanDatasetCache
+
+            cache = CleanDatasetCache(cache_dir)
+            try:
+                cache_key = cache.cache_key(filepath, self.cache_params())
+            except FileNotFoundError:
+                print(f"ERROR: {filepath} not found. Please place the dataset in the same directory.")
+                return
+
+        if cache is not None and cache.has(cache_key):
+            print(f"\n[1-3/5] Loading cleaned data from cache {cache.entry_path(cache_key)}...")
+            self.load_cached(cache, cache_key)
+        else:
+            print("\n[1/5] Loading raw data...")
+            try:
+                self.load_data(filepath, engine=csv_engine)
+            except FileNotFoundError:
+                print(f"ERROR: {filepath} not found. Please place the dataset in the same directory.")
+                print("Download from: NYC Taxi Trip Dataset")
+                return
+
+            print("\n[2/5] Cleaning data...")
+            self.clean_dataset()
+
+            print("\n[3/5] Derived features...")
+            self.derived_features()
+
+            if cache is not None:
+                cache.save(cache_key, self.clean_data, self.exclusions, self.processing_stats,
+                           self.cache_params(), filepath)
 
         print("\n[4/5] Saving excluded records log...")
         self.save_excluded_records()
 
         print("\n[5/5] Inserting data into database...")
         db.create_schema(db.schema_file)
-        db.insert_data(self.clean_data, self)
+        db.insert_data(self.clean_data, self, bulk_load=bulk_load)
 
         print("\n" + "=" * 80)
         print("PROCESSING COMPLETE!")
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.ipc as ipc
+except ImportError:  # pyarrow is optional; without it the cache is disabled
+    pa = None
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class CleanDatasetCache:
+    """On-disk Arrow IPC cache of the cleaned, feature-enriched trips frame.
+
+    Each entry lives in its own directory named after a hash of the input file contents
+    and the processing parameters. Trips are split into one uncompressed Arrow file per
+    pickup month (hive-style ``pickup_month=YYYY-MM`` directories) so they can be
+    memory-mapped on load or scanned with pyarrow.dataset without MySQL. Exclusion
+    batches and processing statistics are stored next to them.
+    """
+
+    CACHE_VERSION = 1
+    MANIFEST = 'manifest.json'
+    TRIPS_DIR = 'trips'
+    EXCLUSIONS_DIR = 'exclusions'
+
+    def __init__(self, cache_dir: str = '.nyc_taxi_cache'):
+        if pa is None:
+            raise ImportError("pyarrow is required for the cleaned dataset cache")
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def file_digest(filepath: str, block_size: int = 4 * 1024 * 1024) -> str:
+        digest = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def cache_key(self, filepath: str, params: Dict[str, Any]) -> str:
+        """Hash of the input file contents, the processing parameters and the cache layout"""
+        payload = json.dumps({'file': self.file_digest(filepath), 'params': params,
+                              'version': self.CACHE_VERSION}, sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def has(self, key: str) -> bool:
+        # The manifest is written last, so a partially written entry is never used
+        return os.path.exists(os.path.join(self.entry_path(key), self.MANIFEST))
+
+    def latest_key(self) -> str:
+        """Key of the most recently written entry, for offline analytics"""
+        if not os.path.isdir(self.cache_dir):
+            return None
+        keys = [key for key in os.listdir(self.cache_dir) if self.has(key)]
+        if not keys:
+            return None
+        return max(keys, key=lambda key: os.path.getmtime(os.path.join(self.entry_path(key), self.MANIFEST)))
+
+    @staticmethod
+    def _write_table(table, path: str):
+        with pa.OSFile(path, 'wb') as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    @staticmethod
+    def _read_table(path: str):
+        # Zero-copy read: column buffers point into the memory-mapped file
+        with pa.memory_map(path, 'r') as source:
+            return ipc.open_file(source).read_all()
+
+    def save(self, key: str, df: pd.DataFrame, exclusions: list, processing_stats: Dict[str, Any],
+             params: Dict[str, Any], source_file: str) -> str:
+        path = self.entry_path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(os.path.join(tmp_path, self.TRIPS_DIR))
+        os.makedirs(os.path.join(tmp_path, self.EXCLUSIONS_DIR))
+
+        months = df['pickup_datetime'].dt.strftime('%Y-%m').to_numpy()
+        partitions = []
+        for month in np.unique(months):
+            part = df[months == month]
+            month_dir = os.path.join(tmp_path, self.TRIPS_DIR, f'pickup_month={month}')
+            os.makedirs(month_dir)
+            self._write_table(pa.Table.from_pandas(part, preserve_index=True),
+                              os.path.join(month_dir, 'part-0.arrow'))
+            partitions.append({'pickup_month': str(month), 'rows': len(part)})
+
+        batches = []
+        for i, batch in enumerate(exclusions):
+            arrays = {'index': batch['index']}
+            scalars = {}
+            for field, value in batch['details'].items():
+                if np.ndim(value) == 0:
+                    scalars[field] = value.item() if isinstance(value, np.generic) else value
+                else:
+                    arrays[field] = value
+            self._write_table(pa.table(arrays), os.path.join(tmp_path, self.EXCLUSIONS_DIR, f'{i:04d}.arrow'))
+            batches.append({'reason': batch['reason'], 'timestamp': batch['timestamp'], 'scalars': scalars})
+
+        manifest = {
+            'key': key,
+            'version': self.CACHE_VERSION,
+            'source_file': os.path.abspath(source_file),
+            'created_at': datetime.now().isoformat(),
+            'params': params,
+            'rows': len(df),
+            'partitions': partitions,
+            'exclusion_batches': batches,
+            'processing_stats': processing_stats
+        }
+        with open(os.path.join(tmp_path, self.MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logger.info(f"Cached {len(df)} clean records in {len(partitions)} partitions at {path}")
+        return path
+
+    def manifest(self, key: str) -> Dict[str, Any]:
+        with open(os.path.join(self.entry_path(key), self.MANIFEST)) as f:
+            return json.load(f)
+
+    def load(self, key: str, columns: List[str] = None) -> Tuple[pd.DataFrame, list, Dict[str, Any]]:
+        """Return the cached frame, exclusion batches and processing statistics"""
+        path = self.entry_path(key)
+        manifest = self.manifest(key)
+
+        tables = [self._read_table(os.path.join(path, self.TRIPS_DIR, f"pickup_month={part['pickup_month']}",
+                                                'part-0.arrow'))
+                  for part in manifest['partitions']]
+        table = pa.concat_tables(tables)
+        if columns is not None:
+            table = table.select([name for name in table.column_names
+                                  if name in columns or name.startswith('__index_level_')])
+        df = table.to_pandas().sort_index()
+
+        exclusions = []
+        for i, batch in enumerate(manifest['exclusion_batches']):
+            arrays = self._read_table(os.path.join(path, self.EXCLUSIONS_DIR, f'{i:04d}.arrow'))
+            details = {name: arrays.column(name).to_numpy() for name in arrays.column_names if name != 'index'}
+            details.update(batch['scalars'])
+            exclusions.append({
+                'reason': batch['reason'],
+                'index': arrays.column('index').to_numpy(),
+                'details': details,
+                'timestamp': batch['timestamp']
+            })
+
+        logger.info(f"Loaded {len(df)} clean records from cache {path}")
+        return df, exclusions, manifest['processing_stats']
+
+    def dataset(self, key: str = None):
+        """Open a cache entry as a pyarrow dataset for filtered, column-pruned scans.
+
+        For example ``cache.dataset().to_table(columns=['trip_duration'],
+        filter=ds.field('pickup_month') == '2016-03')``. Defaults to the latest entry.
+        """
+        key = key or self.latest_key()
+        if key is None:
+            raise FileNotFoundError(f"No cached dataset in {self.cache_dir}")
+        return ds.dataset(os.path.join(self.entry_path(key), self.TRIPS_DIR),
+                          format='ipc', partitioning='hive')
@@ -15,6 +15,30 @@
 /*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;
 /*!40111 SET @OLD_SQL_NOTES=@@SQL_NOTES, SQL_NOTES=0 */;
 
+--
+-- Table structure for table `data_version`
+--
+
+DROP TABLE IF EXISTS `data_version`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `data_version` (
+  `id` tinyint NOT NULL,
+  `version` bigint NOT NULL COMMENT 'Microsecond timestamp of the last change, still increasing if the table is recreated',
+  `updated_at` datetime NOT NULL COMMENT 'UTC',
+  PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Single-row stamp bumped by every ingest; cached API results are tied to it';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `data_version`
+--
+
+LOCK TABLES `data_version` WRITE;
+/*!40000 ALTER TABLE `data_version` DISABLE KEYS */;
+/*!40000 ALTER TABLE `data_version` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `excluded_records`
 --
@@ -43,6 +67,179 @@ LOCK TABLES `excluded_records` WRITE;
 /*!40000 ALTER TABLE `excluded_records` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `ingest_checkpoints`
+--
+
+DROP TABLE IF EXISTS `ingest_checkpoints`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `ingest_checkpoints` (
+  `source_key` char(40) NOT NULL COMMENT 'SHA-1 of path, size and modification time',
+  `source_file` varchar(512) NOT NULL,
+  `file_size` bigint NOT NULL,
+  `chunksize` int NOT NULL,
+  `chunks_committed` int NOT NULL DEFAULT '0',
+  `rows_committed` bigint NOT NULL DEFAULT '0' COMMENT 'Raw CSV rows covered by committed chunks',
+  `trips_inserted` bigint NOT NULL DEFAULT '0',
+  `status` enum('running','complete') NOT NULL DEFAULT 'running',
+  `updated_at` datetime NOT NULL,
+  PRIMARY KEY (`source_key`),
+  KEY `idx_source_file` (`source_file`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Progress of incremental CSV ingest';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `ingest_checkpoints`
+--
+
+LOCK TABLES `ingest_checkpoints` WRITE;
+/*!40000 ALTER TABLE `ingest_checkpoints` DISABLE KEYS */;
+/*!40000 ALTER TABLE `ingest_checkpoints` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `od_flow_duration_bins`
+--
+
+DROP TABLE IF EXISTS `od_flow_duration_bins`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `od_flow_duration_bins` (
+  `pickup_cell_x` int NOT NULL,
+  `pickup_cell_y` int NOT NULL,
+  `dropoff_cell_x` int NOT NULL,
+  `dropoff_cell_y` int NOT NULL,
+  `hour_start` tinyint NOT NULL,
+  `duration_bin` smallint NOT NULL COMMENT 'Durations in (1.0202^(bin-1), 1.0202^bin] seconds',
+  `trip_count` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`pickup_cell_x`,`pickup_cell_y`,`dropoff_cell_x`,`dropoff_cell_y`,`hour_start`,`duration_bin`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Duration histogram of each od_flows row, from which its percentiles are computed';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `od_flow_duration_bins`
+--
+
+LOCK TABLES `od_flow_duration_bins` WRITE;
+/*!40000 ALTER TABLE `od_flow_duration_bins` DISABLE KEYS */;
+/*!40000 ALTER TABLE `od_flow_duration_bins` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `od_flows`
+--
+
+DROP TABLE IF EXISTS `od_flows`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `od_flows` (
+  `pickup_cell_x` int NOT NULL,
+  `pickup_cell_y` int NOT NULL,
+  `dropoff_cell_x` int NOT NULL,
+  `dropoff_cell_y` int NOT NULL,
+  `hour_start` tinyint NOT NULL COMMENT 'First pickup hour of the bucket',
+  `hour_end` tinyint NOT NULL COMMENT 'Pickup hour the bucket ends before',
+  `trip_count` int NOT NULL DEFAULT '0',
+  `total_trip_duration` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT 'Sum of trip durations in seconds',
+  `total_trip_distance` decimal(16,3) NOT NULL DEFAULT '0.000' COMMENT 'Sum of trip distances in km',
+  `total_trip_speed` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT 'Sum of trip speeds in km/h',
+  `duration_p50` decimal(10,2) DEFAULT NULL COMMENT 'Median duration in seconds, from od_flow_duration_bins (within 1%)',
+  `duration_p90` decimal(10,2) DEFAULT NULL COMMENT 'P90 duration in seconds, from od_flow_duration_bins (within 1%)',
+  `avg_trip_duration` decimal(10,2) DEFAULT NULL,
+  `avg_trip_distance` decimal(10,3) DEFAULT NULL,
+  `avg_speed_kmh` decimal(6,2) DEFAULT NULL,
+  PRIMARY KEY (`pickup_cell_x`,`pickup_cell_y`,`dropoff_cell_x`,`dropoff_cell_y`,`hour_start`),
+  KEY `idx_dropoff_cell` (`dropoff_cell_x`,`dropoff_cell_y`),
+  KEY `idx_hour_count` (`hour_start`,`trip_count`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Origin-destination aggregates per pickup cell, dropoff cell and hour bucket';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `od_flows`
+--
+
+LOCK TABLES `od_flows` WRITE;
+/*!40000 ALTER TABLE `od_flows` DISABLE KEYS */;
+/*!40000 ALTER TABLE `od_flows` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `quantile_sketches`
+--
+
+DROP TABLE IF EXISTS `quantile_sketches`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `quantile_sketches` (
+  `metric` varchar(64) NOT NULL,
+  `sketch_k` int NOT NULL,
+  `value_count` bigint NOT NULL DEFAULT '0',
+  `sketch` mediumtext NOT NULL COMMENT 'KLLSketch.to_dict() as JSON',
+  `updated_at` datetime NOT NULL,
+  PRIMARY KEY (`metric`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Mergeable quantile sketches of trip metrics';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `quantile_sketches`
+--
+
+LOCK TABLES `quantile_sketches` WRITE;
+/*!40000 ALTER TABLE `quantile_sketches` DISABLE KEYS */;
+/*!40000 ALTER TABLE `quantile_sketches` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `regions`
+--
+
+DROP TABLE IF EXISTS `regions`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `regions` (
+  `region_type` enum('borough','zone') NOT NULL,
+  `region_id` smallint NOT NULL,
+  `name` varchar(100) NOT NULL,
+  PRIMARY KEY (`region_type`,`region_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Names of the borough and taxi zone ids stored in trips';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `regions`
+--
+
+LOCK TABLES `regions` WRITE;
+/*!40000 ALTER TABLE `regions` DISABLE KEYS */;
+INSERT INTO `regions` VALUES ('borough',1,'Manhattan'),('borough',2,'Bronx'),('borough',3,'Brooklyn'),('borough',4,'Queens'),('borough',5,'Staten Island');
+/*!40000 ALTER TABLE `regions` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `spatial_grid_cell_hours`
+--
+
+DROP TABLE IF EXISTS `spatial_grid_cell_hours`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `spatial_grid_cell_hours` (
+  `cell_x` int NOT NULL,
+  `cell_y` int NOT NULL,
+  `hour_of_day` tinyint NOT NULL,
+  `trip_count` int NOT NULL DEFAULT '0',
+  PRIMARY KEY (`cell_x`,`cell_y`,`hour_of_day`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Pickups per spatial grid cell and hour, used to maintain peak_hour';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `spatial_grid_cell_hours`
+--
+
+LOCK TABLES `spatial_grid_cell_hours` WRITE;
+/*!40000 ALTER TABLE `spatial_grid_cell_hours` DISABLE KEYS */;
+/*!40000 ALTER TABLE `spatial_grid_cell_hours` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `spatial_grid_cells`
 --
@@ -57,7 +254,11 @@ CREATE TABLE `spatial_grid_cells` (
   `lat_max` decimal(10,8) NOT NULL,
   `lon_min` decimal(11,8) NOT NULL,
   `lon_max` decimal(11,8) NOT NULL,
+  `trip_count` int DEFAULT '0',
   `total_passengers` int DEFAULT '0',
+  `total_trip_duration` decimal(16,2) DEFAULT '0.00' COMMENT 'Sum of trip durations in minutes',
+  `total_trip_distance` decimal(16,3) DEFAULT '0.000' COMMENT 'Sum of trip distances in km',
+  `weekend_trips` int DEFAULT '0',
   `avg_trip_duration` decimal(10,2) DEFAULT NULL,
   `avg_trip_distance` decimal(8,3) DEFAULT NULL,
   `peak_hour` tinyint DEFAULT NULL COMMENT 'Hour with most activity',
@@ -77,6 +278,75 @@ LOCK TABLES `spatial_grid_cells` WRITE;
 /*!40000 ALTER TABLE `spatial_grid_cells` ENABLE KEYS */;
 UNLOCK TABLES;
 
+--
+-- Table structure for table `spatial_tiles`
+--
+
+DROP TABLE IF EXISTS `spatial_tiles`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `spatial_tiles` (
+  `zoom` tinyint NOT NULL COMMENT 'The NYC bounding box is split into 2^zoom x 2^zoom tiles',
+  `tile_x` int NOT NULL,
+  `tile_y` int NOT NULL,
+  `lat_min` decimal(10,8) NOT NULL,
+  `lat_max` decimal(10,8) NOT NULL,
+  `lon_min` decimal(11,8) NOT NULL,
+  `lon_max` decimal(11,8) NOT NULL,
+  `trip_count` int NOT NULL DEFAULT '0',
+  `total_passengers` int NOT NULL DEFAULT '0',
+  `total_trip_duration` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT 'Sum of trip durations in seconds',
+  `total_trip_distance` decimal(16,3) NOT NULL DEFAULT '0.000' COMMENT 'Sum of trip distances in km',
+  PRIMARY KEY (`zoom`,`tile_x`,`tile_y`),
+  KEY `idx_zoom_count` (`zoom`,`trip_count`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Pickup tile pyramid, one row per non-empty tile and zoom level';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `spatial_tiles`
+--
+
+LOCK TABLES `spatial_tiles` WRITE;
+/*!40000 ALTER TABLE `spatial_tiles` DISABLE KEYS */;
+/*!40000 ALTER TABLE `spatial_tiles` ENABLE KEYS */;
+UNLOCK TABLES;
+
+--
+-- Table structure for table `trip_rollup`
+--
+
+DROP TABLE IF EXISTS `trip_rollup`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `trip_rollup` (
+  `trip_date` date NOT NULL COMMENT 'Pickup date',
+  `hour_of_day` tinyint NOT NULL,
+  `day_of_week` tinyint NOT NULL,
+  `distance_category` enum('short','medium','long','very_long') NOT NULL,
+  `vendor_id` int NOT NULL,
+  `trip_count` int NOT NULL DEFAULT '0',
+  `duration_sum` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT 'Sum of trip durations in seconds',
+  `duration_sq_sum` double NOT NULL DEFAULT '0' COMMENT 'Sum of squared trip durations',
+  `distance_sum` decimal(16,3) NOT NULL DEFAULT '0.000' COMMENT 'Sum of trip distances in km',
+  `distance_sq_sum` double NOT NULL DEFAULT '0' COMMENT 'Sum of squared trip distances',
+  `speed_sum` decimal(16,2) NOT NULL DEFAULT '0.00' COMMENT 'Sum of trip speeds in km/h',
+  `speed_sq_sum` double NOT NULL DEFAULT '0' COMMENT 'Sum of squared trip speeds',
+  `passenger_sum` int NOT NULL DEFAULT '0',
+  `efficiency_sum` double NOT NULL DEFAULT '0' COMMENT 'Sum of efficiency ratios where defined',
+  `efficiency_count` int NOT NULL DEFAULT '0' COMMENT 'Trips with an efficiency ratio',
+  PRIMARY KEY (`trip_date`,`hour_of_day`,`day_of_week`,`distance_category`,`vendor_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Trip counts, sums and sums of squares per pickup date, hour, distance category and vendor';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Dumping data for table `trip_rollup`
+--
+
+LOCK TABLES `trip_rollup` WRITE;
+/*!40000 ALTER TABLE `trip_rollup` DISABLE KEYS */;
+/*!40000 ALTER TABLE `trip_rollup` ENABLE KEYS */;
+UNLOCK TABLES;
+
 --
 -- Table structure for table `trips`
 --
@@ -107,6 +377,10 @@ CREATE TABLE `trips` (
   `actual_duration_min` decimal(8,2) DEFAULT NULL COMMENT 'Actual duration in minutes',
   `efficiency_ratio` decimal(6,4) DEFAULT NULL COMMENT 'Expected vs actual ratio',
   `store_and_fwd_flag` char(1) DEFAULT 'N',
+  `pickup_borough_id` tinyint unsigned NOT NULL DEFAULT '0' COMMENT 'regions.region_id of type borough, 0 if none',
+  `dropoff_borough_id` tinyint unsigned NOT NULL DEFAULT '0' COMMENT 'regions.region_id of type borough, 0 if none',
+  `pickup_zone_id` smallint NOT NULL DEFAULT '0' COMMENT 'regions.region_id of type zone, 0 if none',
+  `dropoff_zone_id` smallint NOT NULL DEFAULT '0' COMMENT 'regions.region_id of type zone, 0 if none',
   PRIMARY KEY (`id`),
   KEY `idx_pickup_datetime` (`pickup_datetime`),
   KEY `idx_hour_of_day` (`hour_of_day`),
@@ -114,7 +388,11 @@ CREATE TABLE `trips` (
   KEY `idx_distance_category` (`distance_category`),
   KEY `idx_vendor_datetime` (`vendor_id`,`pickup_datetime`),
   KEY `idx_pickup_coords` (`pickup_latitude`,`pickup_longitude`),
-  KEY `idx_dropoff_coords` (`dropoff_latitude`,`dropoff_longitude`)
+  KEY `idx_dropoff_coords` (`dropoff_latitude`,`dropoff_longitude`),
+  KEY `idx_pickup_borough_datetime` (`pickup_borough_id`,`pickup_datetime`),
+  KEY `idx_dropoff_borough` (`dropoff_borough_id`),
+  KEY `idx_pickup_zone` (`pickup_zone_id`),
+  KEY `idx_dropoff_zone` (`dropoff_zone_id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='Cleaned NYC taxi trip data with derived features';
 /*!40101 SET character_set_client = @saved_cs_client */;
 
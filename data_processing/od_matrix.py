@@ -0,0 +1,176 @@
+import logging
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class ODMatrix:
+    """
+    Sparse origin-destination aggregates between pickup and dropoff grid cells.
+    One row per (pickup cell, dropoff cell, hour bucket) that has trips, holding the
+    trip count, duration/distance/speed sums and the median and P90 duration. Cells
+    use the same grid as SpatialGridIndex, and hour buckets split the day into
+    hour_bucket-hour ranges starting at hour_start.
+
+    Percentiles come from a per-flow histogram of durations over logarithmic bins, whose
+    counts add up when chunks or workers are merged, so they do not depend on how the
+    trips were split. Each percentile is within DURATION_ACCURACY (relative) of the
+    duration of the trip at its rank.
+    """
+
+    KEY = ['pickup_cell_x', 'pickup_cell_y', 'dropoff_cell_x', 'dropoff_cell_y', 'hour_start']
+    SUM_COLUMNS = ['trip_count', 'duration_sum', 'distance_sum', 'speed_sum']
+    PERCENTILES = {'duration_p50': 0.5, 'duration_p90': 0.9}
+
+    # Duration bin b covers (GAMMA^(b-1), GAMMA^b] seconds
+    DURATION_ACCURACY = 0.01
+    GAMMA = (1 + DURATION_ACCURACY) / (1 - DURATION_ACCURACY)
+
+    def __init__(self, grid_size: float = 0.01, hour_bucket: int = 3):
+        if 24 % hour_bucket:
+            raise ValueError("hour_bucket must divide 24")
+        self.grid_size = grid_size
+        self.hour_bucket = hour_bucket
+        self.flows = None
+        self.duration_bins = None
+
+    def cell_keys(self, lats, lons) -> Tuple[np.ndarray, np.ndarray]:
+        """Grid cell (x from longitude, y from latitude) of points; same cells as SpatialGridIndex"""
+        cell_x = np.floor(np.asarray(lons, dtype=np.float64) / self.grid_size).astype(np.int64)
+        cell_y = np.floor(np.asarray(lats, dtype=np.float64) / self.grid_size).astype(np.int64)
+        return cell_x, cell_y
+
+    @classmethod
+    def duration_bin(cls, durations) -> np.ndarray:
+        """Histogram bin of durations in seconds (durations under a second share bin 0)"""
+        durations = np.maximum(np.asarray(durations, dtype=np.float64), 1.0)
+        return np.ceil(np.log(durations) / np.log(cls.GAMMA)).astype(np.int64)
+
+    @classmethod
+    def bin_value(cls, bins) -> np.ndarray:
+        """Duration representing a bin: within DURATION_ACCURACY of every duration in it"""
+        return 2 * cls.GAMMA ** np.asarray(bins, dtype=np.float64) / (cls.GAMMA + 1)
+
+    @classmethod
+    def bin_percentiles(cls, duration_bins: pd.Series, levels: List[str]) -> pd.DataFrame:
+        """PERCENTILES of each group of histogram counts indexed by levels + duration_bin.
+
+        The value of percentile q is the bin holding the trip of rank q * (n - 1), counting
+        from 0 in ascending duration, i.e. the lower of the two trips np.percentile would
+        interpolate between.
+        """
+        counts = duration_bins.groupby(level=levels + ['duration_bin'], sort=True).sum()
+        grouped = counts.groupby(level=levels, sort=True)
+        cumulative = grouped.cumsum()
+        total = grouped.transform('sum')
+        bins = counts.index.get_level_values('duration_bin')
+
+        percentiles = {}
+        for column, fraction in cls.PERCENTILES.items():
+            reached = (cumulative > fraction * (total - 1)).to_numpy()
+            first = pd.Series(bins[reached], index=counts.index[reached]).groupby(level=levels, sort=True).min()
+            percentiles[column] = pd.Series(cls.bin_value(first.to_numpy()), index=first.index)
+        return pd.DataFrame(percentiles)
+
+    def _cells(self, df: pd.DataFrame, side: str) -> Tuple[np.ndarray, np.ndarray]:
+        if f'{side}_cell_x' in df.columns:
+            return df[f'{side}_cell_x'].to_numpy(dtype=np.int64), df[f'{side}_cell_y'].to_numpy(dtype=np.int64)
+        return self.cell_keys(df[f'{side}_latitude'].to_numpy(), df[f'{side}_longitude'].to_numpy())
+
+    def flow_statistics(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+        """Per-flow counts and sums of a derived trips frame (indexed by KEY), and the trip
+        counts of its duration histogram (indexed by KEY + duration_bin), each from one groupby"""
+        pickup_x, pickup_y = self._cells(df, 'pickup')
+        dropoff_x, dropoff_y = self._cells(df, 'dropoff')
+        durations = df['trip_duration'].to_numpy(dtype=np.float64)
+
+        trips = pd.DataFrame({
+            'pickup_cell_x': pickup_x,
+            'pickup_cell_y': pickup_y,
+            'dropoff_cell_x': dropoff_x,
+            'dropoff_cell_y': dropoff_y,
+            'hour_start': (df['hour_of_day'].to_numpy(dtype=np.int64) // self.hour_bucket) * self.hour_bucket,
+            'duration_bin': self.duration_bin(durations),
+            'trip_count': 1,
+            'duration_sum': durations,
+            'distance_sum': df['trip_distance_km'].to_numpy(dtype=np.float64),
+            'speed_sum': df['trip_speed_kmh'].to_numpy(dtype=np.float64)
+        })
+        stats = trips.groupby(self.KEY, sort=True)[self.SUM_COLUMNS].sum()
+        duration_bins = trips.groupby(self.KEY + ['duration_bin'], sort=True)['trip_count'].sum()
+        return stats, duration_bins
+
+    @classmethod
+    def combine(cls, frames: List, levels: List[str] = None):
+        """Add flow statistics frames (or histogram counts indexed by levels) row by row"""
+        frames = [frame for frame in frames if frame is not None and len(frame)]
+        if len(frames) == 1:
+            return frames[0]
+        if not frames:
+            return None
+        return pd.concat(frames).groupby(level=levels or cls.KEY, sort=True).sum()
+
+    def add(self, df: pd.DataFrame):
+        """Add the trips of a derived frame"""
+        if len(df):
+            stats, duration_bins = self.flow_statistics(df)
+            self.flows = self.combine([self.flows, stats])
+            self.duration_bins = self.combine([self.duration_bins, duration_bins], self.KEY + ['duration_bin'])
+        return self
+
+    def merge(self, other: 'ODMatrix'):
+        """Fold another matrix built on the same grid and hour buckets, e.g. from another worker"""
+        if other.grid_size != self.grid_size or other.hour_bucket != self.hour_bucket:
+            raise ValueError("Cannot merge OD matrices with different grid sizes or hour buckets")
+        self.flows = self.combine([self.flows, other.flows])
+        self.duration_bins = self.combine([self.duration_bins, other.duration_bins], self.KEY + ['duration_bin'])
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per flow with its hour range, sums and percentiles, for storage in od_flows"""
+        if self.flows is None:
+            return pd.DataFrame(columns=self.KEY + ['hour_end'] + self.SUM_COLUMNS + list(self.PERCENTILES))
+
+        frame = self.flows.join(self.bin_percentiles(self.duration_bins, self.KEY)).reset_index()
+        frame.insert(len(self.KEY), 'hour_end', frame['hour_start'] + self.hour_bucket)
+        return frame
+
+    def duration_bins_frame(self) -> pd.DataFrame:
+        """One row per non-empty histogram bin of each flow, for storage in od_flow_duration_bins"""
+        if self.duration_bins is None:
+            return pd.DataFrame(columns=self.KEY + ['duration_bin', 'trip_count'])
+        return self.duration_bins.reset_index()
+
+    def top_flows(self, top: int = 10, hour: int = None) -> pd.DataFrame:
+        """The busiest flows, either within the hour bucket of hour or summed over the whole day"""
+        if self.flows is None:
+            return self.to_frame()
+        if hour is None:
+            levels = self.KEY[:4]
+            flows = self.flows.groupby(level=levels).sum()
+        else:
+            levels = self.KEY
+            flows = self.flows.xs((hour // self.hour_bucket) * self.hour_bucket, level='hour_start',
+                                  drop_level=False)
+        flows = flows.nlargest(top, 'trip_count')
+        return flows.join(self.bin_percentiles(self.duration_bins, levels)).reset_index()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        flows = self.flows if self.flows is not None else pd.DataFrame(columns=self.SUM_COLUMNS)
+        return {
+            'hour_bucket': self.hour_bucket,
+            'total_flows': len(flows),
+            'total_trips': int(flows['trip_count'].sum()),
+            'cell_pairs': len(flows.index.droplevel('hour_start').unique()) if len(flows) else 0
+        }
@@ -0,0 +1,238 @@
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+import pandas as pd
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+from data_processing.quick_select import QuickSelect
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def partition_csv(filepath: str, partitions: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """Split a CSV file into byte ranges that start and end on line boundaries.
+
+    Returns the header line and the (start, end) offsets of each data partition.
+    """
+    size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+
+        bounds = [data_start]
+        for i in range(1, partitions):
+            target = data_start + (size - data_start) * i // partitions
+            if target <= bounds[-1]:
+                continue
+            f.seek(target - 1)
+            f.readline()
+            position = f.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+        bounds.append(size)
+
+    return header, [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def read_partition(filepath: str, header: bytes, start: int, end: int, engine: str = 'c') -> pd.DataFrame:
+    """Rows of a byte-range partition, read with the explicit schema (NYCTaxiDataProcessor.read_csv)"""
+    with open(filepath, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return NYCTaxiDataProcessor.read_csv(io.BytesIO(header + data), engine)
+
+
+def _scan_partition(task: Dict[str, Any]) -> Tuple[int, pd.Series]:
+    """Pass 1: row count, duration histogram and spilled duplicate keys of a partition"""
+    processor = NYCTaxiDataProcessor()
+    df = read_partition(task['filepath'], task['header'], task['start'], task['end'], task['engine'])
+    rows = len(df)
+
+    df = processor._drop_invalid_records(df, log=False)
+    processor._spill_duplicate_keys(processor._duplicate_keys(df), task['workdir'], tag=str(task['partition']))
+    return rows, df['trip_duration'].value_counts()
+
+
+def _clean_partition(task: Dict[str, Any]) -> Tuple[str, np.ndarray, np.ndarray, list]:
+    """Pass 2: clean a partition with the global thresholds and spill it to disk.
+
+    Returns the spill path, the index and key of every row whose key is a duplicate
+    candidate, and the exclusions logged while cleaning.
+    """
+    processor = NYCTaxiDataProcessor()
+    df = read_partition(task['filepath'], task['header'], task['start'], task['end'], task['engine'])
+    df.index = pd.RangeIndex(task['offset'], task['offset'] + len(df))
+
+    df = processor._drop_invalid_records(df)
+    df = processor._filter_records(df, task['p01'], task['p99'])
+
+    keys = processor._duplicate_keys(df)
+    candidate_mask = np.isin(keys, task['candidates'])
+
+    path = os.path.join(task['workdir'], f"partition_{task['partition']}.pkl")
+    df.to_pickle(path)
+    return path, df.index.to_numpy()[candidate_mask], keys[candidate_mask], processor.exclusions
+
+
+def _load_partition(task: Dict[str, Any]) -> Tuple[int, pd.DataFrame, Any, Any, Any, Any, Any, list, Dict[str, Any]]:
+    """Pass 3: drop duplicates, derive features and write the trips of a partition"""
+    processor = NYCTaxiDataProcessor(task['zones_file'])
+    df = pd.read_pickle(task['path'])
+    os.remove(task['path'])
+
+    df = processor._derive_frame(df[~df.index.isin(task['duplicates'])])
+    processor._accumulate_grid_stats(df)
+    processor.tile_pyramid.add(df)
+    processor.od_matrix.add(df)
+    processor.trip_rollup.add(df)
+    processor._update_sketches(df)
+    processor.spatial_index.bulk_insert(df['pickup_latitude'].to_numpy(),
+                                        df['pickup_longitude'].to_numpy())
+    processor._index_dropoffs(df)
+
+    if task['db_params'] is not None and len(df):
+        db = TaxiTripDatabase(**task['db_params'])
+        db.connect()
+        try:
+            if task['bulk_load']:
+                db.insert_trips_bulk(df, check_existing=False, manage_indexes=False)
+            else:
+                db.insert_trips_batch(df, check_existing=False)
+        finally:
+            db.close()
+
+    return (len(df), processor.grid_stats, processor.spatial_index, processor.dropoff_index,
+            processor.tile_pyramid, processor.od_matrix, processor.trip_rollup, processor.exclusions,
+            processor.sketches)
+
+
+class ParallelIngest:
+    """
+    Multi-process version of NYCTaxiDataProcessor.process_streaming.
+    The CSV is split into byte-range partitions that are cleaned in a process pool;
+    only the duration percentiles and the duplicate check are resolved globally.
+    Each worker writes its own trips over a separate database connection.
+    """
+
+    def __init__(self, processor: NYCTaxiDataProcessor, db: TaxiTripDatabase, workers: int,
+                 partition_bytes: int = 64 * 1024 * 1024, bulk_load: bool = False, csv_engine: str = 'c'):
+        self.processor = processor
+        self.db = db
+        self.workers = workers
+        self.partition_bytes = partition_bytes
+        self.bulk_load = bulk_load
+        self.csv_engine = csv_engine
+
+    def run(self, filepath: str, excluded_filepath: str = 'excluded_records.json') -> int:
+        processor = self.processor
+        partitions = max(self.workers, -(-os.path.getsize(filepath) // self.partition_bytes))
+        header, ranges = partition_csv(filepath, partitions)
+        logger.info(f"Split {filepath} into {len(ranges)} partitions for {self.workers} workers")
+
+        with tempfile.TemporaryDirectory(prefix='nyc_taxi_ingest_') as workdir, \
+                ProcessPoolExecutor(max_workers=self.workers) as pool:
+            tasks = [{'filepath': filepath, 'header': header, 'start': start, 'end': end,
+                      'partition': i, 'workdir': workdir, 'engine': self.csv_engine}
+                     for i, (start, end) in enumerate(ranges)]
+
+            # Pass 1: global duration percentiles and duplicate candidates
+            row_counts = []
+            duration_counts = pd.Series(dtype='int64')
+            for rows, counts in pool.map(_scan_partition, tasks):
+                row_counts.append(rows)
+                duration_counts = duration_counts.add(counts, fill_value=0)
+
+            values = duration_counts.index.to_numpy()
+            counts = duration_counts.to_numpy()
+            p01, p99 = QuickSelect.find_percentiles_from_counts(values, counts, processor.DURATION_PERCENTILES)
+            candidates = processor._collect_duplicate_candidates(workdir)
+            offsets = np.concatenate(([0], np.cumsum(row_counts)[:-1]))
+            processor.processing_stats['total_records'] += int(sum(row_counts))
+            logger.info(f"Duration outlier thresholds: P1={p01:.2f}s, P99={p99:.2f}s")
+            logger.info(f"Found {len(candidates)} candidate duplicate keys")
+
+            # Pass 2: clean partitions, then keep the first occurrence of each duplicate key
+            for task, offset in zip(tasks, offsets):
+                task.update(offset=int(offset), p01=p01, p99=p99, candidates=candidates)
+
+            spill_paths, candidate_index, candidate_keys = [], [], []
+            for path, index, keys, exclusions in pool.map(_clean_partition, tasks):
+                spill_paths.append(path)
+                candidate_index.append(index)
+                candidate_keys.append(keys)
+                processor._merge_exclusions(exclusions)
+
+            candidate_index = np.concatenate(candidate_index)
+            _, first = np.unique(np.concatenate(candidate_keys), return_index=True)
+            is_duplicate = np.ones(len(candidate_index), dtype=bool)
+            is_duplicate[first] = False
+            duplicate_index = candidate_index[is_duplicate]
+            processor._log_exclusions(duplicate_index, "duplicate_record")
+
+            # Pass 3: derive features and write trips from every worker
+            self.db.create_schema(self.db.schema_file)
+            self.db.save_regions(processor.region_names())
+            stats = self.db.get_stats()
+            load_trips = not stats.get('total_trips')
+            if not load_trips:
+                logger.warning("Trips table is not empty. Skipping trip insertion to avoid duplicates.")
+            dropped_indexes = self.db.disable_trip_indexes() if self.bulk_load and load_trips else []
+
+            load_tasks = []
+            for path, offset, rows in zip(spill_paths, offsets, row_counts):
+                in_partition = (duplicate_index >= offset) & (duplicate_index < offset + rows)
+                load_tasks.append({'path': path, 'duplicates': duplicate_index[in_partition],
+                                   'db_params': self.db.connection_params() if load_trips else None,
+                                   'bulk_load': self.bulk_load, 'zones_file': processor.zones_file})
+
+            total_clean = 0
+            try:
+                for (clean_count, grid_stats, spatial_index, dropoff_index, tile_pyramid, od_matrix,
+                     trip_rollup, exclusions, sketches) in pool.map(_load_partition, load_tasks):
+                    total_clean += clean_count
+                    processor._merge_exclusions(exclusions)
+                    processor._merge_sketches(sketches)
+                    processor.spatial_index.merge(spatial_index)
+                    processor.dropoff_index.merge(dropoff_index)
+                    processor.tile_pyramid.merge(tile_pyramid)
+                    processor.od_matrix.merge(od_matrix)
+                    processor.trip_rollup.merge(trip_rollup)
+                    if grid_stats is not None:
+                        processor.grid_stats = (grid_stats if processor.grid_stats is None
+                                                else processor.grid_stats.add(grid_stats, fill_value=0))
+            finally:
+                self.db.rebuild_trip_indexes(dropped_indexes)
+
+        logger.info(f"Spatial index statistics: {processor.spatial_index.get_statistics()}")
+
+        if not stats.get('total_grid_cells') and processor.grid_stats is not None:
+            self.db.insert_spatial_grid_stats(processor.grid_stats, processor.spatial_index, check_existing=False)
+        if not stats.get('total_excluded'):
+            self.db.insert_excluded_records(processor.exclusions, check_existing=False)
+        self.db.insert_spatial_tiles(processor.tile_pyramid)
+        self.db.insert_od_flows(processor.od_matrix)
+        self.db.insert_trip_rollup(processor.trip_rollup)
+        self.db.save_quantile_sketches(processor.sketches)
+        self.db.bump_data_version()
+        processor.save_excluded_records(excluded_filepath)
+
+        logger.info(f"Parallel ingest complete: {processor.processing_stats['total_records']} -> "
+                    f"{total_clean} records")
+        logger.info(f"Exclusion breakdown: {processor.processing_stats['exclusion_reasons']}")
+        return total_clean
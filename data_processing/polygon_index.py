@@ -0,0 +1,169 @@
+import json
+import logging
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class PolygonIndex:
+    """
+    Point-in-polygon labelling of coordinates against a set of non-overlapping regions
+    (boroughs, taxi zones). A uniform grid over the polygons' extent records, per cell,
+    either the one region that covers the cell entirely or the regions whose edges cross
+    it. Points in covered cells are labelled by a table lookup; only points in boundary
+    cells are ray-cast, and then only against that cell's candidate regions.
+    Label 0 means the point is in no region.
+    """
+
+    def __init__(self, regions: List[Tuple[int, str, List[np.ndarray]]], cell_size: float = 0.01):
+        """regions: (region_id, name, rings) with rings as (n, 2) arrays of (lon, lat) vertices"""
+        self.cell_size = cell_size
+        self.ids = np.array([region_id for region_id, _, _ in regions], dtype=np.int64)
+        self.names = {int(region_id): name for region_id, name, _ in regions}
+
+        # One flat edge table: start and end vertex of every ring edge, and its region position
+        starts, ends, owners = [], [], []
+        for position, (_, _, rings) in enumerate(regions):
+            for ring in rings:
+                ring = np.asarray(ring, dtype=np.float64)
+                if len(ring) and not np.array_equal(ring[0], ring[-1]):
+                    ring = np.vstack((ring, ring[:1]))
+                starts.append(ring[:-1])
+                ends.append(ring[1:])
+                owners.append(np.full(len(ring) - 1, position, dtype=np.int64))
+        self.edge_start = np.concatenate(starts) if starts else np.empty((0, 2))
+        self.edge_end = np.concatenate(ends) if ends else np.empty((0, 2))
+        self.edge_owner = np.concatenate(owners) if owners else np.empty(0, dtype=np.int64)
+        self._build_grid()
+
+    @classmethod
+    def from_geojson(cls, path: str, id_property: str, name_property: str,
+                     cell_size: float = 0.01) -> 'PolygonIndex':
+        """Load Polygon/MultiPolygon features, e.g. NYC borough boundaries or TLC taxi zones"""
+        with open(path) as f:
+            features = json.load(f)['features']
+
+        regions = []
+        for feature in features:
+            geometry = feature['geometry']
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            rings = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+            regions.append((int(feature['properties'][id_property]), str(feature['properties'][name_property]),
+                            rings))
+
+        logger.info(f"Loaded {len(regions)} regions from {path}")
+        return cls(regions, cell_size)
+
+    def _cell_coordinates(self, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+        return (np.floor((lons - self.origin[0]) / self.cell_size).astype(np.int64),
+                np.floor((lats - self.origin[1]) / self.cell_size).astype(np.int64))
+
+    def _build_grid(self):
+        vertices = np.vstack((self.edge_start, self.edge_end)) if len(self.edge_start) else np.zeros((1, 2))
+        self.origin = vertices.min(axis=0)
+        self.shape = tuple(np.floor((vertices.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1)
+        cell_count = self.shape[0] * self.shape[1]
+
+        # Cells touched by each edge's bounding box (conservative); the grid is small, so this loops per edge
+        boundary = np.zeros((cell_count, len(self.ids)), dtype=bool)
+        x0, y0 = self._cell_coordinates(np.minimum(self.edge_start[:, 0], self.edge_end[:, 0]),
+                                        np.minimum(self.edge_start[:, 1], self.edge_end[:, 1]))
+        x1, y1 = self._cell_coordinates(np.maximum(self.edge_start[:, 0], self.edge_end[:, 0]),
+                                        np.maximum(self.edge_start[:, 1], self.edge_end[:, 1]))
+        for i in range(len(self.edge_owner)):
+            xs, ys = np.meshgrid(np.arange(x0[i], x1[i] + 1), np.arange(y0[i], y1[i] + 1))
+            boundary[(xs * self.shape[1] + ys).ravel(), self.edge_owner[i]] = True
+
+        # Edges of every row of cells (latitude band), in CSR form: a horizontal ray from a
+        # point can only cross edges that span its latitude, so ray casting reads one band
+        band_lengths = y1 - y0 + 1
+        band_edges = np.repeat(np.arange(len(self.edge_owner)), band_lengths)
+        bands = np.repeat(y0, band_lengths) + (np.arange(len(band_edges)) -
+                                               np.repeat(np.cumsum(band_lengths) - band_lengths, band_lengths))
+        order = np.argsort(bands, kind='stable')
+        self.band_edges = band_edges[order]
+        self.band_offsets = np.searchsorted(bands[order], np.arange(self.shape[1] + 1))
+
+        # A cell none of a region's edges touches lies wholly inside or outside it: test its centre.
+        # Regions do not overlap, so a cell inside one region needs no point-in-polygon test at all.
+        self.cell_region = np.full(cell_count, -1, dtype=np.int64)
+        cells = np.arange(cell_count)
+        centre_lon = self.origin[0] + (cells // self.shape[1] + 0.5) * self.cell_size
+        centre_lat = self.origin[1] + (cells % self.shape[1] + 0.5) * self.cell_size
+        for position in range(len(self.ids)):
+            inside = ~boundary[:, position] & self._contains(position, centre_lon, centre_lat)
+            self.cell_region[inside] = position
+        boundary[self.cell_region >= 0] = False
+        self.boundary = boundary
+
+        logger.info(f"Built polygon grid of {self.shape[0]}x{self.shape[1]} cells: "
+                    f"{int((self.cell_region >= 0).sum())} interior, {int(boundary.any(axis=1).sum())} boundary")
+
+    def _contains(self, position: int, lons: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """Even-odd ray casting of points (inside the grid) against the rings of one region.
+
+        Points are grouped by latitude band and tested against all of that band's edges
+        of the region at once.
+        """
+        inside = np.zeros(len(lons), dtype=bool)
+        point_bands = np.clip(self._cell_coordinates(lons, lats)[1], 0, self.shape[1] - 1)
+        order = np.argsort(point_bands, kind='stable')
+        bands, starts = np.unique(point_bands[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        for band, start, end in zip(bands, starts, ends):
+            edges = self.band_edges[self.band_offsets[band]:self.band_offsets[band + 1]]
+            edges = edges[self.edge_owner[edges] == position]
+            if not len(edges):
+                continue
+            points = order[start:end]
+            ax, ay = self.edge_start[edges, 0], self.edge_start[edges, 1]
+            bx, by = self.edge_end[edges, 0], self.edge_end[edges, 1]
+            lat, lon = lats[points, None], lons[points, None]
+            crosses = (ay > lat) != (by > lat)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = ax + (lat - ay) * (bx - ax) / (by - ay)
+            inside[points] = np.count_nonzero(crosses & (lon < x_cross), axis=1) % 2 == 1
+        return inside
+
+    def assign(self, lats, lons) -> np.ndarray:
+        """Region id of every point (0 where no region contains it)"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        labels = np.zeros(len(lats), dtype=np.int64)
+
+        cell_x, cell_y = self._cell_coordinates(lons, lats)
+        in_grid = (cell_x >= 0) & (cell_x < self.shape[0]) & (cell_y >= 0) & (cell_y < self.shape[1])
+        points = np.flatnonzero(in_grid)
+        cells = cell_x[points] * self.shape[1] + cell_y[points]
+
+        positions = self.cell_region[cells]
+        covered = positions >= 0
+        labels[points[covered]] = self.ids[positions[covered]]
+
+        # Boundary cells: ray-cast each candidate region over just the points whose cell lists it
+        points, cells = points[~covered], cells[~covered]
+        for position in np.flatnonzero(self.boundary[cells].any(axis=0)):
+            candidates = np.flatnonzero(self.boundary[cells, position] & (labels[points] == 0))
+            inside = self._contains(position, lons[points[candidates]], lats[points[candidates]])
+            labels[points[candidates[inside]]] = self.ids[position]
+        return labels
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'regions': len(self.ids),
+            'edges': len(self.edge_owner),
+            'grid_shape': [int(size) for size in self.shape],
+            'interior_cells': int((self.cell_region >= 0).sum()),
+            'boundary_cells': int(self.boundary.any(axis=1).sum())
+        }
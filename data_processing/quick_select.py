@@ -1,6 +1,8 @@
-from typing import List
+from typing import List, Sequence
 import logging
 
+import numpy as np
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -16,7 +18,8 @@ class QuickSelect:
     """
     QuickSelect algorithm for finding Kth the smallest element.
     Used for calculating percentiles.
-    Time Complexity: O(n) average case, O(n²) worst case
+    Time Complexity: O(n) average case, O(n²) worst case for the pure-Python select;
+    find_percentiles uses NumPy's introselect, which is O(n) worst case.
     """
 
     @staticmethod
@@ -48,15 +51,46 @@ class QuickSelect:
         else:
             return cls.select(arr, pivot_index + 1, high, k)
 
+    @staticmethod
+    def find_percentiles(data, percentiles: Sequence[float]) -> List[float]:
+        """Calculate several percentiles in one selection pass over an array.
+
+        np.partition with all the k-th ranks at once places every requested order
+        statistic in a single introselect pass, so extra cut-offs are nearly free.
+        Uses the same rank as find_percentile: k = min(int(p * n), n - 1).
+        """
+        arr = np.asarray(data)
+        n = len(arr)
+        if n == 0:
+            return [0.0] * len(percentiles)
+
+        ranks = [min(int(percentile * n), n - 1) for percentile in percentiles]
+        selected = np.partition(arr, sorted(set(ranks)))
+
+        return [selected[k].item() for k in ranks]
+
     @classmethod
-    def find_percentile(cls, data: List[float], percentile: float) -> float:
+    def find_percentile(cls, data, percentile: float) -> float:
         """Calculate percentile using QuickSelect"""
-        if not data:
-            return 0.0
+        return cls.find_percentiles(data, [percentile])[0]
 
-        arr = data.copy()
-        n = len(arr)
-        k = int(percentile * n)
-        k = min(k, n - 1)
+    @staticmethod
+    def find_percentiles_from_counts(values: np.ndarray, counts: np.ndarray,
+                                     percentiles: Sequence[float]) -> List[float]:
+        """Calculate percentiles from a value histogram, matching find_percentiles on the expanded data"""
+        if len(values) == 0:
+            return [0.0] * len(percentiles)
+
+        order = np.argsort(values, kind='stable')
+        values = np.asarray(values)[order]
+        cumulative = np.cumsum(np.asarray(counts)[order])
 
-        return cls.select(arr, 0, n - 1, k)
\ No newline at end of file
+        n = int(cumulative[-1])
+        ranks = [min(int(percentile * n), n - 1) for percentile in percentiles]
+
+        return [values[np.searchsorted(cumulative, k, side='right')].item() for k in ranks]
+
+    @classmethod
+    def find_percentile_from_counts(cls, values: np.ndarray, counts: np.ndarray, percentile: float) -> float:
+        """Calculate percentile from a value histogram, matching find_percentile on the expanded data"""
+        return cls.find_percentiles_from_counts(values, counts, [percentile])[0]
@@ -0,0 +1,67 @@
+import threading
+from collections import deque, defaultdict
+from typing import Dict, Any, List
+
+import numpy as np
+
+
+class RequestMetrics:
+    """
+    Thread-safe rolling histograms of API request timings, per route.
+    Every request records the duration of each phase (connection checkout, SQL,
+    processing, encoding, total) in milliseconds, plus the rows it fetched and the bytes
+    it sent. Only the last window samples of each series are kept, so percentiles follow
+    current behaviour. Slow queries reported by the database are kept in a ring buffer.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, window: int = 1024, slow_query_log: int = 100):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self._lock = threading.Lock()
+        self._series = defaultdict(lambda: defaultdict(lambda: deque(maxlen=window)))  # route -> name -> samples
+        self._requests = defaultdict(int)
+        self._slow_queries = deque(maxlen=slow_query_log)
+
+    def record(self, route: str, timings: Dict[str, float], rows: int = None, size: int = None):
+        """Add one request's phase timings (ms), rows fetched and response bytes to its route"""
+        with self._lock:
+            self._requests[route] += 1
+            series = self._series[route]
+            for phase, duration in timings.items():
+                series[f'{phase}_ms'].append(duration)
+            if rows is not None:
+                series['rows'].append(rows)
+            if size is not None:
+                series['bytes'].append(size)
+
+    def record_slow_queries(self, route: str, queries: List[Dict[str, Any]]):
+        with self._lock:
+            for query in queries:
+                self._slow_queries.append({'route': route, **query})
+
+    def _summary(self, samples: deque) -> Dict[str, float]:
+        values = np.fromiter(samples, dtype=np.float64, count=len(samples))
+        p50, p95, p99 = np.percentile(values, self.PERCENTILES)
+        return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3),
+                'max': round(float(values.max()), 3), 'samples': len(values)}
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {route: {name: list(samples) for name, samples in series.items()}
+                        for route, series in self._series.items()}
+            requests = dict(self._requests)
+            slow_queries = list(self._slow_queries)
+
+        routes = {route: {'requests': requests[route],
+                          **{name: self._summary(samples) for name, samples in sorted(series.items()) if samples}}
+                  for route, series in snapshot.items()}
+        return {'window': self.window, 'routes': routes, 'slow_queries': slow_queries}
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._requests.clear()
+            self._slow_queries.clear()
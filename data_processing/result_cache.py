@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """
+    Bounded, thread-safe LRU cache of encoded API responses, tied to a data version.
+    Every entry records the data version it was computed from and is only returned for
+    that version, so an ingest that bumps the version invalidates everything at once.
+
+    The in-process tier is an LRU of max_entries. With shared_dir, entries are also
+    written to files in that directory, where the other worker processes on the host
+    find them; the oldest files beyond shared_max_entries are removed. Entries expire
+    after ttl seconds if one is given.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = None, shared_dir: str = None,
+                 shared_max_entries: int = 4096, version_check_interval: float = 5.0):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_dir = shared_dir
+        self.shared_max_entries = shared_max_entries
+        self.version_check_interval = version_check_interval
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, body, mimetype, stored_at), most recently used last
+        self._version = None
+        self._version_checked = 0.0
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0, 'stale': 0}
+
+    def data_version(self, fetch: Callable[[], Tuple[int, Any]]) -> Tuple[int, Any]:
+        """Current (version, modified) from fetch, asked at most once per version_check_interval"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._version_checked < self.version_check_interval:
+                return self._version
+
+        version = fetch()
+        with self._lock:
+            self._version, self._version_checked = version, now
+        return version
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _shared_path(self, key: str) -> str:
+        return os.path.join(self.shared_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.entry')
+
+    def _read_shared(self, key: str, version: int) -> Optional[Tuple[bytes, str, float]]:
+        """Entry file: one JSON header line (key, version, mimetype, stored_at), then the body"""
+        path = self._shared_path(key)
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if header.get('key') != key or header.get('version') != version or self._expired(header['stored_at']):
+            return None
+        try:
+            os.utime(path)  # file mtimes order the shared tier's LRU
+        except OSError:
+            pass
+        return body, header['mimetype'], header['stored_at']
+
+    def _write_shared(self, key: str, version: int, body: bytes, mimetype: str, stored_at: float):
+        header = json.dumps({'key': key, 'version': version, 'mimetype': mimetype, 'stored_at': stored_at})
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.shared_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header.encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(temp_path, self._shared_path(key))
+
+            entries = [entry for entry in os.scandir(self.shared_dir) if entry.name.endswith('.entry')]
+            if len(entries) > self.shared_max_entries:
+                entries.sort(key=lambda entry: entry.stat().st_mtime)
+                for entry in entries[:len(entries) - self.shared_max_entries]:
+                    os.remove(entry.path)
+        except OSError as e:
+            logger.warning(f"Could not write shared cache entry: {e}")
+
+    def get(self, key: str, version: int) -> Optional[Tuple[bytes, str]]:
+        """(body, mimetype) cached for key at this data version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] != version or self._expired(entry[3])):
+                del self._entries[key]
+                self._stats['stale'] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[1], entry[2]
+
+        shared = self._read_shared(key, version) if self.shared_dir else None
+        with self._lock:
+            if shared is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['shared_hits'] += 1
+            self._store(key, version, *shared)
+        return shared[0], shared[1]
+
+    def _store(self, key: str, version: int, body: bytes, mimetype: str, stored_at: float):
+        self._entries[key] = (version, body, mimetype, stored_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def put(self, key: str, version: int, body: bytes, mimetype: str):
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, version, body, mimetype, stored_at)
+        if self.shared_dir:
+            self._write_shared(key, version, body, mimetype, stored_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                         data_version=self._version[0] if self._version else None)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
@@ -2,6 +2,9 @@ import logging
 import math
 from typing import Tuple, Any, List, Dict
 
+import numpy as np
+import pandas as pd
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
@@ -12,12 +15,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    a = (np.sin(np.radians(lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(np.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
 
 class SpatialGridIndex:
+    """
+    Uniform lat/lon grid over pickup points, stored in CSR form.
+    Points are kept sorted by cell in flat arrays (latitude, longitude and row offset),
+    and cell_offsets[i]:cell_offsets[i + 1] is the slice of the i-th non-empty cell.
+    Row offsets count points in insertion order, so for an index built from a frame
+    they are positions in that frame. Inserts are buffered and the arrays are rebuilt
+    with one sort on the next query.
+    """
 
     def __init__(self, grid_size: float = 0.01):
         self.grid_size = grid_size
-        self.grid = {}
+        self.size = 0
+
+        # Sorted CSR arrays; cell_codes[i] identifies the cell of slice i
+        self.cell_codes = np.empty(0, dtype=np.int64)
+        self.cell_offsets = np.zeros(1, dtype=np.int64)
+        self.lats = np.empty(0, dtype=np.float64)
+        self.lons = np.empty(0, dtype=np.float64)
+        self.rows = np.empty(0, dtype=np.int64)
+        self.items = None
+
+        self._pending = []
         logger.info(f"Initialized SpatialGridIndex with grid_size={grid_size}")
 
     def _get_cell_key(self, lat: float, lon: float) -> Tuple[int, int]:
@@ -25,19 +57,207 @@ class SpatialGridIndex:
         cell_y = int(math.floor(lat / self.grid_size))
         return cell_x, cell_y
 
-    def insert(self, lat: float, lon: float, data: Any):
-        cell_key = self._get_cell_key(lat, lon)
-        if cell_key not in self.grid:
-            self.grid[cell_key] = []
-        self.grid[cell_key].append(data)
+    def cell_keys(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        cell_x = np.floor(np.asarray(lons, dtype=np.float64) / self.grid_size).astype(np.int64)
+        cell_y = np.floor(np.asarray(lats, dtype=np.float64) / self.grid_size).astype(np.int64)
+        return cell_x, cell_y
+
+    @staticmethod
+    def _encode(cell_x, cell_y):
+        """Pack (cell_x, cell_y) into one int64 that sorts by cell_x, then cell_y"""
+        return np.asarray(cell_x, dtype=np.int64) * (1 << 32) + (np.asarray(cell_y, dtype=np.int64) + (1 << 31))
+
+    @staticmethod
+    def _decode(codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        cell_x = np.floor_divide(codes, 1 << 32)
+        return cell_x, codes - cell_x * (1 << 32) - (1 << 31)
+
+    def insert(self, lat: float, lon: float, data: Any = None):
+        self.bulk_insert(np.array([lat]), np.array([lon]), None if data is None else [data])
+
+    def bulk_insert(self, lats: np.ndarray, lons: np.ndarray, items: np.ndarray = None):
+        """Add many points at once; items is an optional payload (e.g. trip ids) per point"""
+        lats = np.asarray(lats, dtype=np.float64)
+        if len(lats) == 0:
+            return
+        if (items is None) != (self.items is None) and self.size:
+            raise ValueError("Points with and without items cannot be mixed in one index")
+
+        rows = np.arange(self.size, self.size + len(lats), dtype=np.int64)
+        self._pending.append((lats, np.asarray(lons, dtype=np.float64), rows,
+                              None if items is None else np.asarray(items)))
+        if items is not None and self.items is None:
+            self.items = np.empty(0, dtype=np.asarray(items).dtype)
+        self.size += len(lats)
+
+    def merge(self, other: 'SpatialGridIndex'):
+        """Append the points of another index built with the same grid size.
+
+        Their row offsets are shifted past this index's points, as if the other
+        index's frame had been concatenated after this one.
+        """
+        if other.grid_size != self.grid_size:
+            raise ValueError(f"Cannot merge grid_size={other.grid_size} into grid_size={self.grid_size}")
+        other._build()
+        if other.size == 0:
+            return
+
+        order = np.argsort(other.rows, kind='stable')
+        self.bulk_insert(other.lats[order], other.lons[order],
+                         None if other.items is None else other.items[order])
+
+    def _build(self):
+        """Fold buffered inserts into the sorted CSR arrays"""
+        if not self._pending:
+            return
+
+        lats = np.concatenate([self.lats] + [batch[0] for batch in self._pending])
+        lons = np.concatenate([self.lons] + [batch[1] for batch in self._pending])
+        rows = np.concatenate([self.rows] + [batch[2] for batch in self._pending])
+        items = None
+        if self.items is not None:
+            items = np.concatenate([self.items] + [batch[3] for batch in self._pending])
+        self._pending = []
+
+        codes = self._encode(*self.cell_keys(lats, lons))
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        self.lats, self.lons, self.rows = lats[order], lons[order], rows[order]
+        if items is not None:
+            self.items = items[order]
+
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        self.cell_codes = codes[starts]
+        self.cell_offsets = np.append(starts, len(codes)).astype(np.int64)
+
+    def cell_counts(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """cell_x, cell_y and point count of every non-empty cell"""
+        self._build()
+        cell_x, cell_y = self._decode(self.cell_codes)
+        return cell_x, cell_y, np.diff(self.cell_offsets)
+
+    @property
+    def grid(self) -> Dict[Tuple[int, int], list]:
+        """Cell key -> items (or row offsets) mapping, materialized from the CSR arrays"""
+        cell_x, cell_y, _ = self.cell_counts()
+        values = self.rows if self.items is None else self.items
+        return {(int(x), int(y)): values[start:end].tolist()
+                for x, y, start, end in zip(cell_x, cell_y, self.cell_offsets[:-1], self.cell_offsets[1:])}
+
+    def items_at(self, rows: np.ndarray) -> np.ndarray:
+        """Payload of the given row offsets (the rows themselves if no items were inserted)"""
+        self._build()
+        if self.items is None:
+            return np.asarray(rows)
+        lookup = np.empty(self.size, dtype=self.items.dtype)
+        lookup[self.rows] = self.items
+        return lookup[rows]
+
+    def _candidate_positions(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> np.ndarray:
+        """Positions in the sorted arrays of every point in cells overlapping a bounding box"""
+        self._build()
+        if self.size == 0 or min_lat > max_lat or min_lon > max_lon:
+            return np.empty(0, dtype=np.int64)
+
+        (x0, x1), (y0, y1) = self.cell_keys([min_lat, max_lat], [min_lon, max_lon])
+        # One contiguous run of cell codes per grid column
+        columns = np.arange(x0, x1 + 1, dtype=np.int64)
+        first = np.searchsorted(self.cell_codes, self._encode(columns, y0), side='left')
+        last = np.searchsorted(self.cell_codes, self._encode(columns, y1), side='right')
+        starts = self.cell_offsets[first]
+        ends = self.cell_offsets[last]
+
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        # Expand the [start, end) runs into one position array without a Python loop
+        run_starts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return run_starts + np.arange(total, dtype=np.int64)
+
+    def query_bbox(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> np.ndarray:
+        """Row offsets of all points inside a bounding box"""
+        positions = self._candidate_positions(min_lat, max_lat, min_lon, max_lon)
+        lats, lons = self.lats[positions], self.lons[positions]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return self.rows[positions[inside]]
+
+    def _radius_bbox(self, lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+    def query_radius(self, lat: float, lon: float, radius_km: float,
+                     return_distances: bool = False):
+        """Row offsets of all points within radius_km of (lat, lon), nearest first"""
+        positions = self._candidate_positions(*self._radius_bbox(lat, lon, radius_km))
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+
+        order = np.argsort(distances, kind='stable')
+        rows = self.rows[positions[order]]
+        return (rows, distances[order]) if return_distances else rows
+
+    def nearest(self, lat: float, lon: float, k: int = 1, return_distances: bool = False):
+        """Row offsets of the k points nearest to (lat, lon), nearest first.
+
+        The search box grows by doubling until it holds k points whose k-th distance
+        is within the radius the box is guaranteed to cover.
+        """
+        self._build()
+        k = min(k, self.size)
+        if k == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return (empty, np.empty(0)) if return_distances else empty
+
+        radius_km = self.grid_size * KM_PER_DEGREE_LAT * math.cos(math.radians(lat))
+        while True:
+            rows, distances = self.query_radius(lat, lon, radius_km, return_distances=True)
+            if len(rows) >= k:
+                break
+            if radius_km > 2 * math.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 2
+
+        return (rows[:k], distances[:k]) if return_distances else rows[:k]
+
+    def cell_statistics(self, trips: pd.DataFrame) -> pd.DataFrame:
+        """Per-cell pickup counts and sums of a derived trips frame, indexed by (cell_x, cell_y).
+
+        One groupby over the cell columns (pickup_cell_x/y, or computed from the pickup
+        coordinates) plus a per-hour count table; no per-trip Python work.
+        """
+        if 'pickup_cell_x' in trips.columns:
+            cell_x, cell_y = trips['pickup_cell_x'].to_numpy(), trips['pickup_cell_y'].to_numpy()
+        else:
+            cell_x, cell_y = self.cell_keys(trips['pickup_latitude'].to_numpy(), trips['pickup_longitude'].to_numpy())
+
+        cells = pd.DataFrame({
+            'cell_x': cell_x,
+            'cell_y': cell_y,
+            'trip_count': 1,
+            'total_passengers': trips['passenger_count'].to_numpy(),
+            'duration_sum': (trips['trip_duration'] / 60).to_numpy(),
+            'distance_sum': trips['trip_distance_km'].to_numpy(dtype=np.float64),
+            'weekend_trips': trips['is_weekend'].to_numpy(),
+            'hour_of_day': trips['hour_of_day'].to_numpy()
+        })
+
+        stats = cells.drop(columns='hour_of_day').groupby(['cell_x', 'cell_y']).sum()
+        hours = (cells.groupby(['cell_x', 'cell_y', 'hour_of_day']).size()
+                 .unstack(fill_value=0)
+                 .reindex(columns=range(24), fill_value=0))
+        hours.columns = [f'hour_{hour}' for hour in range(24)]
+        return stats.join(hours)
 
     def get_statistics(self) -> Dict[str, Any]:
-        cell_counts = [len(points) for points in self.grid.values()]
+        _, _, cell_counts = self.cell_counts()
         return {
-            'total_cells': len(self.grid),
-            'total_points': sum(cell_counts),
-            'avg_points_per_cell': sum(cell_counts) / len(cell_counts) if cell_counts else 0,
-            'max_points_in_cell': max(cell_counts) if cell_counts else 0
+            'total_cells': len(cell_counts),
+            'total_points': int(cell_counts.sum()),
+            'avg_points_per_cell': float(cell_counts.mean()) if len(cell_counts) else 0,
+            'max_points_in_cell': int(cell_counts.max()) if len(cell_counts) else 0
         }
 
     def get_cell_bounds(self, cell_key: Tuple[int, int]) -> Tuple[float, float, float, float]:
@@ -46,4 +266,4 @@ class SpatialGridIndex:
         max_lon = (cell_x + 1) * self.grid_size
         min_lat = cell_y * self.grid_size
         max_lat = (cell_y + 1) * self.grid_size
-        return min_lat, max_lat, min_lon, max_lon
\ No newline at end of file
+        return min_lat, max_lat, min_lon, max_lon
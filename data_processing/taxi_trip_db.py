@@ -1,36 +1,327 @@
+import base64
+import binascii
+import hashlib
+import json
 import logging
+import os
+import re
+import tempfile
+import time
 from datetime import datetime
-from typing import Dict, Any
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple, Iterator
 
 import mysql.connector
+import numpy as np
 import pandas as pd
-from mysql.connector import Error
+from mysql.connector import Error, FieldFlag, FieldType
+
+from data_processing.connection_pool import ConnectionPool
+from data_processing.od_matrix import ODMatrix
+from data_processing.quantile_sketch import KLLSketch
+from data_processing.trip_rollup import TripRollup
 
 logger = logging.getLogger(__name__)
 
 
 class TaxiTripDatabase:
 
-    def __init__(self, host: str = 'localhost', user: str = 'root', password: str = '', database: str = 'nyc_trip', schema_file='nyc_trip.sql'):
+    # Column order shared by the row-wise INSERT and the LOAD DATA bulk path
+    TRIP_COLUMNS = ['id', 'vendor_id', 'pickup_datetime', 'dropoff_datetime',
+                    'hour_of_day', 'day_of_week', 'is_weekend', 'month',
+                    'passenger_count', 'pickup_latitude', 'pickup_longitude',
+                    'dropoff_latitude', 'dropoff_longitude',
+                    'trip_duration', 'calculated_duration', 'trip_distance_km',
+                    'trip_speed_kmh', 'distance_category',
+                    'expected_duration_min', 'actual_duration_min', 'efficiency_ratio',
+                    'store_and_fwd_flag', 'pickup_borough_id', 'dropoff_borough_id',
+                    'pickup_zone_id', 'dropoff_zone_id']
+
+    # DECIMAL scales from nyc_trip.sql, applied before serializing bulk-load files
+    TRIP_DECIMAL_SCALES = {
+        'pickup_latitude': 8, 'pickup_longitude': 8,
+        'dropoff_latitude': 8, 'dropoff_longitude': 8,
+        'trip_distance_km': 3, 'trip_speed_kmh': 2,
+        'expected_duration_min': 2, 'actual_duration_min': 2, 'efficiency_ratio': 4
+    }
+
+    TRIPS_INSERT = """
+                       INSERT INTO trips (id, vendor_id, pickup_datetime, dropoff_datetime, \
+                                          hour_of_day, day_of_week, is_weekend, month, \
+                                          passenger_count, pickup_latitude, pickup_longitude, \
+                                          dropoff_latitude, dropoff_longitude, \
+                                          trip_duration, calculated_duration, trip_distance_km, \
+                                          trip_speed_kmh, distance_category, \
+                                          expected_duration_min, actual_duration_min, efficiency_ratio, \
+                                          store_and_fwd_flag, pickup_borough_id, dropoff_borough_id, \
+                                          pickup_zone_id, dropoff_zone_id) \
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, \
+                               %s, %s, %s, %s) \
+                       """
+
+    EXCLUDED_INSERT = """
+                      INSERT INTO excluded_records (original_index, exclusion_reason, exclusion_timestamp, details) \
+                      VALUES (%s, %s, %s, %s) \
+                      """
+
+    GRID_CELLS_UPSERT = """
+                        INSERT INTO spatial_grid_cells (cell_x, cell_y, lat_min, lat_max, lon_min, lon_max,
+                                                        trip_count, total_passengers,
+                                                        total_trip_duration, total_trip_distance, weekend_trips,
+                                                        avg_trip_duration, avg_trip_distance, peak_hour, weekend_ratio)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                        UPDATE
+                            trip_count = trip_count + VALUES(trip_count),
+                            total_passengers = total_passengers + VALUES(total_passengers),
+                            total_trip_duration = total_trip_duration + VALUES(total_trip_duration),
+                            total_trip_distance = total_trip_distance + VALUES(total_trip_distance),
+                            weekend_trips = weekend_trips + VALUES(weekend_trips),
+                            avg_trip_duration = total_trip_duration / trip_count,
+                            avg_trip_distance = total_trip_distance / trip_count,
+                            weekend_ratio = weekend_trips / trip_count
+                        """
+
+    GRID_HOURS_UPSERT = """
+                        INSERT INTO spatial_grid_cell_hours (cell_x, cell_y, hour_of_day, trip_count)
+                        VALUES (%s, %s, %s, %s) ON DUPLICATE KEY
+                        UPDATE trip_count = trip_count + VALUES(trip_count)
+                        """
+
+    TILES_UPSERT = """
+                   INSERT INTO spatial_tiles (zoom, tile_x, tile_y, lat_min, lat_max, lon_min, lon_max,
+                                              trip_count, total_passengers, total_trip_duration, total_trip_distance)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                   UPDATE
+                       trip_count = trip_count + VALUES(trip_count),
+                       total_passengers = total_passengers + VALUES(total_passengers),
+                       total_trip_duration = total_trip_duration + VALUES(total_trip_duration),
+                       total_trip_distance = total_trip_distance + VALUES(total_trip_distance)
+                   """
+
+    # Percentiles are placeholders until recomputed from the merged duration histogram (OD_FLOW_PERCENTILES_UPDATE)
+    OD_FLOWS_UPSERT = """
+                      INSERT INTO od_flows (pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y,
+                                            hour_start, hour_end, trip_count, total_trip_duration,
+                                            total_trip_distance, total_trip_speed, duration_p50, duration_p90,
+                                            avg_trip_duration, avg_trip_distance, avg_speed_kmh)
+                      VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                      UPDATE
+                          trip_count = trip_count + VALUES(trip_count),
+                          total_trip_duration = total_trip_duration + VALUES(total_trip_duration),
+                          total_trip_distance = total_trip_distance + VALUES(total_trip_distance),
+                          total_trip_speed = total_trip_speed + VALUES(total_trip_speed),
+                          duration_p50 = VALUES(duration_p50),
+                          duration_p90 = VALUES(duration_p90),
+                          avg_trip_duration = total_trip_duration / trip_count,
+                          avg_trip_distance = total_trip_distance / trip_count,
+                          avg_speed_kmh = total_trip_speed / trip_count
+                      """
+
+    OD_FLOW_BINS_UPSERT = """
+                          INSERT INTO od_flow_duration_bins (pickup_cell_x, pickup_cell_y, dropoff_cell_x,
+                                                             dropoff_cell_y, hour_start, duration_bin, trip_count)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                          UPDATE trip_count = trip_count + VALUES(trip_count)
+                          """
+
+    OD_TOUCHED_FLOWS_CREATE = """
+                              CREATE TEMPORARY TABLE od_touched_flows (
+                                  pickup_cell_x int NOT NULL,
+                                  pickup_cell_y int NOT NULL,
+                                  dropoff_cell_x int NOT NULL,
+                                  dropoff_cell_y int NOT NULL,
+                                  hour_start tinyint NOT NULL,
+                                  PRIMARY KEY (pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y, hour_start)
+                              )
+                              """
+
+    # Same percentiles as ODMatrix.bin_percentiles: the bin holding the trip of rank q * (n - 1),
+    # valued at 2 * GAMMA^bin / (GAMMA + 1); the window only reads the histograms of touched flows
+    OD_FLOW_PERCENTILES_UPDATE = """
+                                 UPDATE od_flows f
+                                     JOIN (SELECT pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y,
+                                                  hour_start,
+                                                  MIN(CASE WHEN cumulative > 0.5 * (total - 1) THEN duration_bin END)
+                                                      AS p50_bin,
+                                                  MIN(CASE WHEN cumulative > 0.9 * (total - 1) THEN duration_bin END)
+                                                      AS p90_bin
+                                           FROM (SELECT b.pickup_cell_x, b.pickup_cell_y, b.dropoff_cell_x,
+                                                        b.dropoff_cell_y, b.hour_start, b.duration_bin,
+                                                        SUM(b.trip_count) OVER (flow ORDER BY b.duration_bin)
+                                                            AS cumulative,
+                                                        SUM(b.trip_count) OVER (flow) AS total
+                                                 FROM od_flow_duration_bins b
+                                                          JOIN od_touched_flows t
+                                                               ON t.pickup_cell_x = b.pickup_cell_x
+                                                                   AND t.pickup_cell_y = b.pickup_cell_y
+                                                                   AND t.dropoff_cell_x = b.dropoff_cell_x
+                                                                   AND t.dropoff_cell_y = b.dropoff_cell_y
+                                                                   AND t.hour_start = b.hour_start
+                                                 WINDOW flow AS (PARTITION BY b.pickup_cell_x, b.pickup_cell_y,
+                                                     b.dropoff_cell_x, b.dropoff_cell_y, b.hour_start)) ranked
+                                           GROUP BY pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y,
+                                                    hour_start) p
+                                     ON p.pickup_cell_x = f.pickup_cell_x AND p.pickup_cell_y = f.pickup_cell_y
+                                         AND p.dropoff_cell_x = f.dropoff_cell_x
+                                         AND p.dropoff_cell_y = f.dropoff_cell_y AND p.hour_start = f.hour_start
+                                 SET f.duration_p50 = 2 * POW(%s, p.p50_bin) / (%s + 1),
+                                     f.duration_p90 = 2 * POW(%s, p.p90_bin) / (%s + 1)
+                                 """
+
+    # NumPy dtypes of integer result columns by MySQL field type (unsigned types get the matching uint)
+    RESULT_INT_BITS = {FieldType.TINY: 8, FieldType.SHORT: 16, FieldType.YEAR: 16, FieldType.INT24: 32,
+                       FieldType.LONG: 32, FieldType.LONGLONG: 64}
+    RESULT_FLOAT_TYPES = {FieldType.FLOAT, FieldType.DOUBLE, FieldType.DECIMAL, FieldType.NEWDECIMAL}
+    RESULT_DATETIME_TYPES = {FieldType.DATETIME, FieldType.TIMESTAMP, FieldType.DATE, FieldType.NEWDATE}
+
+    # Filters accepted by get_trip_data, as (SQL condition, parameter) templates
+    TRIP_FILTERS = {
+        'start_date': "pickup_datetime >= %s",
+        'end_date': "pickup_datetime <= %s",
+        'vendor_id': "vendor_id = %s",
+        'hour_of_day': "hour_of_day = %s",
+        'day_of_week': "day_of_week = %s",
+        'is_weekend': "is_weekend = %s",
+        'distance_category': "distance_category = %s",
+        'min_speed': "trip_speed_kmh >= %s",
+        'max_speed': "trip_speed_kmh <= %s",
+        'passenger_count': "passenger_count = %s"
+    }
+
+    # Columns get_trip_statistics may group by, with their expression over the trip_rollup cube
+    # (None: not in the cube, so grouping by it aggregates raw trips)
+    STATISTICS_GROUPS = {
+        'hour_of_day': "hour_of_day",
+        'day_of_week': "day_of_week",
+        'month': "MONTH(trip_date)",
+        'is_weekend': "day_of_week >= 5",
+        'vendor_id': "vendor_id",
+        'distance_category': "distance_category",
+        'passenger_count': None,
+        'pickup_borough_id': None,
+        'dropoff_borough_id': None
+    }
+    STATISTICS_METRICS = ['trip_count', 'avg_duration', 'avg_distance', 'avg_speed', 'std_duration', 'std_distance',
+                         'std_speed', 'total_distance', 'total_passengers', 'avg_efficiency']
+
+    # The trip_rollup sums as aggregates over raw trips
+    TRIP_SUMS = {
+        'trip_count': "COUNT(*)",
+        'duration_sum': "SUM(trip_duration)",
+        'duration_sq_sum': "SUM(trip_duration * trip_duration)",
+        'distance_sum': "SUM(trip_distance_km)",
+        'distance_sq_sum': "SUM(trip_distance_km * trip_distance_km)",
+        'speed_sum': "SUM(trip_speed_kmh)",
+        'speed_sq_sum': "SUM(trip_speed_kmh * trip_speed_kmh)",
+        'passenger_sum': "SUM(passenger_count)",
+        'efficiency_sum': "COALESCE(SUM(efficiency_ratio), 0)",
+        'efficiency_count': "COUNT(efficiency_ratio)"
+    }
+
+    TRIP_ROLLUP_UPSERT = """
+                         INSERT INTO trip_rollup (trip_date, hour_of_day, day_of_week, distance_category, vendor_id,
+                                                  trip_count, duration_sum, duration_sq_sum, distance_sum,
+                                                  distance_sq_sum, speed_sum, speed_sq_sum, passenger_sum,
+                                                  efficiency_sum, efficiency_count)
+                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                         UPDATE
+                             trip_count = trip_count + VALUES(trip_count),
+                             duration_sum = duration_sum + VALUES(duration_sum),
+                             duration_sq_sum = duration_sq_sum + VALUES(duration_sq_sum),
+                             distance_sum = distance_sum + VALUES(distance_sum),
+                             distance_sq_sum = distance_sq_sum + VALUES(distance_sq_sum),
+                             speed_sum = speed_sum + VALUES(speed_sum),
+                             speed_sq_sum = speed_sq_sum + VALUES(speed_sq_sum),
+                             passenger_sum = passenger_sum + VALUES(passenger_sum),
+                             efficiency_sum = efficiency_sum + VALUES(efficiency_sum),
+                             efficiency_count = efficiency_count + VALUES(efficiency_count)
+                         """
+
+    # Parsing of the schema file's CREATE TABLE statements, for _migrate_table
+    CREATE_TABLE_PATTERN = re.compile(r"CREATE TABLE `(\w+)`")
+    COLUMN_DEFINITION_PATTERN = re.compile(r"`(\w+)` ")
+    KEY_DEFINITION_PATTERN = re.compile(r"(?:UNIQUE |FULLTEXT |SPATIAL )?KEY `(\w+)` ")
+
+    # Cells touched by the current grid upsert; peak hours are only recomputed for these
+    GRID_TOUCHED_CELLS_CREATE = """
+                                CREATE TEMPORARY TABLE grid_touched_cells (
+                                    cell_x int NOT NULL,
+                                    cell_y int NOT NULL,
+                                    PRIMARY KEY (cell_x, cell_y)
+                                )
+                                """
+
+    # Ties resolve to the earliest hour, as in the per-cell Python computation
+    GRID_PEAK_HOUR_UPDATE = """
+                            UPDATE spatial_grid_cells c
+                                JOIN (SELECT h.cell_x, h.cell_y, h.hour_of_day,
+                                             ROW_NUMBER() OVER (PARTITION BY h.cell_x, h.cell_y
+                                                 ORDER BY h.trip_count DESC, h.hour_of_day) AS hour_rank
+                                      FROM spatial_grid_cell_hours h
+                                               JOIN grid_touched_cells t
+                                                    ON t.cell_x = h.cell_x AND t.cell_y = h.cell_y) h
+                                ON h.cell_x = c.cell_x AND h.cell_y = c.cell_y AND h.hour_rank = 1
+                            SET c.peak_hour = h.hour_of_day
+                            """
+
+    def __init__(self, host: str = 'localhost', user: str = 'root', password: str = '', database: str = 'nyc_trip',
+                 schema_file='nyc_trip.sql', local_infile: bool = False, pool: ConnectionPool = None,
+                 slow_query_threshold: float = None):
 
         self.host = host
         self.user = user
         self.password = password
         self.database = database
         self.schema_file = schema_file
+        self.local_infile = local_infile
+        self.pool = pool
         self.connection = None
         self.cursor = None
 
+        # Read queries of this instance: time in SQL and in decoding rows, and rows fetched.
+        # Queries taking slow_query_threshold seconds or longer are logged with their plan.
+        self.slow_query_threshold = slow_query_threshold
+        self.query_stats = {'queries': 0, 'sql_time': 0.0, 'decode_time': 0.0, 'rows': 0}
+        self.slow_queries = []
+
+    def connection_params(self) -> Dict[str, Any]:
+        """Constructor arguments for opening another connection, e.g. in a worker process"""
+        return {
+            'host': self.host,
+            'user': self.user,
+            'password': self.password,
+            'database': self.database,
+            'schema_file': self.schema_file,
+            'local_infile': self.local_infile,
+            'slow_query_threshold': self.slow_query_threshold
+        }
+
+    def _open_connection(self):
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset='utf8mb4',
+            use_unicode=True,
+            allow_local_infile=self.local_infile
+        )
+
+    def create_pool(self, pool_size: int = 5, checkout_timeout: float = 5.0, idle_timeout: float = 300.0,
+                    health_check_interval: float = 30.0) -> ConnectionPool:
+        """A connection pool for these connection settings, to share between TaxiTripDatabase instances"""
+        return ConnectionPool(self._open_connection, pool_size=pool_size, checkout_timeout=checkout_timeout,
+                              idle_timeout=idle_timeout, health_check_interval=health_check_interval)
+
     def connect(self) -> bool | None:
+        if self.pool is not None:
+            # Borrowed connections are already verified by the pool; close() gives them back
+            self.connection = self.pool.acquire()
+            self.cursor = self.connection.cursor()
+            return True
+
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4',
-                use_unicode=True
-            )
+            self.connection = self._open_connection()
 
             if self.connection.is_connected():
                 self.cursor = self.connection.cursor()
@@ -60,6 +351,13 @@ class TaxiTripDatabase:
                         if 'Unknown table' not in str(e):
                             logger.warning(f"Statement execution warning: {e}")
 
+            # Tables that already existed keep their old definition; add what the schema gained since
+            for statement in statements:
+                match = self.CREATE_TABLE_PATTERN.search(statement)
+                if match:
+                    self._migrate_table(match.group(1), statement[match.start():])
+
+            self._bump_data_version()
             self.connection.commit()
             logger.info("Database schema created successfully")
 
@@ -70,27 +368,99 @@ class TaxiTripDatabase:
             logger.error(f"Error creating schema: {e}")
             raise
 
-    def insert_trips_batch(self, df: pd.DataFrame, batch_size: int = 50000) -> int:
-        trips = self.get_stats()
+    def _migrate_table(self, table: str, create_statement: str):
+        """Add the columns and secondary keys of a CREATE TABLE statement that the existing table lacks.
+
+        Idempotent: only names missing from information_schema are added, so a database
+        created from an older schema file can be appended to. Changed column types or
+        primary keys are not migrated.
+        """
+        self.cursor.execute("""
+                            SELECT COLUMN_NAME
+                            FROM information_schema.COLUMNS
+                            WHERE TABLE_SCHEMA = DATABASE()
+                              AND TABLE_NAME = %s
+                            """, (table,))
+        columns = {row[0] for row in self.cursor.fetchall()}
+        if not columns:
+            return
+        self.cursor.execute("""
+                            SELECT DISTINCT INDEX_NAME
+                            FROM information_schema.STATISTICS
+                            WHERE TABLE_SCHEMA = DATABASE()
+                              AND TABLE_NAME = %s
+                            """, (table,))
+        indexes = {row[0] for row in self.cursor.fetchall()}
+
+        previous = None
+        for line in create_statement.splitlines():
+            line = line.strip().rstrip(',')
+            column = self.COLUMN_DEFINITION_PATTERN.match(line)
+            key = self.KEY_DEFINITION_PATTERN.match(line)
+            try:
+                if column:
+                    if column.group(1) not in columns:
+                        position = f" AFTER `{previous}`" if previous else " FIRST"
+                        self.cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN {line}{position}")
+                        logger.info(f"Added column {table}.{column.group(1)} to the existing table")
+                    previous = column.group(1)
+                elif key and key.group(1) not in indexes:
+                    self.cursor.execute(f"ALTER TABLE `{table}` ADD {line}")
+                    logger.info(f"Added index {key.group(1)} to the existing {table} table")
+            except Error as e:
+                logger.error(f"Could not migrate {table} to the current schema ({line}): {e}. "
+                             f"Recreate the database from {self.schema_file}.")
+                raise
+
+    @staticmethod
+    def _trip_records(df: pd.DataFrame) -> list:
+        """Build INSERT parameter tuples for trips in TRIP_COLUMNS order"""
+        records = []
+        for _, row in df.iterrows():
+            record = (
+                str(row['id']),
+                int(row['vendor_id']),
+                row['pickup_datetime'].to_pydatetime(),
+                row['dropoff_datetime'].to_pydatetime(),
+                int(row['hour_of_day']),
+                int(row['day_of_week']),
+                int(row['is_weekend']),
+                int(row['month']),
+                int(row['passenger_count']),
+                float(row['pickup_latitude']),
+                float(row['pickup_longitude']),
+                float(row['dropoff_latitude']),
+                float(row['dropoff_longitude']),
+                int(row['trip_duration']),
+                int(row['calculated_duration']) if pd.notna(row['calculated_duration']) else None,
+                float(row['trip_distance_km']),
+                float(row['trip_speed_kmh']),
+                str(row['distance_category']),
+                float(row['expected_duration_min']) if pd.notna(row['expected_duration_min']) else None,
+                float(row['actual_duration_min']) if pd.notna(row['actual_duration_min']) else None,
+                float(row['efficiency_ratio']) if pd.notna(row['efficiency_ratio']) else None,
+                str(row.get('store_and_fwd_flag', 'N')),
+                int(row.get('pickup_borough_id', 0)),
+                int(row.get('dropoff_borough_id', 0)),
+                int(row.get('pickup_zone_id', 0)),
+                int(row.get('dropoff_zone_id', 0))
+            )
+            records.append(record)
+        return records
 
-        if trips.get('total_trips') > 0:
-            logger.warning("Trips table is not empty. Skipping trip insertion to avoid duplicates.")
-            return 0
+    def insert_trips_batch(self, df: pd.DataFrame, batch_size: int = 50000, check_existing: bool = True) -> int:
+        if check_existing:
+            trips = self.get_stats()
 
-        insert_query = """
-                       INSERT INTO trips (id, vendor_id, pickup_datetime, dropoff_datetime, \
-                                          hour_of_day, day_of_week, is_weekend, month, \
-                                          passenger_count, pickup_latitude, pickup_longitude, \
-                                          dropoff_latitude, dropoff_longitude, \
-                                          trip_duration, calculated_duration, trip_distance_km, \
-                                          trip_speed_kmh, distance_category, \
-                                          expected_duration_min, actual_duration_min, efficiency_ratio, \
-                                          store_and_fwd_flag) \
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) \
-                       """
+            if trips.get('total_trips') > 0:
+                logger.warning("Trips table is not empty. Skipping trip insertion to avoid duplicates.")
+                return 0
+
+        insert_query = self.TRIPS_INSERT
 
         total_inserted = 0
         total_rows = len(df)
+        start_time = time.perf_counter()
 
         try:
             logger.info(f"Inserting {total_rows} trip records in batches of {batch_size}...")
@@ -99,33 +469,7 @@ class TaxiTripDatabase:
                 end_idx = min(start_idx + batch_size, total_rows)
                 batch_df = df.iloc[start_idx:end_idx]
 
-                batch_data = []
-                for _, row in batch_df.iterrows():
-                    record = (
-                        str(row['id']),
-                        int(row['vendor_id']),
-                        row['pickup_datetime'].to_pydatetime(),
-                        row['dropoff_datetime'].to_pydatetime(),
-                        int(row['hour_of_day']),
-                        int(row['day_of_week']),
-                        int(row['is_weekend']),
-                        int(row['month']),
-                        int(row['passenger_count']),
-                        float(row['pickup_latitude']),
-                        float(row['pickup_longitude']),
-                        float(row['dropoff_latitude']),
-                        float(row['dropoff_longitude']),
-                        int(row['trip_duration']),
-                        int(row['calculated_duration']) if pd.notna(row['calculated_duration']) else None,
-                        float(row['trip_distance_km']),
-                        float(row['trip_speed_kmh']),
-                        str(row['distance_category']),
-                        float(row['expected_duration_min']) if pd.notna(row['expected_duration_min']) else None,
-                        float(row['actual_duration_min']) if pd.notna(row['actual_duration_min']) else None,
-                        float(row['efficiency_ratio']) if pd.notna(row['efficiency_ratio']) else None,
-                        str(row.get('store_and_fwd_flag', 'N'))
-                    )
-                    batch_data.append(record)
+                batch_data = self._trip_records(batch_df)
 
                 self.cursor.executemany(insert_query, batch_data)
                 self.connection.commit()
@@ -134,7 +478,7 @@ class TaxiTripDatabase:
                 logger.info(f"Progress: {total_inserted}/{total_rows} records inserted "
                             f"({(total_inserted / total_rows) * 100:.1f}%)")
 
-            logger.info(f"Successfully inserted {total_inserted} trip records")
+            self._log_load_rate('executemany', total_inserted, start_time)
             return total_inserted
 
         except Error as e:
@@ -142,123 +486,931 @@ class TaxiTripDatabase:
             self.connection.rollback()
             raise
 
-    def insert_spatial_grid(self, df: pd.DataFrame, spatial_index) -> int:
+    @staticmethod
+    def _log_load_rate(method: str, rows: int, start_time: float):
+        elapsed = time.perf_counter() - start_time
+        rate = rows / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Successfully inserted {rows} trip records via {method} "
+                    f"in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+    def _trip_secondary_indexes(self) -> List[Tuple[str, str]]:
+        """Secondary indexes of the trips table as defined in the schema file"""
+        with open(self.schema_file, 'r') as f:
+            sql_script = f.read()
+
+        table = re.search(r'CREATE TABLE `trips` \((.*?)\n\)', sql_script, re.S)
+        if table is None:
+            return []
+        return re.findall(r'^\s*KEY `(\w+)` \((.*?)\),?$', table.group(1), re.M)
+
+    def disable_trip_indexes(self) -> List[Tuple[str, str]]:
+        """Drop the secondary indexes of an empty trips table ahead of a bulk load.
+
+        Returns the dropped (name, columns) pairs to pass to rebuild_trip_indexes.
+        Indexes are left alone if the table already holds rows, since rebuilding
+        them would then cost more than maintaining them during the load.
+        """
+        self.cursor.execute("SELECT COUNT(*) FROM trips")
+        if self.cursor.fetchone()[0] > 0:
+            return []
+
+        self.cursor.execute("SHOW INDEX FROM trips")
+        existing = {row[2] for row in self.cursor.fetchall()}
+        indexes = [(name, columns) for name, columns in self._trip_secondary_indexes() if name in existing]
+
+        if indexes:
+            logger.info(f"Dropping {len(indexes)} secondary indexes on trips for bulk load...")
+            self.cursor.execute("ALTER TABLE trips " +
+                                ", ".join(f"DROP INDEX `{name}`" for name, _ in indexes))
+        return indexes
+
+    def rebuild_trip_indexes(self, indexes: List[Tuple[str, str]]):
+        if not indexes:
+            return
+
+        logger.info(f"Rebuilding {len(indexes)} secondary indexes on trips...")
+        start_time = time.perf_counter()
+        self.cursor.execute("ALTER TABLE trips " +
+                            ", ".join(f"ADD INDEX `{name}` ({columns})" for name, columns in indexes))
+        logger.info(f"Rebuilt trip indexes in {time.perf_counter() - start_time:.1f}s")
+
+    def _trips_to_tsv(self, df: pd.DataFrame, path: str):
+        """Serialize trips in TRIP_COLUMNS order to a LOAD DATA compatible TSV in one step"""
+        out = pd.DataFrame({column: df[column] for column in self.TRIP_COLUMNS if column in df.columns})
+        for column, scale in self.TRIP_DECIMAL_SCALES.items():
+            out[column] = out[column].astype(np.float64).round(scale)
+        for column in ['vendor_id', 'hour_of_day', 'day_of_week', 'is_weekend', 'month',
+                       'passenger_count', 'trip_duration', 'calculated_duration']:
+            out[column] = np.trunc(out[column].astype(np.float64)).astype('Int64')
+        out['distance_category'] = out['distance_category'].astype(str)
+        if 'store_and_fwd_flag' not in out.columns:
+            out['store_and_fwd_flag'] = 'N'
+        for column in ['pickup_borough_id', 'dropoff_borough_id', 'pickup_zone_id', 'dropoff_zone_id']:
+            if column not in out.columns:
+                out[column] = 0
+
+        out[self.TRIP_COLUMNS].to_csv(path, sep='\t', header=False, index=False, na_rep='\\N',
+                                      date_format='%Y-%m-%d %H:%M:%S', lineterminator='\n')
+
+    def insert_trips_bulk(self, df: pd.DataFrame, batch_size: int = 500000, check_existing: bool = True,
+                          manage_indexes: bool = True) -> int:
+        """Insert trips with LOAD DATA LOCAL INFILE from temporary TSV files.
+
+        Requires a connection opened with local_infile=True. With manage_indexes the
+        secondary indexes of an empty trips table are dropped for the load and rebuilt
+        from nyc_trip.sql afterwards.
+        """
+        if check_existing:
+            trips = self.get_stats()
+
+            if trips.get('total_trips') > 0:
+                logger.warning("Trips table is not empty. Skipping trip insertion to avoid duplicates.")
+                return 0
 
-        cells = self.get_stats()
-
-        if cells.get('total_grid_cells') > 0:
-            logger.warning("Spatial grid cells table is not empty. Skipping spatial grid insertion to avoid duplicates.")
-            return 0
-
-        insert_query = """
-                       INSERT INTO spatial_grid_cells (cell_x, cell_y, lat_min, lat_max, lon_min, lon_max,
-                                                       total_passengers,
-                                                       avg_trip_duration, avg_trip_distance, peak_hour, weekend_ratio)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY \
-                       UPDATE \
-                        total_passengers = \
-                       VALUES (total_passengers), avg_trip_duration = \
-                       VALUES (avg_trip_duration), avg_trip_distance = \
-                       VALUES (avg_trip_distance), peak_hour = \
-                       VALUES (peak_hour), weekend_ratio = \
-                       VALUES (weekend_ratio)
-                       """
+        load_query = (
+            "LOAD DATA LOCAL INFILE %s INTO TABLE trips "
+            "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(self.TRIP_COLUMNS)})"
+        )
+
+        total_inserted = 0
+        total_rows = len(df)
+        start_time = time.perf_counter()
+        indexes = []
 
         try:
-            logger.info("Calculating spatial grid statistics...")
-
-            trip_lookup = df.set_index('id').to_dict('index')
-
-            grid_data = []
-            for cell_key, points in spatial_index.grid.items():
-                cell_x, cell_y = cell_key
-                bounds = spatial_index.get_cell_bounds(cell_key)
-                min_lat, max_lat, min_lon, max_lon = bounds
-
-                cell_trips = []
-                for point in points:
-                    trip_id = point['id']
-                    if trip_id in trip_lookup:
-                        cell_trips.append(trip_lookup[trip_id])
-
-                if not cell_trips:
-                    continue
-
-                total_passengers = sum(trip.get('passenger_count', 0) for trip in cell_trips)
-
-                durations = [trip.get('trip_duration', 0) / 60 for trip in cell_trips if trip.get('trip_duration')]
-                avg_trip_duration = sum(durations) / len(durations) if durations else None
-
-                distances = [trip.get('trip_distance_km', 0) for trip in cell_trips if trip.get('trip_distance_km')]
-                avg_trip_distance = sum(distances) / len(distances) if distances else None
-
-                hours = [trip.get('hour_of_day') for trip in cell_trips if trip.get('hour_of_day') is not None]
-                if hours:
-                    peak_hour = max(set(hours), key=hours.count)
-                else:
-                    peak_hour = None
-
-                weekend_trips = sum(1 for trip in cell_trips if trip.get('is_weekend', 0) == 1)
-                weekend_ratio = weekend_trips / len(cell_trips) if cell_trips else None
-
-                record = (
-                    cell_x,
-                    cell_y,
-                    float(min_lat),
-                    float(max_lat),
-                    float(min_lon),
-                    float(max_lon),
-                    total_passengers,
-                    float(avg_trip_duration) if avg_trip_duration is not None else None,
-                    float(avg_trip_distance) if avg_trip_distance is not None else None,
-                    int(peak_hour) if peak_hour is not None else None,
-                    float(weekend_ratio) if weekend_ratio is not None else None
-                )
-                grid_data.append(record)
-
-            if grid_data:
-                logger.info(f"Inserting {len(grid_data)} spatial grid cells...")
-                self.cursor.executemany(insert_query, grid_data)
-                self.connection.commit()
-                logger.info(f"Successfully inserted {len(grid_data)} spatial grid cells")
-                return len(grid_data)
+            logger.info(f"Bulk loading {total_rows} trip records in batches of {batch_size}...")
+            self.cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+            if manage_indexes:
+                indexes = self.disable_trip_indexes()
+
+            for start_idx in range(0, total_rows, batch_size):
+                batch_df = df.iloc[start_idx:start_idx + batch_size]
+
+                fd, path = tempfile.mkstemp(prefix='nyc_trips_', suffix='.tsv')
+                os.close(fd)
+                try:
+                    self._trips_to_tsv(batch_df, path)
+                    self.cursor.execute(load_query, (path,))
+                    self.connection.commit()
+                finally:
+                    os.remove(path)
+
+                total_inserted += len(batch_df)
+                logger.info(f"Progress: {total_inserted}/{total_rows} records loaded "
+                            f"({(total_inserted / total_rows) * 100:.1f}%)")
+
+            self._log_load_rate('LOAD DATA', total_inserted, start_time)
+            return total_inserted
+
+        except Error as e:
+            logger.error(f"Error bulk loading trip records: {e}")
+            self.connection.rollback()
+            raise
+        finally:
+            try:
+                self.rebuild_trip_indexes(indexes)
+            finally:
+                self.cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+
+    def insert_spatial_grid(self, df: pd.DataFrame, spatial_index) -> int:
+        """Aggregate trips per spatial grid cell with one groupby and insert the cells"""
+        logger.info("Calculating spatial grid statistics...")
+        return self.insert_spatial_grid_stats(spatial_index.cell_statistics(df), spatial_index)
+
+    def _upsert_grid_stats(self, grid_stats: pd.DataFrame, spatial_index) -> int:
+        """Add per-cell running sums to spatial_grid_cells without committing.
+
+        Counts and sums are accumulated on existing cells and the averages, weekend
+        ratio and peak hour are recomputed from the accumulated totals, for the cells in
+        grid_stats only.
+        """
+        hour_columns = [f'hour_{hour}' for hour in range(24)]
+        hour_counts = grid_stats[hour_columns].to_numpy()
+
+        cell_x = grid_stats.index.get_level_values(0).to_numpy(dtype=np.int64)
+        cell_y = grid_stats.index.get_level_values(1).to_numpy(dtype=np.int64)
+        min_lat, max_lat, min_lon, max_lon = spatial_index.get_cell_bounds((cell_x, cell_y))
+        trip_count = grid_stats['trip_count'].to_numpy(dtype=np.float64)
+        duration_sum = grid_stats['duration_sum'].to_numpy(dtype=np.float64)
+        distance_sum = grid_stats['distance_sum'].to_numpy(dtype=np.float64)
+        weekend_trips = grid_stats['weekend_trips'].to_numpy(dtype=np.float64)
+
+        grid_data = list(zip(
+            cell_x.tolist(), cell_y.tolist(),
+            min_lat.tolist(), max_lat.tolist(), min_lon.tolist(), max_lon.tolist(),
+            trip_count.astype(np.int64).tolist(),
+            grid_stats['total_passengers'].to_numpy(dtype=np.float64).astype(np.int64).tolist(),
+            duration_sum.tolist(),
+            distance_sum.tolist(),
+            weekend_trips.astype(np.int64).tolist(),
+            (duration_sum / trip_count).tolist(),
+            (distance_sum / trip_count).tolist(),
+            hour_counts.argmax(axis=1).tolist(),
+            (weekend_trips / trip_count).tolist()
+        ))
+
+        cell_pos, hours = np.nonzero(hour_counts)
+        hour_data = list(zip(cell_x[cell_pos].tolist(), cell_y[cell_pos].tolist(), hours.tolist(),
+                             hour_counts[cell_pos, hours].astype(np.int64).tolist()))
+
+        if grid_data:
+            self.cursor.executemany(self.GRID_CELLS_UPSERT, grid_data)
+            self.cursor.executemany(self.GRID_HOURS_UPSERT, hour_data)
+
+            # Temporary tables do not end the transaction; the window only ranks the touched cells
+            self.cursor.execute("DROP TEMPORARY TABLE IF EXISTS grid_touched_cells")
+            self.cursor.execute(self.GRID_TOUCHED_CELLS_CREATE)
+            self.cursor.executemany("INSERT INTO grid_touched_cells (cell_x, cell_y) VALUES (%s, %s)",
+                                    list(zip(cell_x.tolist(), cell_y.tolist())))
+            self.cursor.execute(self.GRID_PEAK_HOUR_UPDATE)
+            self.cursor.execute("DROP TEMPORARY TABLE grid_touched_cells")
+        return len(grid_data)
+
+    def insert_spatial_grid_stats(self, grid_stats: pd.DataFrame, spatial_index, check_existing: bool = True) -> int:
+        """Insert spatial grid cells from per-cell running sums (see NYCTaxiDataProcessor.grid_stats)"""
+        if check_existing:
+            cells = self.get_stats()
+
+            if cells.get('total_grid_cells') > 0:
+                logger.warning("Spatial grid cells table is not empty. Skipping spatial grid insertion to avoid duplicates.")
+                return 0
+
+        try:
+            logger.info(f"Inserting {len(grid_stats)} spatial grid cells...")
+            inserted = self._upsert_grid_stats(grid_stats, spatial_index)
+            self.connection.commit()
+            if inserted:
+                logger.info(f"Successfully inserted {inserted} spatial grid cells")
             else:
                 logger.warning("No spatial grid data to insert")
-                return 0
+            return inserted
 
         except Error as e:
             logger.error(f"Error inserting spatial grid: {e}")
             self.connection.rollback()
             raise
 
-    def insert_excluded_records(self, excluded_records: list) -> int:
+    def _upsert_tiles(self, tiles: pd.DataFrame, batch_size: int = 50000) -> int:
+        """Add tile counts and sums (TilePyramid.to_frame) to spatial_tiles"""
+        rows = list(zip(
+            tiles['zoom'].astype(int).tolist(),
+            tiles['tile_x'].astype(int).tolist(),
+            tiles['tile_y'].astype(int).tolist(),
+            tiles['lat_min'].round(8).tolist(),
+            tiles['lat_max'].round(8).tolist(),
+            tiles['lon_min'].round(8).tolist(),
+            tiles['lon_max'].round(8).tolist(),
+            tiles['trip_count'].astype(int).tolist(),
+            tiles['total_passenger_count'].round().astype(int).tolist(),
+            tiles['total_trip_duration'].round(2).tolist(),
+            tiles['total_trip_distance_km'].round(3).tolist()
+        ))
+        for start_idx in range(0, len(rows), batch_size):
+            self.cursor.executemany(self.TILES_UPSERT, rows[start_idx:start_idx + batch_size])
+        return len(rows)
+
+    def insert_spatial_tiles(self, tile_pyramid, check_existing: bool = True) -> int:
+        """Insert every level of a TilePyramid into spatial_tiles"""
+        if check_existing:
+            self.cursor.execute("SELECT COUNT(*) FROM spatial_tiles")
+            if self.cursor.fetchone()[0] > 0:
+                logger.warning("Spatial tiles table is not empty. Skipping tile insertion to avoid duplicates.")
+                return 0
 
-        records = self.get_stats()
-        if records.get('total_excluded') > 0:
-            logger.warning("Excluded records table is not empty. Skipping excluded records insertion to avoid duplicates.")
-            return 0
+        try:
+            tiles = tile_pyramid.to_frame()
+            logger.info(f"Inserting {len(tiles)} spatial tiles over {tile_pyramid.max_zoom + 1} zoom levels...")
+            inserted = self._upsert_tiles(tiles)
+            self.connection.commit()
+            return inserted
 
-        insert_query = """
-                       INSERT INTO excluded_records (original_index, exclusion_reason, exclusion_timestamp, details) \
-                       VALUES (%s, %s, %s, %s) \
-                       """
+        except Error as e:
+            logger.error(f"Error inserting spatial tiles: {e}")
+            self.connection.rollback()
+            raise
+
+    def get_spatial_tiles(self, zoom: int, tile_range: Tuple[int, int, int, int] = None,
+                          limit: int = None) -> List[Dict[str, Any]]:
+        """Tiles of one zoom level, optionally within an inclusive (x_min, x_max, y_min, y_max) range.
+
+        Reads only the primary-key range of the visible tiles, never trips. With limit,
+        returns the busiest tiles first.
+        """
+        query = """
+                SELECT zoom, tile_x, tile_y, lat_min, lat_max, lon_min, lon_max, trip_count,
+                       total_passengers, total_trip_duration, total_trip_distance
+                FROM spatial_tiles
+                WHERE zoom = %s
+                """
+        params = [zoom]
+        if tile_range is not None:
+            query += " AND tile_x BETWEEN %s AND %s AND tile_y BETWEEN %s AND %s"
+            params.extend(tile_range)
+        if limit is not None:
+            query += " ORDER BY trip_count DESC LIMIT %s"
+            params.append(limit)
+
+        rows = self._run_query(query, tuple(params))
+        columns = [column[0] for column in self.cursor.description]
+        return [{column: float(value) if column in ('lat_min', 'lat_max', 'lon_min', 'lon_max',
+                                                    'total_trip_duration', 'total_trip_distance') else value
+                 for column, value in zip(columns, row)}
+                for row in rows]
+
+    def get_heatmap_cells(self, pyramid, zoom: int, tile_range: Tuple[int, int, int, int] = None,
+                          as_frame: bool = False, **filters):
+        """[lat, lon, trip_count] at the centre of every non-empty tile of one zoom level.
+
+        Without filters the counts come straight from spatial_tiles. Date, hour and vendor
+        filters (TRIP_FILTERS) are not part of the pyramid, so the matching trips are binned
+        into the same tiles of the given TilePyramid by a GROUP BY in MySQL. Either way only
+        one row per visible tile leaves the database. With as_frame, the cells are returned
+        as a DataFrame with lat, lng and trips columns.
+        """
+        where, params = self._filter_clause(filters)
+        if not where:
+            tiles = self.get_spatial_tiles(zoom, tile_range)
+            tile_x = np.array([tile['tile_x'] for tile in tiles], dtype=np.int64)
+            tile_y = np.array([tile['tile_y'] for tile in tiles], dtype=np.int64)
+            counts = np.array([tile['trip_count'] for tile in tiles], dtype=np.int64)
+            return self._heatmap_cells(pyramid, zoom, tile_x, tile_y, counts, as_frame)
+
+        tiles = 1 << zoom
+        x_min, x_max, y_min, y_max = tile_range if tile_range is not None else (0, tiles - 1, 0, tiles - 1)
+        lat_min, _, lon_min, _ = pyramid.tile_bounds(zoom, x_min, y_min)
+        _, lat_max, _, lon_max = pyramid.tile_bounds(zoom, x_max, y_max)
+        lat_step = (pyramid.bounds['lat_max'] - pyramid.bounds['lat_min']) / tiles
+        lon_step = (pyramid.bounds['lon_max'] - pyramid.bounds['lon_min']) / tiles
+
+        # Same tiles as TilePyramid.tile_coordinates; the box edges of the pyramid belong to its last tiles
+        query = f"""
+                SELECT LEAST(FLOOR((pickup_longitude - %s) / %s), %s) AS tile_x,
+                       LEAST(FLOOR((pickup_latitude - %s) / %s), %s) AS tile_y,
+                       COUNT(*) AS trip_count
+                FROM trips{where}
+                  AND pickup_latitude BETWEEN %s AND %s
+                  AND pickup_longitude BETWEEN %s AND %s
+                GROUP BY tile_x, tile_y
+                """
+        params = ([pyramid.bounds['lon_min'], lon_step, tiles - 1, pyramid.bounds['lat_min'], lat_step, tiles - 1] +
+                  params + [float(lat_min), float(lat_max), float(lon_min), float(lon_max)])
+        binned = self.query_to_df(query, tuple(params))
+        tile_x = binned['tile_x'].to_numpy(dtype=np.int64)
+        tile_y = binned['tile_y'].to_numpy(dtype=np.int64)
+        # Points on the outer edge of the range fall in the next tile, which is not visible
+        visible = (tile_x >= x_min) & (tile_x <= x_max) & (tile_y >= y_min) & (tile_y <= y_max)
+        return self._heatmap_cells(pyramid, zoom, tile_x[visible], tile_y[visible],
+                                   binned['trip_count'].to_numpy(dtype=np.int64)[visible], as_frame)
+
+    @staticmethod
+    def _heatmap_cells(pyramid, zoom: int, tile_x: np.ndarray, tile_y: np.ndarray, counts: np.ndarray,
+                       as_frame: bool):
+        lat_min, lat_max, lon_min, lon_max = pyramid.tile_bounds(zoom, tile_x, tile_y)
+        cells = pd.DataFrame({'lat': (lat_min + lat_max) / 2, 'lng': (lon_min + lon_max) / 2, 'trips': counts})
+        if as_frame:
+            return cells
+        return [[lat, lng, trips] for lat, lng, trips in zip(cells['lat'].tolist(), cells['lng'].tolist(),
+                                                             cells['trips'].tolist())]
+
+    def _upsert_od_flows(self, od_matrix, recompute_percentiles: bool = True, batch_size: int = 50000) -> int:
+        """Add the flow sums of an ODMatrix to od_flows and its duration histograms to od_flow_duration_bins.
+
+        With recompute_percentiles, the percentiles of every flow it touches are then
+        recomputed from the flow's merged histogram; without it, od_flows must not have
+        held any of these flows, so the matrix's own percentiles are already final.
+        """
+        flows = od_matrix.to_frame()
+        trip_count = flows['trip_count'].to_numpy(dtype=np.float64)
+        duration_sum = flows['duration_sum'].to_numpy(dtype=np.float64)
+        distance_sum = flows['distance_sum'].to_numpy(dtype=np.float64)
+        speed_sum = flows['speed_sum'].to_numpy(dtype=np.float64)
+        rows = list(zip(
+            *(flows[column].astype(int).tolist() for column in ['pickup_cell_x', 'pickup_cell_y', 'dropoff_cell_x',
+                                                                'dropoff_cell_y', 'hour_start', 'hour_end']),
+            trip_count.astype(np.int64).tolist(),
+            duration_sum.round(2).tolist(),
+            distance_sum.round(3).tolist(),
+            speed_sum.round(2).tolist(),
+            flows['duration_p50'].astype(float).round(2).tolist(),
+            flows['duration_p90'].astype(float).round(2).tolist(),
+            (duration_sum / trip_count).round(2).tolist(),
+            (distance_sum / trip_count).round(3).tolist(),
+            (speed_sum / trip_count).round(2).tolist()
+        ))
+        duration_bins = od_matrix.duration_bins_frame()
+        bin_rows = list(zip(*(duration_bins[column].astype(int).tolist()
+                              for column in ODMatrix.KEY + ['duration_bin', 'trip_count'])))
+
+        for start_idx in range(0, len(rows), batch_size):
+            self.cursor.executemany(self.OD_FLOWS_UPSERT, rows[start_idx:start_idx + batch_size])
+        for start_idx in range(0, len(bin_rows), batch_size):
+            self.cursor.executemany(self.OD_FLOW_BINS_UPSERT, bin_rows[start_idx:start_idx + batch_size])
+
+        if recompute_percentiles and rows:
+            self.cursor.execute("DROP TEMPORARY TABLE IF EXISTS od_touched_flows")
+            self.cursor.execute(self.OD_TOUCHED_FLOWS_CREATE)
+            keys = [row[:len(ODMatrix.KEY)] for row in rows]
+            for start_idx in range(0, len(keys), batch_size):
+                self.cursor.executemany("""
+                                        INSERT INTO od_touched_flows (pickup_cell_x, pickup_cell_y, dropoff_cell_x,
+                                                                      dropoff_cell_y, hour_start)
+                                        VALUES (%s, %s, %s, %s, %s)
+                                        """, keys[start_idx:start_idx + batch_size])
+            self.cursor.execute(self.OD_FLOW_PERCENTILES_UPDATE, (ODMatrix.GAMMA,) * 4)
+            self.cursor.execute("DROP TEMPORARY TABLE od_touched_flows")
+        return len(rows)
+
+    def insert_od_flows(self, od_matrix, check_existing: bool = True) -> int:
+        """Insert the flows of an ODMatrix into od_flows and their histograms into od_flow_duration_bins"""
+        if check_existing:
+            self.cursor.execute("SELECT COUNT(*) FROM od_flows")
+            if self.cursor.fetchone()[0] > 0:
+                logger.warning("OD flows table is not empty. Skipping OD flow insertion to avoid duplicates.")
+                return 0
+
+        try:
+            logger.info(f"Inserting {len(od_matrix.flows) if od_matrix.flows is not None else 0} "
+                        f"origin-destination flows...")
+            inserted = self._upsert_od_flows(od_matrix, recompute_percentiles=not check_existing)
+            self.connection.commit()
+            return inserted
+
+        except Error as e:
+            logger.error(f"Error inserting OD flows: {e}")
+            self.connection.rollback()
+            raise
+
+    def _upsert_trip_rollup(self, cells: pd.DataFrame, batch_size: int = 50000) -> int:
+        """Add cube cells (TripRollup.to_frame) to trip_rollup"""
+        rows = list(zip(
+            pd.to_datetime(cells['trip_date']).dt.date.tolist(),
+            *(cells[column].astype(int).tolist() for column in ['hour_of_day', 'day_of_week']),
+            cells['distance_category'].astype(str).tolist(),
+            cells['vendor_id'].astype(int).tolist(),
+            cells['trip_count'].astype(int).tolist(),
+            cells['duration_sum'].astype(float).round(2).tolist(),
+            cells['duration_sq_sum'].astype(float).tolist(),
+            cells['distance_sum'].astype(float).round(3).tolist(),
+            cells['distance_sq_sum'].astype(float).tolist(),
+            cells['speed_sum'].astype(float).round(2).tolist(),
+            cells['speed_sq_sum'].astype(float).tolist(),
+            cells['passenger_sum'].astype(int).tolist(),
+            cells['efficiency_sum'].astype(float).tolist(),
+            cells['efficiency_count'].astype(int).tolist()
+        ))
+        for start_idx in range(0, len(rows), batch_size):
+            self.cursor.executemany(self.TRIP_ROLLUP_UPSERT, rows[start_idx:start_idx + batch_size])
+        return len(rows)
+
+    def insert_trip_rollup(self, rollup, check_existing: bool = True) -> int:
+        """Insert the cells of a TripRollup into trip_rollup"""
+        if check_existing:
+            self.cursor.execute("SELECT COUNT(*) FROM trip_rollup")
+            if self.cursor.fetchone()[0] > 0:
+                logger.warning("Trip rollup table is not empty. Skipping rollup insertion to avoid duplicates.")
+                return 0
 
         try:
-            logger.info(f"Inserting {len(excluded_records)} excluded records...")
-
-            batch_data = []
-            for record in excluded_records:
-                import json
-                data = (
-                    int(record['index']),
-                    str(record['reason']),
-                    datetime.fromisoformat(record['timestamp']),
-                    json.dumps(record['details'])
-                )
-                batch_data.append(data)
+            cells = rollup.to_frame()
+            logger.info(f"Inserting {len(cells)} trip rollup cells...")
+            inserted = self._upsert_trip_rollup(cells)
+            self.connection.commit()
+            return inserted
+
+        except Error as e:
+            logger.error(f"Error inserting trip rollup: {e}")
+            self.connection.rollback()
+            raise
+
+    def _explain(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        """EXPLAIN plan rows of a SELECT, on a separate cursor"""
+        cursor = self.connection.cursor(buffered=True)
+        try:
+            cursor.execute(f"EXPLAIN {query}", params)
+            columns = [column[0] for column in cursor.description]
+            return [{column: float(value) if isinstance(value, Decimal) else value
+                     for column, value in zip(columns, row)}
+                    for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def _record_query(self, query: str, params: tuple, seconds: float, rows: int):
+        """Add a read query to query_stats; log it with its EXPLAIN plan if it was slow"""
+        self.query_stats['queries'] += 1
+        self.query_stats['sql_time'] += seconds
+        self.query_stats['rows'] += rows
+        if self.slow_query_threshold is None or seconds < self.slow_query_threshold:
+            return
+
+        statement = ' '.join(query.split())
+        plan = None
+        if statement.upper().startswith('SELECT'):
+            try:
+                plan = self._explain(query, params)
+            except Error as e:
+                logger.warning(f"Could not explain slow query: {e}")
+        logger.warning(f"Slow query ({seconds * 1000:.1f} ms, {rows} rows): {statement} "
+                       f"params={params!r} plan={plan}")
+        self.slow_queries.append({'query': statement, 'params': [str(param) for param in params or ()],
+                                  'duration_ms': round(seconds * 1000, 3), 'rows': rows, 'plan': plan})
+
+    def _run_query(self, query: str, params: tuple = (), fetch_one: bool = False):
+        """Execute a read query on self.cursor and fetch its rows (or the first row), timing both"""
+        start = time.perf_counter()
+        self.cursor.execute(query, params)
+        if fetch_one:
+            result = self.cursor.fetchone()
+            rows = int(result is not None)
+            # The rest of an unbuffered result must be read before the next statement
+            self.cursor.fetchall()
+        else:
+            result = self.cursor.fetchall()
+            rows = len(result)
+        self._record_query(query, params, time.perf_counter() - start, rows)
+        return result
+
+    def _fetch_dicts(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        """Run a query and return its rows as dicts, with DECIMAL values as floats"""
+        rows = self._run_query(query, params)
+        columns = [column[0] for column in self.cursor.description]
+        return [{column: float(value) if isinstance(value, Decimal) else value
+                 for column, value in zip(columns, row)}
+                for row in rows]
+
+    def get_od_flows(self, pickup_cell: Tuple[int, int] = None, dropoff_cell: Tuple[int, int] = None,
+                     hour: int = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Flows from the precomputed od_flows table, busiest first; never scans trips.
+
+        Either cell may be omitted to list every flow out of a pickup cell or into a
+        dropoff cell. With hour, only the hour bucket containing it is read; without it,
+        the buckets of each cell pair are summed, and the percentiles of the returned pairs
+        are computed from their duration histograms summed over the buckets.
+        """
+        conditions, params = [], []
+        if pickup_cell is not None:
+            conditions.append("pickup_cell_x = %s AND pickup_cell_y = %s")
+            params.extend(pickup_cell)
+        if dropoff_cell is not None:
+            conditions.append("dropoff_cell_x = %s AND dropoff_cell_y = %s")
+            params.extend(dropoff_cell)
+        if hour is not None:
+            conditions.append("hour_start <= %s AND hour_end > %s")
+            params.extend([hour, hour])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        if hour is not None:
+            query = f"""
+                    SELECT pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y, hour_start, hour_end,
+                           trip_count, avg_trip_duration, avg_trip_distance, avg_speed_kmh,
+                           duration_p50, duration_p90
+                    FROM od_flows {where}
+                    ORDER BY trip_count DESC
+                    """
+        else:
+            query = f"""
+                    SELECT pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y,
+                           SUM(trip_count) AS trip_count,
+                           SUM(total_trip_duration) / SUM(trip_count) AS avg_trip_duration,
+                           SUM(total_trip_distance) / SUM(trip_count) AS avg_trip_distance,
+                           SUM(total_trip_speed) / SUM(trip_count) AS avg_speed_kmh
+                    FROM od_flows {where}
+                    GROUP BY pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y
+                    ORDER BY trip_count DESC
+                    """
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        flows = self._fetch_dicts(query, tuple(params))
+        if hour is None and flows:
+            self._add_day_percentiles(flows)
+        return flows
+
+    def _add_day_percentiles(self, flows: List[Dict[str, Any]]):
+        """Set the duration percentiles of cell-pair flows from their histograms over all hour buckets"""
+        pair_columns = ODMatrix.KEY[:4]
+        pairs = [tuple(flow[column] for column in pair_columns) for flow in flows]
+        query = f"""
+                SELECT pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y, duration_bin,
+                       SUM(trip_count) AS trip_count
+                FROM od_flow_duration_bins
+                WHERE (pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y)
+                          IN ({', '.join(['(%s, %s, %s, %s)'] * len(pairs))})
+                GROUP BY pickup_cell_x, pickup_cell_y, dropoff_cell_x, dropoff_cell_y, duration_bin
+                """
+        rows = self._run_query(query, tuple(value for pair in pairs for value in pair))
+        duration_bins = pd.DataFrame(rows, columns=pair_columns + ['duration_bin', 'trip_count'])
+        duration_bins = duration_bins.astype(np.int64).set_index(pair_columns + ['duration_bin'])['trip_count']
+        percentiles = ODMatrix.bin_percentiles(duration_bins, pair_columns).round(2)
+
+        for flow, pair in zip(flows, pairs):
+            for column in ODMatrix.PERCENTILES:
+                flow[column] = float(percentiles.at[pair, column]) if pair in percentiles.index else None
+
+    @classmethod
+    def _typed_column(cls, values: tuple, description: tuple):
+        """One NumPy (or pandas nullable) column from the raw bytes values of a result column.
+
+        Values are parsed by NumPy's vectorized string casts, so no Decimal, datetime or
+        int object is built per value; NULLs become NaN, NaT, <NA> or None.
+        """
+        type_code, flags = description[1], description[7]
+        column = np.array(values, dtype=object)
+        nulls = pd.isna(column)
+        has_nulls = nulls.any()
+
+        if type_code in cls.RESULT_INT_BITS or type_code in cls.RESULT_FLOAT_TYPES \
+                or type_code in cls.RESULT_DATETIME_TYPES:
+            if has_nulls:
+                column[nulls] = b'NaT' if type_code in cls.RESULT_DATETIME_TYPES else b'0'
+            try:
+                column = column.astype(np.bytes_)
+            except ValueError:
+                # Connector builds that return bytearray values
+                column = np.array([bytes(value) for value in column])
+
+            if type_code in cls.RESULT_DATETIME_TYPES:
+                return column.astype('datetime64[ns]')
+            if type_code in cls.RESULT_FLOAT_TYPES:
+                column = column.astype(np.float64)
+                column[nulls] = np.nan
+                return column
+
+            unsigned = 'u' if flags & FieldFlag.UNSIGNED else ''
+            column = column.astype(np.int64).astype(f'{unsigned}int{cls.RESULT_INT_BITS[type_code]}')
+            return pd.arrays.IntegerArray(column, nulls) if has_nulls else column
+
+        # Text, enum and everything else: decoded Python strings
+        text = np.empty(len(column), dtype=object)
+        text[~nulls] = [value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else value
+                        for value in column[~nulls]]
+        return text
+
+    def iter_query_df(self, query: str, params: tuple = None, chunksize: int = 50000) -> Iterator[pd.DataFrame]:
+        """Run a query on an unbuffered server-side cursor and yield typed frames of up to chunksize rows.
+
+        Rows stream from the server as they are consumed, so a large result is never held
+        in memory at once. An empty result yields one empty frame with the result's columns.
+        Abandoning the generator discards the rest of the result.
+        """
+        cursor = self.connection.cursor(raw=True, buffered=False)
+        sql_time, fetched, executed = 0.0, 0, False
+        try:
+            start = time.perf_counter()
+            cursor.execute(query, params or ())
+            executed = True
+            description = cursor.description
+            names = [column[0] for column in description]
+            rows = cursor.fetchmany(chunksize)
+            sql_time += time.perf_counter() - start
+            if not rows:
+                yield pd.DataFrame(columns=names)
+            while rows:
+                fetched += len(rows)
+                start = time.perf_counter()
+                frame = pd.DataFrame({name: self._typed_column(values, column)
+                                      for name, values, column in zip(names, zip(*rows), description)})
+                self.query_stats['decode_time'] += time.perf_counter() - start
+                yield frame
+                start = time.perf_counter()
+                rows = cursor.fetchmany(chunksize)
+                sql_time += time.perf_counter() - start
+        finally:
+            if self.connection.unread_result:
+                self.connection.consume_results()
+            cursor.close()
+            if executed:
+                self._record_query(query, params, sql_time, fetched)
+
+    def query_to_df(self, query: str, params: tuple = None, chunksize: int = 50000) -> pd.DataFrame:
+        """Run a query and return its result as one typed DataFrame (see iter_query_df)"""
+        try:
+            frames = list(self.iter_query_df(query, params, chunksize))
+        except Error as e:
+            logger.error(f"Error running query: {e}")
+            raise
+
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+    @staticmethod
+    def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """JSON-ready row dicts: ISO datetimes, Python scalars and None for missing values"""
+        out = df.copy()
+        for column in out.columns:
+            if pd.api.types.is_datetime64_any_dtype(out[column]):
+                out[column] = out[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+        out = out.astype(object)
+        return out.where(out.notna(), None).to_dict(orient='records')
+
+    def _filter_clause(self, filters: Dict[str, Any]) -> Tuple[str, list]:
+        """WHERE clause and parameters for TRIP_FILTERS (None values are ignored)"""
+        conditions, params = [], []
+        for name, value in filters.items():
+            if name not in self.TRIP_FILTERS:
+                raise ValueError(f"Unknown trip filter: {name}")
+            if value is not None:
+                conditions.append(self.TRIP_FILTERS[name])
+                params.append(int(value) if isinstance(value, bool) else value)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    @staticmethod
+    def encode_page_cursor(pickup_datetime: str, trip_id: str) -> str:
+        """Opaque continuation token for the (pickup_datetime, id) key of the last trip on a page"""
+        return base64.urlsafe_b64encode(json.dumps([pickup_datetime, trip_id]).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_page_cursor(cursor: str) -> Tuple[datetime, str]:
+        try:
+            pickup_datetime, trip_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(pickup_datetime), str(trip_id)
+        except (binascii.Error, UnicodeError, TypeError, ValueError):
+            raise ValueError("Invalid page cursor")
+
+    def get_trip_data(self, limit: int = 100, cursor: str = None, as_frame: bool = False, **filters) -> Dict[str, Any]:
+        """One page of trips matching the given TRIP_FILTERS (None values are ignored), newest first.
+
+        Pages are keyset-paginated on (pickup_datetime, id): a page starts right after the
+        key in cursor, so the index seek costs the same at any depth. InnoDB secondary
+        indexes end with the primary key, so idx_pickup_datetime already orders by both.
+        next_cursor is None on the last page. Rows are JSON-ready dicts, or a DataFrame with as_frame.
+        """
+        where, params = self._filter_clause(filters)
+        if cursor is not None:
+            where += " AND " if where else " WHERE "
+            where += "(pickup_datetime, id) < (%s, %s)"
+            params.extend(self.decode_page_cursor(cursor))
+
+        query = f"SELECT * FROM trips{where} ORDER BY pickup_datetime DESC, id DESC LIMIT %s"
+        params.append(limit + 1)
+        rows = self.query_to_df(query, tuple(params))
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows.iloc[:limit]
+            last = rows.iloc[-1]
+            next_cursor = self.encode_page_cursor(last['pickup_datetime'].strftime('%Y-%m-%dT%H:%M:%S'),
+                                                  str(last['id']))
+        return {'rows': rows if as_frame else self._records(rows), 'next_cursor': next_cursor}
+
+    def iter_trips_csv(self, chunksize: int = 50000, **filters) -> Iterator[str]:
+        """CSV text of the trips matching TRIP_FILTERS: the header, then one block per chunk of rows.
+
+        Rows stream from an unbuffered cursor (iter_query_df), so only one chunk is held
+        in memory however many trips match.
+        """
+        where, params = self._filter_clause(filters)
+        header = True
+        for frame in self.iter_query_df(f"SELECT * FROM trips{where}", tuple(params), chunksize):
+            yield frame.to_csv(index=False, header=header)
+            header = False
+
+    def count_trips(self, exact: bool = False, **filters) -> Tuple[int, bool]:
+        """Number of trips matching TRIP_FILTERS and whether it is an estimate.
+
+        Unless exact is set, no rows are counted: the whole table's size comes from
+        InnoDB's table statistics and a filtered count from the optimizer's row estimate
+        (EXPLAIN rows scaled by its filtered percentage).
+        """
+        where, params = self._filter_clause(filters)
+        if exact:
+            return int(self._run_query(f"SELECT COUNT(*) FROM trips{where}", tuple(params), fetch_one=True)[0]), False
+
+        if not where:
+            row = self._run_query("""
+                                  SELECT TABLE_ROWS
+                                  FROM information_schema.TABLES
+                                  WHERE TABLE_SCHEMA = DATABASE()
+                                    AND TABLE_NAME = 'trips'
+                                  """, fetch_one=True)
+            return int(row[0] or 0) if row else 0, True
+
+        row = self._run_query(f"EXPLAIN SELECT 1 FROM trips{where}", tuple(params), fetch_one=True)
+        columns = [column[0] for column in self.cursor.description]
+        plan = dict(zip(columns, row))
+        return int(round(float(plan.get('rows') or 0) * float(plan.get('filtered') or 100) / 100)), True
+
+    def get_dashboard_metrics(self, **filters) -> Dict[str, Any]:
+        """Dashboard KPIs of the trips matching TRIP_FILTERS, aggregated entirely in SQL.
+
+        Only aggregate rows cross the wire: one totals row, one row per day and one per
+        pickup borough. Date and vendor filters are plain range/equality conditions on
+        pickup_datetime and vendor_id, so idx_pickup_datetime and idx_vendor_datetime
+        serve them (the per-day count is covered by either index).
+        """
+        where, params = self._filter_clause(filters)
+        params = tuple(params)
+
+        total_trips, total_distance, avg_duration_min = self._run_query(f"""
+                            SELECT COUNT(*), SUM(trip_distance_km), AVG(trip_duration) / 60
+                            FROM trips{where}
+                            """, params, fetch_one=True)
+
+        per_day = [(str(trip_date), int(trips)) for trip_date, trips in self._run_query(f"""
+                            SELECT DATE(pickup_datetime) AS trip_date, COUNT(*)
+                            FROM trips{where}
+                            GROUP BY trip_date
+                            ORDER BY trip_date
+                            """, params)]
+
+        per_borough = self._run_query(f"""
+                            SELECT pickup_borough_id, COUNT(*)
+                            FROM trips{where}
+                            GROUP BY pickup_borough_id
+                            """, params)
+
+        borough_names = self.get_region_names('borough')
+        return {
+            'total_trips': int(total_trips),
+            'total_distance_km': round(float(total_distance or 0), 2),
+            'avg_duration_min': round(float(avg_duration_min), 2) if avg_duration_min is not None else None,
+            'per_day': per_day,
+            'per_borough': [(borough_names.get(int(borough_id), 'Unknown'), int(trips))
+                            for borough_id, trips in per_borough]
+        }
+
+    def _statistics_sums(self, table: str, group_by: str, conditions: List[str], params: list) -> pd.DataFrame:
+        """TripRollup.SUM_COLUMNS of trips or of trip_rollup cells, optionally per group"""
+        if table == 'trips':
+            select = [f"{expression} AS {column}" for column, expression in self.TRIP_SUMS.items()]
+        else:
+            select = [f"SUM({column}) AS {column}" for column in TripRollup.SUM_COLUMNS]
+        if group_by:
+            expression = group_by if table == 'trips' else self.STATISTICS_GROUPS[group_by]
+            select.insert(0, f"{expression} AS {group_by}")
+
+        query = f"SELECT {', '.join(select)} FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if group_by:
+            query += f" GROUP BY {group_by}"
+        return self.query_to_df(query, tuple(params))
+
+    def get_trip_statistics(self, start_date: str = None, end_date: str = None, group_by: str = None,
+                            metrics: List[str] = None, as_frame: bool = False):
+        """Aggregates of trips in a pickup datetime range, optionally per value of one column.
+
+        Whole pickup hours are answered from the trip_rollup cube; only the partial hours at
+        either end of the range are read from trips (through idx_pickup_datetime). Grouping
+        by a column the cube does not hold aggregates raw trips instead. Both paths compute
+        the cube's sums, so every metric is derived the same way. Returns JSON-ready row
+        dicts, or a DataFrame with as_frame.
+        """
+        metrics = metrics or ['trip_count', 'avg_duration', 'avg_distance', 'avg_speed']
+        unknown = [metric for metric in metrics if metric not in self.STATISTICS_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {unknown}")
+        if group_by is not None and group_by not in self.STATISTICS_GROUPS:
+            raise ValueError(f"Cannot group by {group_by}")
+        start = pd.Timestamp(start_date).to_pydatetime() if start_date else None
+        end = pd.Timestamp(end_date).to_pydatetime() if end_date else None
+
+        def trip_range(lower, upper, upper_inclusive=True):
+            conditions, params = [], []
+            if lower is not None:
+                conditions.append("pickup_datetime >= %s")
+                params.append(lower)
+            if upper is not None:
+                conditions.append("pickup_datetime <= %s" if upper_inclusive else "pickup_datetime < %s")
+                params.append(upper)
+            return self._statistics_sums('trips', group_by, conditions, params)
+
+        cube_start = pd.Timestamp(start).ceil('h').to_pydatetime() if start is not None else None
+        cube_end = pd.Timestamp(end).floor('h').to_pydatetime() if end is not None else None
+        if (group_by and self.STATISTICS_GROUPS[group_by] is None) or \
+                (cube_start is not None and cube_end is not None and cube_start >= cube_end):
+            frames = [trip_range(start, end)]
+        else:
+            conditions, params = [], []
+            if cube_start is not None:
+                conditions.append("(trip_date, hour_of_day) >= (%s, %s)")
+                params.extend([cube_start.date(), cube_start.hour])
+            if cube_end is not None:
+                conditions.append("(trip_date, hour_of_day) < (%s, %s)")
+                params.extend([cube_end.date(), cube_end.hour])
+            frames = [self._statistics_sums('trip_rollup', group_by, conditions, params)]
+            if start is not None and start < cube_start:
+                frames.append(trip_range(start, cube_start, upper_inclusive=False))
+            if cube_end is not None:
+                frames.append(trip_range(cube_end, end))
+
+        combined = pd.concat([frame for frame in frames if len(frame)] or frames[:1], ignore_index=True)
+        sums = combined[TripRollup.SUM_COLUMNS].astype(np.float64)
+        if group_by:
+            sums = sums.groupby(combined[group_by]).sum()
+            sums = sums[sums['trip_count'] > 0]
+        else:
+            sums = sums.sum().to_frame().T
+
+        values = TripRollup.metrics(sums)
+        result = pd.DataFrame({metric: values[metric] for metric in metrics}, index=sums.index)
+        if group_by:
+            result = result.reset_index()
+        return result if as_frame else self._records(result)
+
+    def save_regions(self, regions: list) -> int:
+        """Store (replace) the names of the (region_type, region_id, name) borough and zone ids"""
+        try:
+            if regions:
+                self.cursor.executemany("""
+                                        INSERT INTO regions (region_type, region_id, name)
+                                        VALUES (%s, %s, %s) ON DUPLICATE KEY
+                                        UPDATE name = VALUES(name)
+                                        """, [(region_type, int(region_id), name)
+                                              for region_type, region_id, name in regions])
+                self.connection.commit()
+            return len(regions)
+
+        except Error as e:
+            logger.error(f"Error saving regions: {e}")
+            self.connection.rollback()
+            raise
+
+    def get_region_names(self, region_type: str = 'borough') -> Dict[int, str]:
+        rows = self._run_query("SELECT region_id, name FROM regions WHERE region_type = %s", (region_type,))
+        return {int(region_id): name for region_id, name in rows}
+
+    @staticmethod
+    def _details_json(batch: Dict[str, Any]) -> list:
+        """Serialize the columnar details of an exclusion batch to one JSON string per record"""
+        count = len(batch['index'])
+        if not batch['details']:
+            return ['{}'] * count
+
+        details = pd.DataFrame(batch['details'], index=range(count))
+        return details.to_json(orient='records', lines=True, double_precision=15).splitlines()
+
+    @classmethod
+    def _excluded_rows(cls, exclusions: list) -> list:
+        """Build INSERT parameter tuples for columnar exclusion batches"""
+        rows = []
+        for batch in exclusions:
+            count = len(batch['index'])
+            rows.extend(zip(
+                batch['index'].tolist(),
+                [str(batch['reason'])] * count,
+                [datetime.fromisoformat(batch['timestamp'])] * count,
+                cls._details_json(batch)
+            ))
+        return rows
+
+    def insert_excluded_records(self, exclusions: list, check_existing: bool = True) -> int:
+        """Insert columnar exclusion batches (see NYCTaxiDataProcessor._log_exclusions)"""
+
+        if check_existing:
+            records = self.get_stats()
+            if records.get('total_excluded') > 0:
+                logger.warning("Excluded records table is not empty. Skipping excluded records insertion to avoid duplicates.")
+                return 0
+
+        try:
+            total_records = sum(len(batch['index']) for batch in exclusions)
+            logger.info(f"Inserting {total_records} excluded records...")
+
+            batch_data = self._excluded_rows(exclusions)
 
             if batch_data:
-                self.cursor.executemany(insert_query, batch_data)
+                self.cursor.executemany(self.EXCLUDED_INSERT, batch_data)
                 self.connection.commit()
                 logger.info(f"Successfully inserted {len(batch_data)} excluded records")
                 return len(batch_data)
@@ -270,19 +1422,219 @@ class TaxiTripDatabase:
             self.connection.rollback()
             raise
 
-    def insert_data(self, df: pd.DataFrame, processor) -> Dict[str, int]:
+    def get_checkpoint(self, filepath: str, chunksize: int) -> Dict[str, Any]:
+        """Return the ingest checkpoint of a source file, or a fresh one if it was never seen.
+
+        Files are identified by absolute path, size and modification time, so a replaced
+        file starts a new checkpoint. A resumed file keeps the chunksize it was started with.
+        """
+        file_size = os.path.getsize(filepath)
+        source_file = os.path.abspath(filepath)
+        source_key = hashlib.sha1(
+            f"{source_file}|{file_size}|{os.path.getmtime(filepath)}".encode('utf-8')
+        ).hexdigest()
+
+        self.cursor.execute("""
+                            SELECT chunksize, chunks_committed, rows_committed, trips_inserted, status
+                            FROM ingest_checkpoints
+                            WHERE source_key = %s
+                            """, (source_key,))
+        row = self.cursor.fetchone()
+
+        checkpoint = {
+            'source_key': source_key,
+            'source_file': source_file,
+            'file_size': file_size,
+            'chunksize': chunksize,
+            'chunks_committed': 0,
+            'rows_committed': 0,
+            'trips_inserted': 0,
+            'status': 'running'
+        }
+        if row is not None:
+            checkpoint.update(chunksize=int(row[0]), chunks_committed=int(row[1]),
+                              rows_committed=int(row[2]), trips_inserted=int(row[3]), status=row[4])
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]):
+        self.cursor.execute("""
+                            INSERT INTO ingest_checkpoints (source_key, source_file, file_size, chunksize,
+                                                            chunks_committed, rows_committed, trips_inserted,
+                                                            status, updated_at)
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY
+                            UPDATE chunks_committed = VALUES(chunks_committed),
+                                   rows_committed = VALUES(rows_committed),
+                                   trips_inserted = VALUES(trips_inserted),
+                                   status = VALUES(status),
+                                   updated_at = VALUES(updated_at)
+                            """, (checkpoint['source_key'], checkpoint['source_file'], checkpoint['file_size'],
+                                  checkpoint['chunksize'], checkpoint['chunks_committed'],
+                                  checkpoint['rows_committed'], checkpoint['trips_inserted'],
+                                  checkpoint['status'], datetime.now()))
+
+    def complete_checkpoint(self, checkpoint: Dict[str, Any]):
+        checkpoint['status'] = 'complete'
+        self._save_checkpoint(checkpoint)
+        self.connection.commit()
+
+    def _bump_data_version(self):
+        # create_schema never runs the dump's DROP TABLE chunks (they start with a comment), so this
+        # row survives it just as the tables incremental ingest appends to do. Microsecond timestamps
+        # keep versions increasing if the table is recreated elsewhere, e.g. by loading the dump directly.
+        self.cursor.execute("""
+                            INSERT INTO data_version (id, version, updated_at)
+                            VALUES (1, %s, UTC_TIMESTAMP()) ON DUPLICATE KEY
+                            UPDATE version = GREATEST(version + 1, VALUES(version)),
+                                   updated_at = VALUES(updated_at)
+                            """, (time.time_ns() // 1000,))
+
+    def bump_data_version(self):
+        """Mark the data as changed, invalidating every cached API result"""
+        try:
+            self._bump_data_version()
+            self.connection.commit()
+
+        except Error as e:
+            logger.error(f"Error bumping data version: {e}")
+            self.connection.rollback()
+            raise
+
+    def get_data_version(self) -> Tuple[int, datetime]:
+        """(version, UTC time of the last change) of the data; (0, None) before the first ingest"""
+        row = self._run_query("SELECT version, updated_at FROM data_version WHERE id = 1", fetch_one=True)
+        return (int(row[0]), row[1]) if row else (0, None)
+
+    def existing_trip_ids(self, ids, batch_size: int = 5000) -> set:
+        """Subset of the given trip ids already present in trips"""
+        ids = [str(trip_id) for trip_id in ids]
+        existing = set()
+        for start_idx in range(0, len(ids), batch_size):
+            batch = ids[start_idx:start_idx + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch))
+            self.cursor.execute(f"SELECT id FROM trips WHERE id IN ({placeholders})", batch)
+            existing.update(row[0] for row in self.cursor.fetchall())
+        return existing
+
+    def _save_quantile_sketches(self, sketches: Dict[str, KLLSketch]):
+        rows = [(metric, sketch.k, sketch.count, json.dumps(sketch.to_dict()), datetime.now())
+                for metric, sketch in sketches.items()]
+        if rows:
+            self.cursor.executemany("""
+                                    INSERT INTO quantile_sketches (metric, sketch_k, value_count, sketch, updated_at)
+                                    VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY
+                                    UPDATE sketch_k = VALUES(sketch_k),
+                                           value_count = VALUES(value_count),
+                                           sketch = VALUES(sketch),
+                                           updated_at = VALUES(updated_at)
+                                    """, rows)
+
+    def save_quantile_sketches(self, sketches: Dict[str, KLLSketch]) -> int:
+        """Store (replace) the quantile sketch of each metric"""
+        try:
+            self._save_quantile_sketches(sketches)
+            self.connection.commit()
+            logger.info(f"Saved quantile sketches for {list(sketches)}")
+            return len(sketches)
+
+        except Error as e:
+            logger.error(f"Error saving quantile sketches: {e}")
+            self.connection.rollback()
+            raise
+
+    def get_quantile_sketches(self, metrics: List[str] = None) -> Dict[str, KLLSketch]:
+        query = "SELECT metric, sketch FROM quantile_sketches"
+        params = ()
+        if metrics:
+            query += f" WHERE metric IN ({', '.join(['%s'] * len(metrics))})"
+            params = tuple(metrics)
+
+        return {metric: KLLSketch.from_dict(json.loads(sketch)) for metric, sketch in self._run_query(query, params)}
+
+    def get_percentiles(self, metric: str, fractions: List[float]) -> Dict[str, Any]:
+        """Approximate percentiles of a trip metric from its stored sketch, without scanning trips"""
+        sketch = self.get_quantile_sketches([metric]).get(metric)
+        if sketch is None:
+            return {}
+
+        return {
+            'metric': metric,
+            'count': sketch.count,
+            'min': sketch.min if sketch.count else None,
+            'max': sketch.max if sketch.count else None,
+            'rank_error': round(sketch.normalized_rank_error, 4),
+            'percentiles': {f"p{fraction * 100:g}": value
+                            for fraction, value in zip(fractions, sketch.quantiles(fractions))}
+        }
+
+    def append_chunk(self, df: pd.DataFrame, grid_stats: pd.DataFrame, spatial_index, exclusions: list,
+                     checkpoint: Dict[str, Any], batch_size: int = 50000,
+                     sketches: Dict[str, KLLSketch] = None, tiles: pd.DataFrame = None,
+                     od_matrix: ODMatrix = None, rollup: pd.DataFrame = None) -> int:
+        """Append one ingest chunk and advance its checkpoint in a single transaction.
+
+        The caller drops trips whose id already exists; grid aggregates are added to the
+        existing cells rather than recomputed, and OD flow percentiles are recomputed from the
+        flows' merged duration histograms. If anything fails the whole chunk is rolled
+        back and will be redone on resume. Quantile sketches, if given, already include the
+        chunk and are stored in the same transaction.
+        """
+        try:
+            for start_idx in range(0, len(df), batch_size):
+                self.cursor.executemany(self.TRIPS_INSERT,
+                                        self._trip_records(df.iloc[start_idx:start_idx + batch_size]))
+            if grid_stats is not None and len(grid_stats):
+                self._upsert_grid_stats(grid_stats, spatial_index)
+            if tiles is not None and len(tiles):
+                self._upsert_tiles(tiles)
+            if od_matrix is not None and od_matrix.flows is not None:
+                self._upsert_od_flows(od_matrix)
+            if rollup is not None and len(rollup):
+                self._upsert_trip_rollup(rollup)
+
+            excluded_rows = self._excluded_rows(exclusions)
+            if excluded_rows:
+                self.cursor.executemany(self.EXCLUDED_INSERT, excluded_rows)
+
+            if sketches:
+                self._save_quantile_sketches(sketches)
+
+            self._save_checkpoint(checkpoint)
+            self._bump_data_version()
+            self.connection.commit()
+            return len(df)
+
+        except Error as e:
+            logger.error(f"Error appending chunk {checkpoint['chunks_committed']} of "
+                         f"{checkpoint['source_file']}: {e}")
+            self.connection.rollback()
+            raise
+
+    def insert_data(self, df: pd.DataFrame, processor, bulk_load: bool = False) -> Dict[str, int]:
         summary = {}
 
         try:
-            trips_inserted = self.insert_trips_batch(df)
+            summary['regions'] = self.save_regions(processor.region_names())
+
+            if bulk_load:
+                trips_inserted = self.insert_trips_bulk(df)
+            else:
+                trips_inserted = self.insert_trips_batch(df)
             summary['trips'] = trips_inserted
 
             spatial_inserted = self.insert_spatial_grid(df, processor.spatial_index)
             summary['spatial_grid_cells'] = spatial_inserted
 
-            excluded_inserted = self.insert_excluded_records(processor.excluded_records)
+            excluded_inserted = self.insert_excluded_records(processor.exclusions)
             summary['excluded_records'] = excluded_inserted
 
+            if processor.sketches:
+                summary['quantile_sketches'] = self.save_quantile_sketches(processor.sketches)
+
+            summary['spatial_tiles'] = self.insert_spatial_tiles(processor.tile_pyramid)
+            summary['od_flows'] = self.insert_od_flows(processor.od_matrix)
+            summary['trip_rollup'] = self.insert_trip_rollup(processor.trip_rollup)
+            self.bump_data_version()
+
             logger.info(f"Database insertion complete: {summary}")
             return summary
 
@@ -320,6 +1672,18 @@ class TaxiTripDatabase:
             return {}
 
     def close(self):
+        if self.pool is not None:
+            if self.connection is not None:
+                try:
+                    if self.cursor:
+                        self.cursor.close()
+                    self.pool.release(self.connection)
+                except Error as e:
+                    logger.error(f"Error closing cursor: {e}")
+                    self.pool.release(self.connection, discard=True)
+                self.connection = self.cursor = None
+            return
+
         try:
             if self.cursor:
                 self.cursor.close()
@@ -0,0 +1,182 @@
+import logging
+from typing import Dict, Any, List, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class TilePyramid:
+    """
+    Multi-resolution pickup summaries over a fixed bounding box.
+    Zoom level z splits the box into 2^z x 2^z tiles; each non-empty tile keeps a trip
+    count and the sums of a few trip columns. Only the finest level is built from
+    trips; every coarser level is folded from the one below it (parent = child >> 1),
+    so building costs O(trips + tiles) and any map or hotspot query reads just the
+    tiles it covers.
+    """
+
+    VALUE_COLUMNS = ['passenger_count', 'trip_duration', 'trip_distance_km']
+
+    def __init__(self, bounds: Dict[str, float], max_zoom: int = 10, value_columns: List[str] = None):
+        self.bounds = dict(bounds)
+        self.max_zoom = max_zoom
+        self.value_columns = list(value_columns or self.VALUE_COLUMNS)
+
+        # Finest level: sorted tile codes, trip counts and per-column sums
+        self.codes = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.sums = np.empty((0, len(self.value_columns)), dtype=np.float64)
+        self._levels = {}
+
+    def tile_coordinates(self, lats, lons, zoom: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Tile x (longitude) and y (latitude) of points at a zoom level, clipped to the box"""
+        tiles = 1 << zoom
+        lat_span = self.bounds['lat_max'] - self.bounds['lat_min']
+        lon_span = self.bounds['lon_max'] - self.bounds['lon_min']
+        tile_x = np.floor((np.asarray(lons, dtype=np.float64) - self.bounds['lon_min']) / lon_span * tiles)
+        tile_y = np.floor((np.asarray(lats, dtype=np.float64) - self.bounds['lat_min']) / lat_span * tiles)
+        return (np.clip(tile_x, 0, tiles - 1).astype(np.int64),
+                np.clip(tile_y, 0, tiles - 1).astype(np.int64))
+
+    def tile_bounds(self, zoom: int, tile_x, tile_y) -> Tuple[Any, Any, Any, Any]:
+        """(lat_min, lat_max, lon_min, lon_max) of tiles; works on scalars or arrays"""
+        tiles = 1 << zoom
+        lat_step = (self.bounds['lat_max'] - self.bounds['lat_min']) / tiles
+        lon_step = (self.bounds['lon_max'] - self.bounds['lon_min']) / tiles
+        lat_min = self.bounds['lat_min'] + np.asarray(tile_y) * lat_step
+        lon_min = self.bounds['lon_min'] + np.asarray(tile_x) * lon_step
+        return lat_min, lat_min + lat_step, lon_min, lon_min + lon_step
+
+    def tile_range(self, zoom: int, min_lat: float, max_lat: float,
+                   min_lon: float, max_lon: float) -> Optional[Tuple[int, int, int, int]]:
+        """Inclusive (x_min, x_max, y_min, y_max) tile range covering a bounding box.
+
+        None if the box does not overlap the pyramid's bounds (or is inverted): it covers
+        no tile, and clipping it would yield the edge tiles instead.
+        """
+        if (min_lat > max_lat or min_lon > max_lon or
+                max_lat < self.bounds['lat_min'] or min_lat > self.bounds['lat_max'] or
+                max_lon < self.bounds['lon_min'] or min_lon > self.bounds['lon_max']):
+            return None
+        (x_min, x_max), (y_min, y_max) = self.tile_coordinates([min_lat, max_lat], [min_lon, max_lon], zoom)
+        return int(x_min), int(x_max), int(y_min), int(y_max)
+
+    @staticmethod
+    def _group(codes: np.ndarray, counts: np.ndarray, sums: np.ndarray):
+        unique_codes, inverse = np.unique(codes, return_inverse=True)
+        grouped_counts = np.bincount(inverse, weights=counts, minlength=len(unique_codes)).astype(np.int64)
+        grouped_sums = np.column_stack([np.bincount(inverse, weights=sums[:, i], minlength=len(unique_codes))
+                                        for i in range(sums.shape[1])]).reshape(len(unique_codes), sums.shape[1])
+        return unique_codes, grouped_counts, grouped_sums
+
+    def add(self, df: pd.DataFrame):
+        """Add the pickups of a derived trips frame; points outside the box are ignored"""
+        lats = df['pickup_latitude'].to_numpy(dtype=np.float64)
+        lons = df['pickup_longitude'].to_numpy(dtype=np.float64)
+        inside = ((lats >= self.bounds['lat_min']) & (lats <= self.bounds['lat_max']) &
+                  (lons >= self.bounds['lon_min']) & (lons <= self.bounds['lon_max']))
+        if not inside.any():
+            return self
+
+        tile_x, tile_y = self.tile_coordinates(lats[inside], lons[inside], self.max_zoom)
+        codes = (tile_x << self.max_zoom) | tile_y
+        values = np.column_stack([df[column].to_numpy(dtype=np.float64)[inside]
+                                  for column in self.value_columns])
+        self._merge_finest(codes, np.ones(len(codes), dtype=np.int64), values)
+        return self
+
+    def merge(self, other: 'TilePyramid'):
+        """Fold another pyramid built over the same box and zoom, e.g. from another worker"""
+        if other.bounds != self.bounds or other.max_zoom != self.max_zoom:
+            raise ValueError("Cannot merge tile pyramids with different bounds or zoom levels")
+        self._merge_finest(other.codes, other.counts, other.sums)
+        return self
+
+    def _merge_finest(self, codes: np.ndarray, counts: np.ndarray, sums: np.ndarray):
+        self.codes, self.counts, self.sums = self._group(np.concatenate((self.codes, codes)),
+                                                         np.concatenate((self.counts, counts)),
+                                                         np.concatenate((self.sums, sums)))
+        self._levels = {}
+
+    def level(self, zoom: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sorted tile codes (tile_x << zoom | tile_y), counts and sums of one zoom level"""
+        if not 0 <= zoom <= self.max_zoom:
+            raise ValueError(f"zoom must be between 0 and {self.max_zoom}")
+        if zoom == self.max_zoom:
+            return self.codes, self.counts, self.sums
+        if zoom not in self._levels:
+            codes, counts, sums = self.level(zoom + 1)
+            tile_x, tile_y = codes >> (zoom + 1), codes & ((1 << (zoom + 1)) - 1)
+            self._levels[zoom] = self._group(((tile_x >> 1) << zoom) | (tile_y >> 1), counts, sums)
+        return self._levels[zoom]
+
+    def _frame(self, zoom: int, codes: np.ndarray, counts: np.ndarray, sums: np.ndarray) -> pd.DataFrame:
+        tile_x, tile_y = codes >> zoom, codes & ((1 << zoom) - 1)
+        lat_min, lat_max, lon_min, lon_max = self.tile_bounds(zoom, tile_x, tile_y)
+        frame = pd.DataFrame({
+            'zoom': zoom, 'tile_x': tile_x, 'tile_y': tile_y,
+            'lat_min': lat_min, 'lat_max': lat_max, 'lon_min': lon_min, 'lon_max': lon_max,
+            'trip_count': counts
+        })
+        for i, column in enumerate(self.value_columns):
+            frame[f'total_{column}'] = sums[:, i]
+        return frame
+
+    def tiles(self, zoom: int, min_lat: float = None, max_lat: float = None,
+              min_lon: float = None, max_lon: float = None) -> pd.DataFrame:
+        """Non-empty tiles of a zoom level, optionally only those overlapping a bounding box"""
+        codes, counts, sums = self.level(zoom)
+        if min_lat is not None:
+            tile_range = self.tile_range(zoom, min_lat, max_lat, min_lon, max_lon)
+            if tile_range is None:
+                return self._frame(zoom, codes[:0], counts[:0], sums[:0])
+            x_min, x_max, y_min, y_max = tile_range
+            # One contiguous run of codes per tile column
+            columns = np.arange(x_min, x_max + 1, dtype=np.int64)
+            starts = np.searchsorted(codes, (columns << zoom) | y_min, side='left')
+            ends = np.searchsorted(codes, (columns << zoom) | y_max, side='right')
+            lengths = ends - starts
+            positions = (np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) +
+                         np.arange(lengths.sum(), dtype=np.int64))
+            codes, counts, sums = codes[positions], counts[positions], sums[positions]
+        return self._frame(zoom, codes, counts, sums)
+
+    def aggregate(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+                  zoom: int = None) -> Dict[str, Any]:
+        """Trip count and sums over the tiles overlapping a bounding box.
+
+        Tiles are counted whole, so the result is exact up to the tile size of the zoom
+        level used (the finest by default).
+        """
+        zoom = self.max_zoom if zoom is None else zoom
+        tiles = self.tiles(zoom, min_lat, max_lat, min_lon, max_lon)
+        summary = {'zoom': zoom, 'tiles': len(tiles), 'trip_count': int(tiles['trip_count'].sum())}
+        for column in self.value_columns:
+            summary[f'total_{column}'] = float(tiles[f'total_{column}'].sum())
+        return summary
+
+    def hotspots(self, zoom: int, top: int = 10, **bbox) -> pd.DataFrame:
+        """The top tiles by trip count at a zoom level"""
+        return self.tiles(zoom, **bbox).nlargest(top, 'trip_count')
+
+    def to_frame(self, min_zoom: int = 0) -> pd.DataFrame:
+        """Every non-empty tile of every level, for storage in spatial_tiles"""
+        return pd.concat([self._frame(zoom, *self.level(zoom)) for zoom in range(min_zoom, self.max_zoom + 1)],
+                         ignore_index=True)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'max_zoom': self.max_zoom,
+            'total_points': int(self.counts.sum()),
+            'tiles_per_level': {zoom: len(self.level(zoom)[0]) for zoom in range(self.max_zoom + 1)}
+        }
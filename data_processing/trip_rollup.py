@@ -0,0 +1,120 @@
+import logging
+from typing import Dict, Any, List
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('data_processing.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class TripRollup:
+    """
+    Pre-aggregated trip cube keyed by (pickup date, hour, day of week, distance category,
+    vendor). Every cell holds the trip count and the sums and sums of squares of duration,
+    distance and speed, plus passenger and efficiency sums, so counts, totals, means and
+    standard deviations over any combination of the key columns are re-aggregations of
+    the cube. Cells only ever add up, so chunks and worker partitions merge exactly.
+    """
+
+    KEY = ['trip_date', 'hour_of_day', 'day_of_week', 'distance_category', 'vendor_id']
+    SUM_COLUMNS = ['trip_count', 'duration_sum', 'duration_sq_sum', 'distance_sum', 'distance_sq_sum',
+                   'speed_sum', 'speed_sq_sum', 'passenger_sum', 'efficiency_sum', 'efficiency_count']
+
+    def __init__(self):
+        self.cells = None
+
+    @classmethod
+    def cell_statistics(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """Cube cells of a derived trips frame, indexed by KEY"""
+        durations = df['trip_duration'].to_numpy(dtype=np.float64)
+        distances = df['trip_distance_km'].to_numpy(dtype=np.float64)
+        speeds = df['trip_speed_kmh'].to_numpy(dtype=np.float64)
+        efficiency = df['efficiency_ratio'].to_numpy(dtype=np.float64)
+        has_efficiency = np.isfinite(efficiency)
+
+        trips = pd.DataFrame({
+            'trip_date': df['pickup_datetime'].dt.normalize().to_numpy(),
+            'hour_of_day': df['hour_of_day'].to_numpy(dtype=np.int64),
+            'day_of_week': df['day_of_week'].to_numpy(dtype=np.int64),
+            'distance_category': df['distance_category'].astype(str).to_numpy(),
+            'vendor_id': df['vendor_id'].to_numpy(dtype=np.int64),
+            'trip_count': 1,
+            'duration_sum': durations,
+            'duration_sq_sum': durations * durations,
+            'distance_sum': distances,
+            'distance_sq_sum': distances * distances,
+            'speed_sum': speeds,
+            'speed_sq_sum': speeds * speeds,
+            'passenger_sum': df['passenger_count'].to_numpy(dtype=np.int64),
+            'efficiency_sum': np.where(has_efficiency, efficiency, 0.0),
+            'efficiency_count': has_efficiency.astype(np.int64)
+        })
+        return trips.groupby(cls.KEY, sort=True)[cls.SUM_COLUMNS].sum()
+
+    @classmethod
+    def combine(cls, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """Add cube frames cell by cell"""
+        frames = [frame for frame in frames if frame is not None and len(frame)]
+        if len(frames) == 1:
+            return frames[0]
+        if not frames:
+            return None
+        return pd.concat(frames).groupby(level=cls.KEY, sort=True).sum()
+
+    def add(self, df: pd.DataFrame):
+        """Add the trips of a derived frame"""
+        if len(df):
+            self.cells = self.combine([self.cells, self.cell_statistics(df)])
+        return self
+
+    def merge(self, other: 'TripRollup'):
+        """Fold another cube, e.g. from another worker"""
+        self.cells = self.combine([self.cells, other.cells])
+        return self
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per cube cell, for storage in trip_rollup"""
+        if self.cells is None:
+            return pd.DataFrame(columns=self.KEY + self.SUM_COLUMNS)
+        return self.cells.reset_index()
+
+    @staticmethod
+    def metrics(sums: pd.DataFrame) -> Dict[str, pd.Series]:
+        """Statistics derivable from (re-aggregated) cube sums, by metric name"""
+        count = sums['trip_count'].astype(np.float64)
+
+        def mean(column):
+            return sums[column] / count
+
+        def std(column):
+            variance = sums[f'{column}_sq_sum'] / count - mean(f'{column}_sum') ** 2
+            return np.sqrt(variance.clip(lower=0))
+
+        return {
+            'trip_count': sums['trip_count'].astype(np.int64),
+            'avg_duration': mean('duration_sum'),
+            'avg_distance': mean('distance_sum'),
+            'avg_speed': mean('speed_sum'),
+            'std_duration': std('duration'),
+            'std_distance': std('distance'),
+            'std_speed': std('speed'),
+            'total_distance': sums['distance_sum'],
+            'total_passengers': sums['passenger_sum'].astype(np.int64),
+            'avg_efficiency': sums['efficiency_sum'] / sums['efficiency_count'].where(sums['efficiency_count'] > 0)
+        }
+
+    def get_statistics(self) -> Dict[str, Any]:
+        cells = self.cells if self.cells is not None else pd.DataFrame(columns=self.SUM_COLUMNS)
+        return {
+            'cells': len(cells),
+            'total_trips': int(cells['trip_count'].sum()),
+            'days': len(cells.index.get_level_values('trip_date').unique()) if len(cells) else 0
+        }
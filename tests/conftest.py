@@ -0,0 +1,14 @@
+import pytest
+
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Test client of the API; connections are never opened, so tests patch the queries they expect"""
+    monkeypatch.setattr(TaxiTripDatabase, 'connect', lambda self: True)
+    monkeypatch.setattr(TaxiTripDatabase, 'close', lambda self: None)
+    monkeypatch.setattr(TaxiTripDatabase, 'get_data_version', lambda self: (1, None))
+
+    from app import create_app
+    return create_app().test_client()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+from data_processing.polygon_index import PolygonIndex
+
+MANHATTAN, BRONX, BROOKLYN, QUEENS, STATEN_ISLAND = 1, 2, 3, 4, 5
+
+LANDMARKS = {
+    'Times Square': ((40.7580, -73.9855), MANHATTAN),
+    'Central Park': ((40.7800, -73.9640), MANHATTAN),
+    'Battery Park': ((40.7033, -74.0170), MANHATTAN),
+    'Roosevelt Island': ((40.7615, -73.9505), MANHATTAN),
+    'Yankee Stadium': ((40.8296, -73.9262), BRONX),
+    'Barclays Center': ((40.6826, -73.9754), BROOKLYN),
+    'Williamsburg': ((40.7081, -73.9571), BROOKLYN),
+    'JFK Terminal 4': ((40.6441, -73.7822), QUEENS),
+    'LaGuardia': ((40.7769, -73.8740), QUEENS),
+    'Astoria': ((40.7644, -73.9235), QUEENS),
+    'St. George Terminal': ((40.6437, -74.0736), STATEN_ISLAND),
+}
+
+# Inside the NYC bounding box but in no borough
+NOWHERE = {
+    'Newark': (40.6895, -74.1745),
+    'Jersey City': (40.7178, -74.0431),
+    'Westchester': (40.9500, -73.8000),
+    'Hudson River': (40.7600, -74.0090),
+    'Upper Bay': (40.6700, -74.0500),
+    'East River': (40.7400, -73.9670),
+    'Atlantic off Coney Island': (40.5800, -73.9000),
+}
+
+
+@pytest.fixture(scope='module')
+def borough_index():
+    # Built the way the processor builds it
+    return PolygonIndex.from_geojson(NYCTaxiDataProcessor.BOROUGHS_FILE, 'boro_code', 'boro_name',
+                                     NYCTaxiDataProcessor.BOROUGH_CELL_SIZE)
+
+
+def test_borough_names(borough_index):
+    assert borough_index.names == {MANHATTAN: 'Manhattan', BRONX: 'Bronx', BROOKLYN: 'Brooklyn',
+                                   QUEENS: 'Queens', STATEN_ISLAND: 'Staten Island'}
+
+
+@pytest.mark.parametrize('name', LANDMARKS)
+def test_landmark_borough(borough_index, name):
+    (lat, lon), borough = LANDMARKS[name]
+    assert borough_index.assign(np.array([lat]), np.array([lon])).tolist() == [borough]
+
+
+@pytest.mark.parametrize('name', NOWHERE)
+def test_outside_and_water_points_have_no_borough(borough_index, name):
+    lat, lon = NOWHERE[name]
+    assert borough_index.assign(np.array([lat]), np.array([lon])).tolist() == [0]
+
+
+def test_batch_matches_single_points(borough_index):
+    coordinates = [point for point, _ in LANDMARKS.values()] + list(NOWHERE.values())
+    lats, lons = np.array(coordinates).T
+    expected = [borough for _, borough in LANDMARKS.values()] + [0] * len(NOWHERE)
+
+    assert borough_index.assign(lats, lons).tolist() == expected
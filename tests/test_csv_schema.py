@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+
+CSV = """id,vendor_id,pickup_datetime,dropoff_datetime,passenger_count,pickup_longitude,pickup_latitude,\
+dropoff_longitude,dropoff_latitude,store_and_fwd_flag,trip_duration
+id1,2,2016-03-14 17:24:55,2016-03-14 17:32:30,1,-73.982155,40.767937,-73.964630,40.765602,N,455
+id2,1,2016-06-12 00:43:35,2016-06-12 00:54:38,2,-73.980415,40.738564,-73.999481,40.731152,N,663
+id3,2,2016-01-19 11:35:24,2016-01-19 12:10:48,1,-73.979027,40.763939,-74.005333,40.710087,Y,2124
+"""
+
+
+def test_typed_read_applies_schema():
+    df = NYCTaxiDataProcessor.read_csv(io.StringIO(CSV))
+
+    assert df['passenger_count'].dtype == 'int8'
+    assert df['trip_duration'].dtype == 'int32'
+    assert df['store_and_fwd_flag'].dtype == 'category'
+    assert df['pickup_datetime'].dtype == 'datetime64[ns]'
+
+
+def test_malformed_numbers_fall_back_to_inferred_dtypes():
+    df = NYCTaxiDataProcessor.read_csv(io.StringIO(CSV.replace(',N,663', ',N,')))
+
+    assert df['trip_duration'].dtype == 'float64'
+    assert np.isnan(df.loc[1, 'trip_duration'])
+
+
+def test_duplicate_keys_agree_between_typed_and_inferred_reads():
+    processor = NYCTaxiDataProcessor()
+    typed = processor._drop_invalid_records(NYCTaxiDataProcessor.read_csv(io.StringIO(CSV)), log=False)
+    inferred = processor._drop_invalid_records(pd.read_csv(io.StringIO(CSV)), log=False)
+
+    np.testing.assert_array_equal(NYCTaxiDataProcessor._duplicate_keys(typed),
+                                  NYCTaxiDataProcessor._duplicate_keys(inferred))
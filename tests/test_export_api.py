@@ -0,0 +1,24 @@
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+
+def test_export_streams_from_the_request_connection(client, monkeypatch):
+    open_connections, peak = [], []
+
+    def connect(self):
+        open_connections.append(self)
+        peak.append(len(open_connections))
+        return True
+
+    monkeypatch.setattr(TaxiTripDatabase, 'connect', connect)
+    monkeypatch.setattr(TaxiTripDatabase, 'close', lambda self: open_connections.remove(self))
+    monkeypatch.setattr(TaxiTripDatabase, 'iter_trips_csv',
+                        lambda self, **filters: iter(['id,trip_duration\n', 'id1,455\n']))
+
+    response = client.get('/api/export.csv', query_string={'is_weekend': '0'}, buffered=False)
+
+    # A single pooled connection, still held while the body streams and released on close
+    assert max(peak) == 1
+    assert len(open_connections) == 1
+    assert response.get_data(as_text=True) == 'id,trip_duration\nid1,455\n'
+    response.close()
+    assert open_connections == []
@@ -0,0 +1,47 @@
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+OUTSIDE_NYC = {'min_lat': 10, 'max_lat': 11, 'min_lon': 10, 'max_lon': 11}
+
+
+def fail_query(*args, **kwargs):
+    raise AssertionError("a viewport outside NYC must not be queried")
+
+
+def test_tiles_outside_bounds_are_empty(client, monkeypatch):
+    monkeypatch.setattr(TaxiTripDatabase, 'get_spatial_tiles', fail_query)
+
+    response = client.get('/api/geo/tiles', query_string={'zoom': 4, **OUTSIDE_NYC})
+
+    assert response.status_code == 200
+    assert response.get_json() == {'zoom': 4, 'tiles': []}
+
+
+def test_tiles_inside_bounds_pass_tile_range(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(TaxiTripDatabase, 'get_spatial_tiles',
+                        lambda self, zoom, tile_range, limit=None: calls.append((zoom, tile_range)) or [])
+
+    response = client.get('/api/geo/tiles', query_string={'zoom': 4, 'min_lat': 40.70, 'max_lat': 40.80,
+                                                          'min_lon': -74.02, 'max_lon': -73.93})
+
+    assert response.status_code == 200
+    assert len(calls) == 1 and calls[0][1] is not None
+
+
+def test_heatmap_outside_bounds_is_empty(client, monkeypatch):
+    monkeypatch.setattr(TaxiTripDatabase, 'get_heatmap_cells', fail_query)
+
+    response = client.get('/api/geo/heatmap', query_string={'zoom': 4, 'hour': 8, **OUTSIDE_NYC})
+
+    assert response.status_code == 200
+    assert response.get_json() == []
+
+
+def test_heatmap_outside_bounds_is_empty_in_columns(client, monkeypatch):
+    monkeypatch.setattr(TaxiTripDatabase, 'get_heatmap_cells', fail_query)
+
+    response = client.get('/api/geo/heatmap', query_string={'zoom': 4, 'format': 'columns', **OUTSIDE_NYC})
+
+    assert response.status_code == 200
+    assert response.get_json() == {'columns': ['lat', 'lng', 'trips'],
+                                   'data': {'lat': [], 'lng': [], 'trips': []}, 'zoom': 4}
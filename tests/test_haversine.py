@@ -0,0 +1,18 @@
+import numpy as np
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+
+
+def test_batch_haversine_matches_scalar():
+    rng = np.random.default_rng(42)
+    bounds = NYCTaxiDataProcessor.NYC_BOUNDS
+    size = 1000
+    lat1, lat2 = rng.uniform(bounds['lat_min'], bounds['lat_max'], (2, size))
+    lon1, lon2 = rng.uniform(bounds['lon_min'], bounds['lon_max'], (2, size))
+    # Identical endpoints: zero-length trips
+    lat2[:10], lon2[:10] = lat1[:10], lon1[:10]
+
+    batch = NYCTaxiDataProcessor._haversine_distance_batch(lat1, lon1, lat2, lon2)
+    scalar = [NYCTaxiDataProcessor._haversine_distance(*point) for point in zip(lat1, lon1, lat2, lon2)]
+
+    np.testing.assert_allclose(batch, scalar, rtol=1e-12, atol=1e-12)
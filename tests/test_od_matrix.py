@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from data_processing.od_matrix import ODMatrix
+
+
+def trips(size: int, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pickup_latitude': rng.uniform(40.70, 40.73, size),
+        'pickup_longitude': rng.uniform(-74.00, -73.97, size),
+        'dropoff_latitude': rng.uniform(40.70, 40.72, size),
+        'dropoff_longitude': rng.uniform(-74.00, -73.98, size),
+        'hour_of_day': rng.integers(0, 24, size),
+        'trip_duration': rng.lognormal(6.5, 0.6, size).round(),
+        'trip_distance_km': rng.uniform(0.5, 5, size),
+        'trip_speed_kmh': rng.uniform(5, 40, size)
+    })
+
+
+def test_percentiles_do_not_depend_on_chunking():
+    df = trips(20000)
+    whole = ODMatrix().add(df)
+
+    # Chunks of very different sizes, as streaming and worker partitions produce
+    merged = ODMatrix()
+    for start, end in [(0, 1), (1, 1001), (1001, 7000), (7000, len(df))]:
+        merged.merge(ODMatrix().add(df.iloc[start:end]))
+
+    pd.testing.assert_frame_equal(merged.to_frame(), whole.to_frame())
+
+
+def test_percentiles_within_accuracy_of_exact():
+    df = trips(20000)
+    matrix = ODMatrix()
+    flows = matrix.add(df).to_frame().set_index(ODMatrix.KEY)
+
+    pickup_x, pickup_y = matrix.cell_keys(df['pickup_latitude'], df['pickup_longitude'])
+    dropoff_x, dropoff_y = matrix.cell_keys(df['dropoff_latitude'], df['dropoff_longitude'])
+    keyed = df.assign(pickup_cell_x=pickup_x, pickup_cell_y=pickup_y, dropoff_cell_x=dropoff_x,
+                      dropoff_cell_y=dropoff_y, hour_start=df['hour_of_day'] // 3 * 3)
+    for column, fraction in ODMatrix.PERCENTILES.items():
+        # The lower of the two trips np.percentile interpolates between
+        exact = keyed.groupby(ODMatrix.KEY)['trip_duration'].quantile(fraction, interpolation='lower')
+        np.testing.assert_allclose(flows[column].loc[exact.index], exact, rtol=ODMatrix.DURATION_ACCURACY)
+
+
+def test_day_percentiles_merge_hour_buckets():
+    # One cell pair: half its trips take 5 minutes at night, half 50 minutes in the evening
+    df = trips(1000).assign(pickup_latitude=40.705, pickup_longitude=-73.995,
+                            dropoff_latitude=40.715, dropoff_longitude=-73.985)
+    evening = np.arange(len(df)) % 2 == 1
+    df['hour_of_day'] = np.where(evening, 20, 2)
+    df['trip_duration'] = np.where(evening, 3000.0, 300.0)
+
+    day = ODMatrix().add(df).top_flows(hour=None).iloc[0]
+
+    # A trip-count-weighted mean of the buckets' P90s would be 1650
+    np.testing.assert_allclose(day['duration_p90'], 3000, rtol=ODMatrix.DURATION_ACCURACY)
+    np.testing.assert_allclose(day['duration_p50'], 300, rtol=ODMatrix.DURATION_ACCURACY)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from data_processing.quantile_sketch import KLLSketch
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+
+def fail_query(*args, **kwargs):
+    raise AssertionError("an invalid request must not be queried")
+
+
+@pytest.mark.parametrize('q', ['-0.1', '1.5'])
+def test_out_of_range_fraction_is_rejected(client, monkeypatch, q):
+    monkeypatch.setattr(TaxiTripDatabase, 'get_quantile_sketches', fail_query)
+
+    response = client.get('/api/trips/percentiles', query_string={'q': ['0.5', q]})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'q must be between 0 and 1'}
+
+
+def test_missing_sketch_is_not_found(client, monkeypatch):
+    monkeypatch.setattr(TaxiTripDatabase, 'get_quantile_sketches', lambda self, metrics=None: {})
+
+    response = client.get('/api/trips/percentiles', query_string={'metric': 'trip_speed_kmh'})
+
+    assert response.status_code == 404
+    assert response.get_json() == {'error': "No quantile sketch for metric 'trip_speed_kmh'"}
+
+
+def test_percentiles_from_stored_sketch(client, monkeypatch):
+    data = np.random.default_rng(5).lognormal(6.5, 0.7, 100000)
+    sketch = KLLSketch.from_dict(KLLSketch(200, seed=1).update(data).to_dict())
+    monkeypatch.setattr(TaxiTripDatabase, 'get_quantile_sketches',
+                        lambda self, metrics=None: {'trip_duration': sketch})
+
+    response = client.get('/api/trips/percentiles', query_string={'q': ['0.5', '0.9']})
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['metric'], body['count']) == ('trip_duration', len(data))
+    assert set(body['percentiles']) == {'p50', 'p90'}
+    for name, fraction in (('p50', 0.5), ('p90', 0.9)):
+        low, high = np.quantile(data, [fraction - body['rank_error'], fraction + body['rank_error']])
+        assert low <= body['percentiles'][name] <= high
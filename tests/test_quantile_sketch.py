@@ -0,0 +1,70 @@
+import json
+
+import numpy as np
+import pytest
+
+from data_processing.quantile_sketch import KLLSketch
+
+FRACTIONS = [0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+def durations(size: int = 200000, seed: int = 11) -> np.ndarray:
+    return np.random.default_rng(seed).lognormal(6.5, 0.7, size)
+
+
+def assert_within_rank_error(sketch: KLLSketch, data: np.ndarray, epsilon: float):
+    """Each estimated quantile lies between the exact quantiles epsilon below and above it"""
+    for fraction, value in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+        low, high = np.quantile(data, [max(fraction - epsilon, 0), min(fraction + epsilon, 1)])
+        assert low <= value <= high, (fraction, value, low, high)
+
+
+@pytest.mark.parametrize('k', [50, 200, 800])
+def test_quantiles_within_rank_error(k):
+    data = durations()
+    sketch = KLLSketch(k, seed=1).update(data)
+
+    assert sketch.count == len(data)
+    assert len(sketch) < len(data) / 20
+    assert_within_rank_error(sketch, data, sketch.normalized_rank_error)
+    assert sketch.quantiles([0, 1]) == [data.min(), data.max()]
+
+
+def test_merged_sketch_matches_sketch_of_all_data():
+    data = durations()
+    whole = KLLSketch(200, seed=1).update(data)
+
+    # Unequal parts, as chunks and worker partitions produce
+    merged = KLLSketch(200, seed=2)
+    for part in np.split(data, [1, 1000, 50000]):
+        merged.merge(KLLSketch(200, seed=3).update(part))
+
+    assert (merged.count, merged.min, merged.max) == (whole.count, whole.min, whole.max)
+    assert_within_rank_error(merged, data, merged.normalized_rank_error)
+    # Both estimate the same ranks, each within the error bound
+    for value in merged.quantiles(FRACTIONS):
+        assert abs(merged.rank(value) - whole.rank(value)) <= 2 * whole.normalized_rank_error
+
+
+def test_serialization_round_trip():
+    sketch = KLLSketch(200, seed=1).update(durations(50000))
+
+    restored = KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+    assert (restored.k, restored.count, restored.min, restored.max) == (sketch.k, sketch.count,
+                                                                        sketch.min, sketch.max)
+    assert restored.quantiles(FRACTIONS) == sketch.quantiles(FRACTIONS)
+    # A restored sketch keeps accepting values
+    restored.update([1.0, 2.0])
+    assert restored.count == sketch.count + 2
+
+
+def test_empty_sketch_and_nans():
+    empty = KLLSketch.from_dict(KLLSketch().to_dict())
+    assert empty.count == 0
+    assert empty.quantiles([0.5]) == [0.0]
+    assert empty.rank(1.0) == 0.0
+
+    sketch = KLLSketch().update([np.nan, 3.0, np.nan, 1.0, 2.0])
+    assert sketch.count == 3
+    assert sketch.quantile(0.5) == 2.0
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+from data_processing.spatial_index import SpatialGridIndex, haversine_km
+
+BOUNDS = NYCTaxiDataProcessor.NYC_BOUNDS
+GRID_SIZE = 0.01
+
+
+def points(size: int = 5000, seed: int = 11):
+    """Random NYC points plus points lying exactly on cell edges and corners"""
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(BOUNDS['lat_min'], BOUNDS['lat_max'], size)
+    lons = rng.uniform(BOUNDS['lon_min'], BOUNDS['lon_max'], size)
+    edge_lats = np.round(rng.uniform(40.70, 40.80, 200) / GRID_SIZE) * GRID_SIZE
+    edge_lons = np.round(rng.uniform(-74.00, -73.90, 200) / GRID_SIZE) * GRID_SIZE
+    # Half of them on a grid line in one axis only
+    edge_lons[:100] += rng.uniform(0, GRID_SIZE, 100)
+    return np.concatenate([lats, edge_lats]), np.concatenate([lons, edge_lons])
+
+
+@pytest.fixture(scope='module')
+def index_and_points():
+    lats, lons = points()
+    index = SpatialGridIndex(GRID_SIZE)
+    # Two batches, so the pending inserts are folded into the CSR arrays together
+    index.bulk_insert(lats[:3000], lons[:3000])
+    index.bulk_insert(lats[3000:], lons[3000:])
+    return index, lats, lons
+
+
+@pytest.mark.parametrize('bbox', [
+    (40.70, 40.80, -74.00, -73.90),          # edges on grid lines
+    (40.7512, 40.7634, -73.9921, -73.9711),  # edges inside cells
+    (40.75, 40.75, -74.00, -73.90),          # zero-height box on a grid line
+    (BOUNDS['lat_min'] - 1, BOUNDS['lat_max'] + 1, BOUNDS['lon_min'] - 1, BOUNDS['lon_max'] + 1),
+])
+def test_query_bbox_matches_brute_force(index_and_points, bbox):
+    index, lats, lons = index_and_points
+    min_lat, max_lat, min_lon, max_lon = bbox
+
+    expected = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon))
+
+    np.testing.assert_array_equal(np.sort(index.query_bbox(*bbox)), expected)
+
+
+@pytest.mark.parametrize('bbox', [
+    (10, 11, 10, 11),              # nowhere near the points
+    (40.7001, 40.7009, -73.9999, -73.9991),  # inside a single cell holding no point
+    (40.80, 40.70, -74.00, -73.90),  # inverted
+])
+def test_query_bbox_empty(index_and_points, bbox):
+    index, lats, lons = index_and_points
+    min_lat, max_lat, min_lon, max_lon = bbox
+    assert not ((lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)).any()
+
+    assert len(index.query_bbox(*bbox)) == 0
+
+
+@pytest.mark.parametrize('center, radius_km', [
+    ((40.75, -73.98), 1.0),    # centre on a cell corner
+    ((40.7581, -73.9855), 0.3),
+    ((40.7581, -73.9855), 5.0),
+    ((40.65, -73.78), 12.0),
+])
+def test_query_radius_matches_brute_force(index_and_points, center, radius_km):
+    index, lats, lons = index_and_points
+    distances = haversine_km(*center, lats, lons)
+    expected = np.flatnonzero(distances <= radius_km)
+
+    rows, found = index.query_radius(*center, radius_km, return_distances=True)
+
+    np.testing.assert_array_equal(np.sort(rows), expected)
+    # Nearest first, with the distances of the returned rows
+    assert np.all(np.diff(found) >= 0)
+    np.testing.assert_allclose(found, distances[rows])
+
+
+def test_query_radius_empty(index_and_points):
+    index, lats, lons = index_and_points
+    assert len(index.query_radius(10.0, 10.0, 50.0)) == 0
+
+    # Radius smaller than the gap to the closest point
+    center = (40.7581, -73.9855)
+    closest = haversine_km(*center, lats, lons).min()
+    assert len(index.query_radius(*center, closest * 0.99)) == 0
+
+
+@pytest.mark.parametrize('center, k', [
+    ((40.75, -73.98), 1),
+    ((40.7581, -73.9855), 10),
+    ((40.65, -73.78), 250),
+    ((41.5, -75.0), 5),         # far outside the points: the search box has to grow
+])
+def test_nearest_matches_brute_force(index_and_points, center, k):
+    index, lats, lons = index_and_points
+    distances = haversine_km(*center, lats, lons)
+    expected = np.sort(distances)[:k]
+
+    rows, found = index.nearest(*center, k=k, return_distances=True)
+
+    assert len(rows) == k
+    # Compare distances rather than rows so that ties may come back in any order
+    np.testing.assert_allclose(found, expected)
+    np.testing.assert_allclose(distances[rows], found)
+
+
+def test_nearest_more_than_size(index_and_points):
+    index, lats, _ = index_and_points
+    assert len(index.nearest(40.75, -73.98, k=len(lats) + 10)) == len(lats)
+
+
+def test_empty_index():
+    index = SpatialGridIndex(GRID_SIZE)
+
+    assert len(index.query_bbox(40.7, 40.8, -74.0, -73.9)) == 0
+    assert len(index.query_radius(40.75, -73.98, 10.0)) == 0
+    rows, distances = index.nearest(40.75, -73.98, k=3, return_distances=True)
+    assert len(rows) == 0 and len(distances) == 0
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing.data_processor import NYCTaxiDataProcessor
+from data_processing.tile_pyramid import TilePyramid
+
+BOUNDS = NYCTaxiDataProcessor.NYC_BOUNDS
+
+
+def pickups(size: int, seed: int = 3) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'pickup_latitude': rng.uniform(BOUNDS['lat_min'], BOUNDS['lat_max'], size),
+        'pickup_longitude': rng.uniform(BOUNDS['lon_min'], BOUNDS['lon_max'], size),
+        'passenger_count': rng.integers(1, 7, size),
+        'trip_duration': rng.uniform(60, 3600, size),
+        'trip_distance_km': rng.uniform(0.5, 20, size)
+    })
+
+
+@pytest.mark.parametrize('bbox', [
+    (10, 11, 10, 11),                                                 # nowhere near NYC
+    (BOUNDS['lat_max'] + 0.1, BOUNDS['lat_max'] + 0.2, -74.0, -73.9),  # north of the box
+    (40.7, 40.8, BOUNDS['lon_min'] - 0.2, BOUNDS['lon_min'] - 0.1),    # west of the box
+    (40.8, 40.7, -74.0, -73.9),                                       # inverted
+])
+def test_tile_range_outside_bounds_is_none(bbox):
+    pyramid = TilePyramid(BOUNDS)
+
+    assert pyramid.tile_range(4, *bbox) is None
+    assert pyramid.add(pickups(1000)).tiles(4, *bbox).empty
+
+
+def test_tile_range_clips_overlapping_box():
+    pyramid = TilePyramid(BOUNDS)
+
+    assert pyramid.tile_range(4, BOUNDS['lat_min'] - 1, BOUNDS['lat_max'] + 1,
+                              BOUNDS['lon_min'] - 1, BOUNDS['lon_max'] + 1) == (0, 15, 0, 15)
+    # Touching the box on its edge still overlaps it
+    assert pyramid.tile_range(4, BOUNDS['lat_max'], BOUNDS['lat_max'] + 1,
+                              BOUNDS['lon_min'] - 1, BOUNDS['lon_min']) == (0, 0, 15, 15)
+
+
+def test_tiles_in_box_match_brute_force():
+    df = pickups(5000)
+    pyramid = TilePyramid(BOUNDS).add(df)
+    zoom, bbox = 5, (40.70, 40.80, -74.02, -73.93)
+
+    tile_x, tile_y = pyramid.tile_coordinates(df['pickup_latitude'], df['pickup_longitude'], zoom)
+    x_min, x_max, y_min, y_max = pyramid.tile_range(zoom, *bbox)
+    visible = (tile_x >= x_min) & (tile_x <= x_max) & (tile_y >= y_min) & (tile_y <= y_max)
+
+    tiles = pyramid.tiles(zoom, *bbox)
+    assert tiles['trip_count'].sum() == visible.sum()
+    assert set(zip(tiles['tile_x'], tiles['tile_y'])) == set(zip(tile_x[visible], tile_y[visible]))
@@ -0,0 +1,109 @@
+import base64
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from data_processing.taxi_trip_db import TaxiTripDatabase
+
+
+def fail_query(*args, **kwargs):
+    raise AssertionError("an invalid cursor must not be queried")
+
+
+@pytest.fixture
+def trips():
+    """Trips with many tied pickup times, so pages have to break ties on id"""
+    times = pd.to_datetime(['2016-03-14 17:24:55', '2016-03-14 17:24:55', '2016-03-14 17:24:55',
+                            '2016-03-14 18:00:00', '2016-03-15 09:10:11', '2016-03-15 09:10:11'])
+    return pd.DataFrame({
+        'id': [f'id{number:03d}' for number in range(24)],
+        'pickup_datetime': list(times) * 4,
+        'passenger_count': [1, 2] * 12,
+    })
+
+
+@pytest.fixture
+def db(trips, monkeypatch):
+    """A TaxiTripDatabase whose queries run against the trips table in SQLite"""
+    connection = sqlite3.connect(':memory:')
+    stored = trips.assign(pickup_datetime=trips['pickup_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S'))
+    stored.to_sql('trips', connection, index=False)
+
+    def query_to_df(self, query, params=None, chunksize=50000):
+        params = [value.strftime('%Y-%m-%d %H:%M:%S') if isinstance(value, datetime) else value
+                  for value in params or ()]
+        frame = pd.read_sql_query(query.replace('%s', '?'), connection, params=params)
+        return frame.assign(pickup_datetime=pd.to_datetime(frame['pickup_datetime']))
+
+    monkeypatch.setattr(TaxiTripDatabase, 'query_to_df', query_to_df)
+    yield TaxiTripDatabase()
+    connection.close()
+
+
+def all_pages(db, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        page = db.get_trip_data(limit=limit, cursor=cursor, as_frame=True, **filters)
+        pages.append(page['rows'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+        # A cursor that skips or repeats rows must not page forever
+        assert len(pages) <= 24, "paging did not end"
+
+
+@pytest.mark.parametrize('limit', [1, 2, 4, 5, 24, 100])
+def test_pages_break_pickup_ties_on_id(db, trips, limit):
+    pages = all_pages(db, limit)
+    expected = trips.sort_values(['pickup_datetime', 'id'], ascending=False)
+
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+    # Every trip exactly once, in (pickup_datetime, id) descending order
+    assert pd.concat(pages)['id'].tolist() == expected['id'].tolist()
+
+
+def test_pages_with_filters(db, trips):
+    pages = all_pages(db, 3, passenger_count=2)
+    expected = trips[trips['passenger_count'] == 2].sort_values(['pickup_datetime', 'id'], ascending=False)
+
+    assert pd.concat(pages)['id'].tolist() == expected['id'].tolist()
+
+
+def test_cursor_round_trip():
+    cursor = TaxiTripDatabase.encode_page_cursor('2016-03-14T17:24:55', 'id2875421')
+
+    assert TaxiTripDatabase.decode_page_cursor(cursor) == (datetime(2016, 3, 14, 17, 24, 55), 'id2875421')
+
+
+def tampered_cursors():
+    cursor = TaxiTripDatabase.encode_page_cursor('2016-03-14T17:24:55', 'id2875421')
+    return [
+        'not a cursor',
+        cursor[:-3],                                            # truncated
+        cursor[:10] + '*' + cursor[11:],                        # not base64
+        'é' + cursor,                                           # not ASCII
+        base64.urlsafe_b64encode(b'{"key": 1}').decode(),       # JSON of the wrong shape
+        base64.urlsafe_b64encode(b'["2016-03-14T17:24:55"]').decode(),
+        base64.urlsafe_b64encode(b'[5, "id2875421"]').decode(),  # no datetime
+        TaxiTripDatabase.encode_page_cursor('yesterday', 'id2875421'),
+    ]
+
+
+@pytest.mark.parametrize('cursor', tampered_cursors())
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid page cursor'):
+        TaxiTripDatabase.decode_page_cursor(cursor)
+
+
+@pytest.mark.parametrize('cursor', tampered_cursors())
+def test_invalid_cursor_is_bad_request(client, monkeypatch, cursor):
+    monkeypatch.setattr(TaxiTripDatabase, 'query_to_df', fail_query)
+    monkeypatch.setattr(TaxiTripDatabase, 'count_trips', fail_query)
+
+    response = client.get('/api/trips', query_string={'cursor': cursor})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid page cursor'}
@@ -1,54 +1,94 @@
--- Active: 1742803121218@@f519ae958f46.601a9382.alu-cod.online@38805 # type: ignore
 from flask import Blueprint, request, jsonify, g
 
+from api_cache import cached_response
+from api_formats import encode_frame, negotiate_format, unsupported_format_response
+
 trip_api = Blueprint('trip_api', __name__)
 
 
+def trip_filters(args) -> dict:
+    """TaxiTripDatabase.TRIP_FILTERS values from the query string of a trips request"""
+    return {
+        'start_date': args.get('start_date'),
+        'end_date': args.get('end_date'),
+        'hour_of_day': args.get('hour_of_day', type=int),
+        'day_of_week': args.get('day_of_week', type=int),
+        # type=bool would make any non-empty value, '0' and 'false' included, True
+        'is_weekend': args.get('is_weekend', type=lambda value: value.lower() in ('1', 'true', 'yes')),
+        'distance_category': args.get('distance_category'),
+        'min_speed': args.get('min_speed', type=float),
+        'max_speed': args.get('max_speed', type=float),
+        'passenger_count': args.get('passenger_count', type=int),
+    }
+
+
 @trip_api.route('/api/trips', methods=['GET'])
 def get_trips():
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    hour_of_day = request.args.get('hour_of_day', type=int)
-    day_of_week = request.args.get('day_of_week', type=int)
-    is_weekend = request.args.get('is_weekend', type=bool)
-    distance_category = request.args.get('distance_category')
-    min_speed = request.args.get('min_speed', type=float)
-    max_speed = request.args.get('max_speed', type=float)
-    passenger_count = request.args.get('passenger_count', type=int)
+    filters = trip_filters(request.args)
     limit = request.args.get('limit', default=100, type=int)
-    offset = request.args.get('offset', default=0, type=int)
-
-    # Fetch data from the database via class method
-    trips = g.db.get_trip_data(
-        start_date=start_date,
-        end_date=end_date,
-        hour_of_day=hour_of_day,
-        day_of_week=day_of_week,
-        is_weekend=is_weekend,
-        distance_category=distance_category,
-        min_speed=min_speed,
-        max_speed=max_speed,
-        passenger_count=passenger_count,
-        limit=limit,
-        offset=offset,
-    )
-
-    return jsonify(trips)
+    cursor = request.args.get('cursor') or None
+    exact_total = request.args.get('exact_total', default='false').lower() in ('1', 'true', 'yes')
+
+    fmt = negotiate_format()
+
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    if fmt is None:
+        return unsupported_format_response()
+
+    # Fetch one keyset page from the database via class method
+    try:
+        page = g.db.get_trip_data(limit=limit, cursor=cursor, as_frame=fmt != 'json', **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Totals are estimates from table statistics unless an exact count is asked for
+    total, estimated = g.db.count_trips(exact=exact_total, **filters)
+    meta = {"next_cursor": page['next_cursor'], "total": total, "total_is_estimate": estimated}
+
+    if fmt != 'json':
+        return encode_frame(page['rows'], fmt, meta)
+    return jsonify({"rows": page['rows'], **meta})
 
 
 @trip_api.route('/api/trips/statistics', methods=['GET'])
+@cached_response()
 def trips_statistics():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     group_by = request.args.get('group_by')
     metrics = request.args.getlist('metrics')
+    fmt = negotiate_format()
+    if fmt is None:
+        return unsupported_format_response()
 
     # Fetch statistics from the database via class method
-    statistics = g.db.get_trip_statistics(
-        start_date=start_date,
-        end_date=end_date,
-        group_by=group_by,
-        metrics=metrics,
-    )
-
-    return jsonify(statistics)
\ No newline at end of file
+    try:
+        statistics = g.db.get_trip_statistics(
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by,
+            metrics=metrics,
+            as_frame=fmt != 'json',
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if fmt != 'json':
+        return encode_frame(statistics, fmt)
+    return jsonify(statistics)
+
+@trip_api.route('/api/trips/percentiles', methods=['GET'])
+def trips_percentiles():
+    metric = request.args.get('metric', default='trip_duration')
+    fractions = request.args.getlist('q', type=float) or [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+    if any(fraction < 0 or fraction > 1 for fraction in fractions):
+        return jsonify({"error": "q must be between 0 and 1"}), 400
+
+    # Answered from the stored quantile sketch, without scanning trips
+    percentiles = g.db.get_percentiles(metric, fractions)
+    if not percentiles:
+        return jsonify({"error": f"No quantile sketch for metric '{metric}'"}), 404
+
+    return jsonify(percentiles)